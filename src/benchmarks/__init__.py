@@ -0,0 +1,8 @@
+from benchmarks.adapters import ADAPTERS, configure_verkle_trie
+from benchmarks.harness import BenchmarkConfig, run_benchmark, run_workload_benchmark, summarize, write_json, \
+    write_csv, get_suite, SUITES
+from benchmarks.workloads import Workload, get_workload, load, replay, WORKLOADS
+from benchmarks.memory import measure_memory, run_memory_benchmark, write_memory_csv
+from benchmarks.scaling import sweep_configs, run_sweep, save_baseline, load_baseline, list_baselines, compare, \
+    regressions, mann_whitney_u, write_curves
+from benchmarks.msm_tuning import run_msm_benchmark, autotune, write_msm_csv
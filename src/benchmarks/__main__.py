@@ -0,0 +1,179 @@
+import argparse
+import sys
+import msm
+from benchmarks.adapters import ADAPTERS
+from benchmarks.harness import BenchmarkConfig, run_benchmark, run_workload_benchmark, write_json, write_csv, \
+    get_suite, SUITES
+from benchmarks.workloads import get_workload, WORKLOADS, DISTRIBUTIONS
+from benchmarks.memory import run_memory_benchmark, write_memory_csv
+from benchmarks.msm_tuning import run_msm_benchmark, autotune, write_msm_csv
+from benchmarks.scaling import sweep_configs, run_sweep, save_baseline, load_baseline, compare, regressions, \
+    write_curves, print_comparisons
+
+#
+# Runs benchmarks from the command line, e.g. from the src directory
+#
+#   python -m benchmarks --suite width --repetitions 5 --json evaluation/width.json
+#   python -m benchmarks --tree vbplus_tree 4 16 12 12 0 0 --csv evaluation/vbplus.csv
+#   python -m benchmarks --tree vbst --workload sorted_inserts --records 512 --operations 512 1
+#   python -m benchmarks --tree verkle_trie --memory --min-exponent 10 --max-exponent 16 8
+#   python -m benchmarks --sweep --save-baseline main --curves evaluation/curves
+#   python -m benchmarks --sweep --tree vbplus_tree --widths 2 4 8 --compare main --threshold 0.05
+#
+# Sweeps run every tree (or --tree) for every width (--widths, as WIDTH_BITS) and n = 2**MIN_EXPONENT to
+# 2**MAX_EXPONENT initial keys (8 to 12 by default). With --compare, the exit status is 1 if a phase
+# regressed against the baseline.
+#
+#   python -m benchmarks --msm --max-exponent 12 --densities 1 0.01 --csv evaluation/msm.csv
+#   python -m benchmarks --tune-msm
+#   python -m benchmarks --msm --min-exponent 10 --densities 1 --msm-workers 4
+#
+# --msm times the MSM backends for n = 2**MIN_EXPONENT to 2**MAX_EXPONENT points (0 to 16 by default).
+# --tune-msm chooses the MSM backend for sizes up to 2**(MAX_EXPONENT + 1) - 1 and saves it to
+# evaluation/msm_tuning.json (or --tuning-file). The other benchmarks only use a saved tuning with
+# --use-tuning; by default every MSM uses the built-in choice of msm.
+#
+# Single benchmarks take the arguments of the former scripts: WIDTH_BITS KEY_RANGE NUMBER_INITIAL_KEYS
+# NUMBER_ADDED_KEYS NUMBER_SEARCH_KEYS NUMBER_DELETED_KEYS, as exponents of two (0 for none). Workload
+# and memory benchmarks only take WIDTH_BITS.
+#
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(prog="benchmarks", description="Benchmarks of the vector commitment trees")
+    parser.add_argument("--suite", choices=sorted(SUITES.keys()))
+    parser.add_argument("--tree", choices=sorted(ADAPTERS.keys()))
+    parser.add_argument("parameters", nargs="*", type=int,
+                        help="WIDTH_BITS KEY_RANGE INITIAL ADDED SEARCH DELETED (exponents of two)")
+    parser.add_argument("--workload", choices=sorted(WORKLOADS.keys()))
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--operations", type=int, default=1000)
+    parser.add_argument("--distribution", choices=sorted(DISTRIBUTIONS.keys()))
+    parser.add_argument("--memory", action="store_true",
+                        help="measure the memory footprint for n = 2**MIN_EXPONENT to 2**MAX_EXPONENT keys")
+    parser.add_argument("--sweep", action="store_true",
+                        help="run the scaling sweep over the widths and n = 2**MIN_EXPONENT to 2**MAX_EXPONENT keys")
+    parser.add_argument("--msm", action="store_true", help="time the MSM backends")
+    parser.add_argument("--densities", type=float, nargs="+", default=[1.0, 0.1, 0.01],
+                        help="fractions of nonzero factors of the MSM benchmark")
+    parser.add_argument("--msm-workers", type=int, help="also time the MSMs in parallel with this many processes")
+    parser.add_argument("--tune-msm", action="store_true", help="choose the MSM backend of every size bucket")
+    parser.add_argument("--tuning-file", default=msm.TUNING_PATH)
+    parser.add_argument("--use-tuning", action="store_true", help="use the MSM tuning saved in --tuning-file")
+    parser.add_argument("--min-exponent", type=int, help="10 for --memory, 8 for --sweep, 0 for --msm by default")
+    parser.add_argument("--max-exponent", type=int,
+                        help="22 for --memory, 12 for --sweep, 16 for --msm and --tune-msm by default")
+    parser.add_argument("--widths", type=int, nargs="+", default=list(range(2, 9)), help="WIDTH_BITS of the sweep")
+    parser.add_argument("--save-baseline", metavar="NAME", help="save the sweep as baseline NAME in evaluation/baselines")
+    parser.add_argument("--compare", metavar="NAME", help="compare the sweep with baseline NAME")
+    parser.add_argument("--threshold", type=float, default=0.05,
+                        help="relative slowdown of the median above which a significant change is a regression")
+    parser.add_argument("--alpha", type=float, default=0.05, help="significance level of the comparison")
+    parser.add_argument("--curves", metavar="DIRECTORY",
+                        help="write the throughput-vs-n and latency-vs-width curves of the sweep to DIRECTORY")
+    parser.add_argument("--count-operations", action="store_true",
+                        help="also report the mean number of MSMs, mults, hashes, ... per operation (JSON only)")
+    parser.add_argument("--record-phases", action="store_true",
+                        help="also export the histograms of the timed phases, e.g. of the verkle trie (JSON only)")
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json")
+    parser.add_argument("--csv")
+    args = parser.parse_args(arguments)
+    if args.use_tuning and not msm.load_tuning(args.tuning_file):
+        parser.error("no MSM tuning at {0}".format(args.tuning_file))
+
+    if args.memory:
+        if args.tree is None or len(args.parameters) != 1:
+            parser.error("--memory requires --tree and WIDTH_BITS")
+        exponents = range(args.min_exponent if args.min_exponent is not None else 10,
+                          (args.max_exponent if args.max_exponent is not None else 22) + 1)
+        results = run_memory_benchmark(args.tree, args.parameters[0], exponents, args.seed, display_progress=True)
+        if args.json is not None:
+            write_json(results, args.json)
+        if args.csv is not None:
+            write_memory_csv(results, args.csv)
+        return
+
+    if args.msm:
+        exponents = range(args.min_exponent if args.min_exponent is not None else 0,
+                          (args.max_exponent if args.max_exponent is not None else 16) + 1)
+        results = run_msm_benchmark(exponents, args.densities, repetitions=args.repetitions, seed=args.seed,
+                                    display_progress=True, workers=args.msm_workers)
+        if args.json is not None:
+            write_json(results, args.json)
+        if args.csv is not None:
+            write_msm_csv(results, args.csv)
+        return
+
+    if args.tune_msm:
+        tuning = autotune((args.max_exponent if args.max_exponent is not None else 16) + 1, args.repetitions,
+                          args.seed, display_progress=True)
+        msm.save_tuning(tuning, args.tuning_file)
+        print("Saved MSM tuning {0}".format(args.tuning_file), file=sys.stderr)
+        return
+
+    if args.sweep:
+        exponents = range(args.min_exponent if args.min_exponent is not None else 8,
+                          (args.max_exponent if args.max_exponent is not None else 12) + 1)
+        configs = sweep_configs([args.tree] if args.tree is not None else None, args.widths, exponents,
+                                repetitions=args.repetitions, warmup=args.warmup, seed=args.seed)
+        baseline = load_baseline(args.compare) if args.compare is not None else None
+        results = run_sweep(configs, display_progress=True)
+        if args.save_baseline is not None:
+            print("Saved baseline {0}".format(save_baseline(results, args.save_baseline)), file=sys.stderr)
+        if args.curves is not None:
+            write_curves(results, args.curves)
+        if args.json is not None:
+            write_json(results, args.json)
+        if args.csv is not None:
+            write_csv(results, args.csv)
+        if baseline is not None:
+            comparisons = compare(baseline['results'], results, args.threshold, args.alpha)
+            print_comparisons(comparisons)
+            if len(regressions(comparisons)) > 0:
+                print("{0} regressions against baseline {1}".format(len(regressions(comparisons)), args.compare),
+                      file=sys.stderr)
+                return 1
+        return
+
+    options = {'repetitions': args.repetitions, 'warmup': args.warmup, 'seed': args.seed}
+    if args.workload is not None:
+        if args.tree is None or len(args.parameters) != 1:
+            parser.error("--workload requires --tree and WIDTH_BITS")
+        workload_options = {'seed': args.seed}
+        if args.distribution is not None:
+            workload_options['distribution'] = args.distribution
+        workload = get_workload(args.workload, args.records, args.operations, **workload_options)
+        configs = []
+    elif args.suite is not None:
+        configs = get_suite(args.suite, **options)
+    elif args.tree is not None and 3 <= len(args.parameters) <= 6:
+        configs = [BenchmarkConfig.from_exponents(args.tree, *args.parameters, **options)]
+    else:
+        parser.error("either --suite or --tree with at least WIDTH_BITS KEY_RANGE INITIAL is required")
+
+    results = [run_benchmark(config, display_progress=True, count_operations=args.count_operations,
+                             record_phases=args.record_phases) for config in configs]
+    if args.workload is not None:
+        results.append(run_workload_benchmark(args.tree, args.parameters[0], workload, args.workload,
+                                              args.repetitions, args.warmup, display_progress=True,
+                                              record_phases=args.record_phases))
+    for result in results:
+        for phase, summary in result['phases'].items():
+            print("{0}\t{1}\t{2}\t{3}\tmedian {4:.6f} s\tp95 {5:.6f} s\tp99 {6:.6f} s".format(
+                result['config']['tree'], result['config']['width_bits'], phase, summary['count'],
+                summary['median'], summary['p95'], summary['p99']))
+        for phase, reason in result.get('skipped_phases', {}).items():
+            print("{0}\t{1}\t{2}\tskipped: {3}".format(result['config']['tree'], result['config']['width_bits'],
+                                                       phase, reason))
+
+    if args.json is not None:
+        write_json(results, args.json)
+    if args.csv is not None:
+        write_csv(results, args.csv)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
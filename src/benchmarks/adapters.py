@@ -0,0 +1,202 @@
+import itertools
+from bisect import bisect_left
+import blst
+import verkle_trie
+from kzg_utils import KzgUtils
+from poly_utils import PrimeField
+from vbst import VBST, VBSTNode
+from vb_tree import VBTree, VBTreeNode
+from vbplus_tree import VBPlusTree, VBPlusTreeNode, KzgIntegration
+
+#
+# One interface for all tree implementations
+#
+# Every adapter builds a fresh tree in 'new_tree' and then offers the operations that are measured by the
+# harness. 'insert' only changes the structure (as used for the initial keys), 'compute_root' computes all
+# commitments, and 'upsert' and 'delete' update the commitments incrementally. 'scan' returns up to
+# 'count' keys from 'key' onwards in the order of the tree.
+#
+# Only adapters with 'supports_deletes' have 'delete': VB-Trees and VB+Trees have no incremental delete,
+# so the harness skips their delete phase and workloads with deletes are rejected for them.
+#
+
+MODULUS = 0x73eda753299d7d483339d80809a1d80553bda402fffe5bfeffffffff00000001
+PRIMITIVE_ROOT = 7
+SECRET = 8927347823478352432985
+
+_kzg_integrations = {}
+
+
+def get_kzg_integration(width_bits: int) -> KzgIntegration:
+    """
+    Returns the setup for width 2**width_bits, which is only generated once per width
+    """
+    if width_bits not in _kzg_integrations:
+        _kzg_integrations[width_bits] = KzgIntegration(SECRET, MODULUS, 2**width_bits, PRIMITIVE_ROOT)
+    return _kzg_integrations[width_bits]
+
+
+def configure_verkle_trie(width_bits: int):
+    """
+    Sets the module parameters of verkle_trie for width 2**width_bits, as its '__main__' block does
+    """
+    if getattr(verkle_trie, "WIDTH_BITS", None) == width_bits and hasattr(verkle_trie, "kzg_utils"):
+        return
+    width = 2**width_bits
+    verkle_trie.WIDTH_BITS = width_bits
+    verkle_trie.WIDTH = width
+    verkle_trie.primefield = PrimeField(MODULUS, width)
+    verkle_trie.ROOT_OF_UNITY = pow(PRIMITIVE_ROOT, (MODULUS - 1) // width, MODULUS)
+    verkle_trie.DOMAIN = [pow(verkle_trie.ROOT_OF_UNITY, i, MODULUS) for i in range(width)]
+    verkle_trie.SETUP = verkle_trie.generate_setup(width, SECRET)
+    verkle_trie.kzg_utils = KzgUtils(MODULUS, width, verkle_trie.DOMAIN, verkle_trie.SETUP, verkle_trie.primefield)
+
+
+class _KzgTreeAdapter:
+    """
+    Operations that VBST, VB-Tree and VB+Tree have in common
+    """
+    supports_deletes = False
+
+    def insert(self, key: bytes, value: bytes):
+        self.tree.insert_node(key, value)
+
+    def compute_root(self):
+        self.tree.add_node_hash(self.tree.root)
+
+    def upsert(self, key: bytes, value: bytes):
+        self.tree.upsert_vc_node(key, value)
+
+    def search(self, key: bytes) -> bool:
+        return self.tree.find_node(self.tree.root, key) is not None
+
+    def check_valid(self):
+        self.tree.check_valid_tree(self.tree.root)
+
+
+class VBSTAdapter(_KzgTreeAdapter):
+    name = 'VBST'
+    supports_deletes = True
+
+    def __init__(self, width_bits: int = 1):
+        assert width_bits == 1, "A VBST always has width 2"
+        self.kzg_integration = get_kzg_integration(width_bits)
+
+    def new_tree(self, key: bytes, value: bytes):
+        self.tree = VBST(self.kzg_integration, VBSTNode(key, value))
+
+    def scan(self, key: bytes, count: int) -> list:
+        keys = []
+        stack = []
+        node = self.tree.root
+        while (len(stack) > 0 or node is not None) and len(keys) < count:
+            if node is None:
+                node = stack.pop()
+                keys.append(node.key)
+                node = node.right
+            elif node.key < key:
+                # The left subtree only has smaller keys
+                node = node.right
+            else:
+                stack.append(node)
+                node = node.left
+        return keys
+
+    def delete(self, key: bytes):
+        self.tree.delete_vc_node(key)
+
+
+class VBTreeAdapter(_KzgTreeAdapter):
+    name = 'VB-Tree'
+
+    def __init__(self, width_bits: int):
+        self.kzg_integration = get_kzg_integration(width_bits)
+
+    def new_tree(self, key: bytes, value: bytes):
+        self.tree = VBTree(self.kzg_integration, VBTreeNode([key], [value]))
+
+    def _scan(self, node: VBTreeNode, key: bytes):
+        # Children before the first key >= 'key' only have smaller keys
+        for i in range(bisect_left(node.keys, key), node.key_count()):
+            if not node.is_leaf():
+                yield from self._scan(node.children[i], key)
+            yield node.keys[i]
+        if not node.is_leaf():
+            yield from self._scan(node.children[-1], key)
+
+    def scan(self, key: bytes, count: int) -> list:
+        return list(itertools.islice(self._scan(self.tree.root, key), count))
+
+
+class VBPlusTreeAdapter(VBTreeAdapter):
+    name = 'VB+Tree'
+
+    def new_tree(self, key: bytes, value: bytes):
+        self.tree = VBPlusTree(self.kzg_integration, VBPlusTreeNode('leaf', [key], [value]))
+
+    def scan(self, key: bytes, count: int) -> list:
+        node, i = self.tree.find_path_to_leaf(self.tree.root, key)[-1]
+        start = bisect_left(node.keys, key)
+        keys = node.keys[start:start + count]
+        node = node.next_leaf
+        while node is not None and len(keys) < count:
+            keys += node.keys[:count - len(keys)]
+            node = node.next_leaf
+        return keys
+
+
+class VerkleTrieAdapter:
+    name = 'Verkle'
+    supports_deletes = True
+
+    def __init__(self, width_bits: int):
+        configure_verkle_trie(width_bits)
+
+    def new_tree(self, key: bytes, value: bytes):
+        self.root = {"node_type": "inner", "commitment": blst.G1().mult(0)}
+        verkle_trie.insert_verkle_node(self.root, key, value)
+
+    def insert(self, key: bytes, value: bytes):
+        verkle_trie.insert_verkle_node(self.root, key, value)
+
+    def compute_root(self):
+        verkle_trie.add_node_hash(self.root)
+
+    def upsert(self, key: bytes, value: bytes):
+        verkle_trie.update_verkle_node(self.root, key, value)
+
+    def search(self, key: bytes) -> bool:
+        return verkle_trie.find_node(self.root, key) is not None
+
+    def _scan(self, node: dict, indices: tuple, depth: int, bounded: bool):
+        """
+        Yields the keys below 'node' in index order. While 'bounded', the path so far equals the path of the
+        start key, so smaller indices are skipped
+        """
+        for index in sorted(i for i in node if isinstance(i, int)):
+            if bounded and index < indices[depth]:
+                continue
+            child = node[index]
+            child_bounded = bounded and index == indices[depth]
+            if child["node_type"] == "leaf":
+                if not child_bounded or verkle_trie.get_verkle_indices(child["key"]) >= indices:
+                    yield child["key"]
+            else:
+                yield from self._scan(child, indices, depth + 1, child_bounded)
+
+    def scan(self, key: bytes, count: int) -> list:
+        return list(itertools.islice(self._scan(self.root, verkle_trie.get_verkle_indices(key), 0, True), count))
+
+    def delete(self, key: bytes):
+        verkle_trie.delete_verkle_node(self.root, key)
+
+    def check_valid(self):
+        verkle_trie.check_valid_tree(self.root)
+
+
+ADAPTERS = {
+    'vbst': VBSTAdapter,
+    'vb_tree': VBTreeAdapter,
+    'vbplus_tree': VBPlusTreeAdapter,
+    'verkle_trie': VerkleTrieAdapter,
+}
@@ -0,0 +1,287 @@
+import csv
+import json
+import math
+import sys
+from random import Random
+from time import perf_counter
+import op_counters
+import phase_timers
+from benchmarks.adapters import ADAPTERS
+from benchmarks.workloads import Workload, check_workload, load, replay
+
+#
+# Benchmark harness
+#
+# A benchmark runs the phases of the former tree_construct_*.sh scripts on one tree type and
+# configuration: insert the initial keys, compute the root, upsert the added keys, check the tree, search
+# and delete keys (and check the tree again). Every phase is repeated 'repetitions' times on a fresh tree,
+# after 'warmup' repetitions whose measurements are discarded. The keys of a repetition only depend on
+# 'seed' and the repetition number. Trees without deletes (see adapters) skip the delete phases, which
+# are then listed with the reason under 'skipped_phases' of the result.
+#
+# Phases that consist of single operations (insert, add, search, delete) are measured per operation, all
+# other phases once per repetition. Every phase is summarized by the mean, median, p95, p99, minimum and
+# maximum of its samples, in seconds. With 'count_operations', every phase also gets the mean number of
+# operations counted by op_counters per sample (counting slows the measured phases down a little). With
+# 'record_phases', the histograms of the phase_timers phases of the measured repetitions (e.g. the phases
+# of the verkle root computation and updates) are added to the result. With 'keep_samples', every phase
+# also keeps its samples, which the statistical comparisons of scaling need.
+#
+# Workload benchmarks load the records of a workload (see workloads) and then replay its operations,
+# measuring every operation.
+#
+
+PER_OPERATION_PHASES = ['insert', 'add', 'search', 'delete']
+
+CSV_FIELDS = ['tree', 'width_bits', 'width', 'key_range_bits', 'initial_keys', 'added_keys', 'search_keys',
+              'deleted_keys', 'workload', 'record_count', 'operation_count', 'distribution', 'key_order',
+              'repetitions', 'phase', 'count', 'mean', 'median', 'p95', 'p99', 'min', 'max']
+
+
+class BenchmarkConfig:
+    """
+    Parameters of one benchmark. The numbers of keys are absolute numbers, not exponents
+    """
+    def __init__(self, tree: str, width_bits: int, key_range_bits: int, initial_keys: int, added_keys: int = 0,
+                 search_keys: int = 0, deleted_keys: int = 0, repetitions: int = 5, warmup: int = 1,
+                 seed: int = 0):
+        assert tree in ADAPTERS, "Unknown tree {0}".format(tree)
+        self.tree = tree
+        self.width_bits = width_bits
+        self.key_range_bits = key_range_bits
+        self.initial_keys = initial_keys
+        self.added_keys = added_keys
+        self.search_keys = search_keys
+        self.deleted_keys = deleted_keys
+        self.repetitions = repetitions
+        self.warmup = warmup
+        self.seed = seed
+
+    @staticmethod
+    def from_exponents(tree: str, width_bits: int, key_range_bits: int, initial: int, added: int = 0,
+                       search: int = 0, deleted: int = 0, **kwargs):
+        """
+        Creates a config from the script arguments, where a count of 2**x keys is given as x and 0 means none
+        """
+        def count(exponent):
+            return 2**exponent if exponent != 0 else 0
+        return BenchmarkConfig(tree, width_bits, key_range_bits, 2**initial, count(added), count(search),
+                               count(deleted), **kwargs)
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__, width=2**self.width_bits)
+
+
+def percentile(sorted_samples: list, p: float) -> float:
+    """
+    Nearest-rank percentile of an ascending list
+    """
+    rank = max(1, math.ceil(p / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def summarize(samples: list) -> dict:
+    samples = sorted(samples)
+    if len(samples) == 0:
+        return {'count': 0}
+    return {'count': len(samples),
+            'mean': sum(samples) / len(samples),
+            'median': percentile(samples, 50) if len(samples) % 2 == 1 else
+            (samples[len(samples) // 2 - 1] + samples[len(samples) // 2]) / 2,
+            'p95': percentile(samples, 95),
+            'p99': percentile(samples, 99),
+            'min': samples[0],
+            'max': samples[-1]}
+
+
+def _run_repetition(adapter, config: BenchmarkConfig, rng: Random, samples: dict, operations: dict = None):
+    """
+    Runs all phases once on a fresh tree and appends the measurements to 'samples'. If 'operations' is
+    given, the counted operations of every phase are added to 'operations[phase]'
+    """
+    def random_key_value():
+        return (rng.randint(0, 2**config.key_range_bits - 1).to_bytes(32, "little"),
+                rng.randint(0, 2**config.key_range_bits - 1).to_bytes(32, "little"))
+
+    def measure(phase, function, *args):
+        if operations is not None:
+            before = op_counters.snapshot()
+        time_a = perf_counter()
+        result = function(*args)
+        samples[phase].append(perf_counter() - time_a)
+        if operations is not None:
+            counted = op_counters.difference(op_counters.snapshot(), before)
+            totals = operations.setdefault(phase, dict.fromkeys(op_counters.COUNTERS, 0))
+            for counter, count in counted.items():
+                totals[counter] += count
+        return result
+
+    values = {}
+    key, value = random_key_value()
+    adapter.new_tree(key, value)
+    values[key] = value
+    for i in range(config.initial_keys - 1):
+        key, value = random_key_value()
+        measure('insert', adapter.insert, key, value)
+        values[key] = value
+    measure('compute_root', adapter.compute_root)
+
+    if config.added_keys > 0:
+        for i in range(config.added_keys):
+            key, value = random_key_value()
+            measure('add', adapter.upsert, key, value)
+            values[key] = value
+        measure('check_valid_tree_after_add', adapter.check_valid)
+
+    if config.search_keys > 0:
+        keys = list(values.keys())
+        rng.shuffle(keys)
+        for key in keys[:config.search_keys]:
+            assert measure('search', adapter.search, key)
+
+    if config.deleted_keys > 0 and adapter.supports_deletes:
+        keys = list(values.keys())
+        rng.shuffle(keys)
+        for key in keys[:config.deleted_keys]:
+            measure('delete', adapter.delete, key)
+            del values[key]
+        measure('check_valid_tree_after_delete', adapter.check_valid)
+
+
+def _start_recording_phases(repetition: int, warmup: int):
+    """
+    Discards the phases recorded so far, once with the first measured repetition
+    """
+    if repetition == 0:
+        phase_timers.enable()
+    if repetition == warmup:
+        phase_timers.reset()
+
+
+def run_benchmark(config: BenchmarkConfig, display_progress: bool = False, count_operations: bool = False,
+                  record_phases: bool = False, keep_samples: bool = False) -> dict:
+    """
+    Runs a benchmark and returns its config and the summary of every phase that was measured
+    """
+    adapter = ADAPTERS[config.tree](config.width_bits)
+    samples = None
+    operations = None
+    was_enabled = op_counters.is_enabled()
+    was_recording = phase_timers.is_enabled()
+    if count_operations:
+        op_counters.enable()
+    try:
+        for repetition in range(config.warmup + config.repetitions):
+            if record_phases:
+                _start_recording_phases(repetition, config.warmup)
+            if repetition == config.warmup or samples is None:
+                samples = {phase: [] for phase in PER_OPERATION_PHASES + ['compute_root', 'check_valid_tree_after_add',
+                                                                          'check_valid_tree_after_delete']}
+                operations = {} if count_operations else None
+            _run_repetition(adapter, config, Random("{0}-{1}".format(config.seed, repetition)), samples, operations)
+            if display_progress:
+                print("{0} width 2^{1}: repetition {2}/{3}{4}".format(
+                    adapter.name, config.width_bits, repetition + 1, config.warmup + config.repetitions,
+                    " (warmup)" if repetition < config.warmup else ""), file=sys.stderr)
+        recorded_phases = phase_timers.export() if record_phases else None
+    finally:
+        if count_operations and not was_enabled:
+            op_counters.disable()
+        if record_phases and not was_recording:
+            phase_timers.disable()
+
+    phases = {phase: summarize(phase_samples) for phase, phase_samples in samples.items() if len(phase_samples) > 0}
+    if keep_samples:
+        for phase in phases:
+            phases[phase]['samples'] = samples[phase]
+    if count_operations:
+        for phase, totals in operations.items():
+            phases[phase]['operations'] = {counter: count / len(samples[phase]) for counter, count in totals.items()}
+    result = {'config': config.to_dict(), 'phases': phases}
+    if config.deleted_keys > 0 and not adapter.supports_deletes:
+        result['skipped_phases'] = {phase: "{0} does not support deletes".format(adapter.name)
+                                    for phase in ['delete', 'check_valid_tree_after_delete']}
+    if record_phases:
+        result['phase_timers'] = recorded_phases
+    return result
+
+
+def run_workload_benchmark(tree: str, width_bits: int, workload: Workload, name: str = None,
+                           repetitions: int = 5, warmup: int = 1, display_progress: bool = False,
+                           record_phases: bool = False, keep_samples: bool = False) -> dict:
+    """
+    Loads and replays 'workload' on a fresh tree in every repetition, in the format of 'run_benchmark'
+    """
+    adapter = ADAPTERS[tree](width_bits)
+    check_workload(adapter, workload)
+    samples = None
+    was_recording = phase_timers.is_enabled()
+    try:
+        for repetition in range(warmup + repetitions):
+            if record_phases:
+                _start_recording_phases(repetition, warmup)
+            if repetition == warmup or samples is None:
+                samples = {'load': []}
+            time_a = perf_counter()
+            load(adapter, workload)
+            samples['load'].append(perf_counter() - time_a)
+            replay(adapter, workload.operations(), samples)
+            if display_progress:
+                print("{0} width 2^{1}: repetition {2}/{3}{4}".format(
+                    adapter.name, width_bits, repetition + 1, warmup + repetitions,
+                    " (warmup)" if repetition < warmup else ""), file=sys.stderr)
+        recorded_phases = phase_timers.export() if record_phases else None
+    finally:
+        if record_phases and not was_recording:
+            phase_timers.disable()
+
+    config = {'tree': tree, 'width_bits': width_bits, 'width': 2**width_bits, 'workload': name,
+              'record_count': workload.record_count, 'operation_count': workload.operation_count,
+              'proportions': workload.proportions, 'distribution': workload.distribution,
+              'key_order': workload.key_order, 'repetitions': repetitions, 'warmup': warmup, 'seed': workload.seed}
+    result = {'config': config, 'phases': {phase: summarize(phase_samples) for phase, phase_samples in samples.items()}}
+    if keep_samples:
+        for phase, phase_samples in samples.items():
+            result['phases'][phase]['samples'] = phase_samples
+    if record_phases:
+        result['phase_timers'] = recorded_phases
+    return result
+
+
+def write_json(results: list, path: str):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+
+
+def write_csv(results: list, path: str):
+    """
+    Writes one row per benchmark and phase
+    """
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, CSV_FIELDS)
+        writer.writeheader()
+        for result in results:
+            for phase, summary in result['phases'].items():
+                row = {field: result['config'].get(field) for field in CSV_FIELDS}
+                row['phase'] = phase
+                row.update(summary)
+                writer.writerow({field: row.get(field) for field in CSV_FIELDS})
+
+
+# The configurations of the former shell scripts as script arguments
+# (WIDTH_BITS, KEY_RANGE, NUMBER_INITIAL_KEYS, NUMBER_ADDED_KEYS, NUMBER_SEARCH_KEYS, NUMBER_DELETED_KEYS)
+SUITES = {
+    'base': [(tree, 1 if tree == 'vbst' else 2, 16, n, n, 0, 0)
+             for n in range(8, 13) for tree in ['vbst', 'vb_tree', 'vbplus_tree']],
+    'benchmark': [(tree, width_bits, 256, 16, 12, 0, 0)
+                  for width_bits in range(2, 9) for tree in ['vb_tree', 'vbplus_tree', 'verkle_trie']],
+    'search': [('vbst', 1, 256, 16, 0, 12, 0)] +
+              [(tree, width_bits, 256, 16, 0, 12, 0)
+               for width_bits in range(2, 9) for tree in ['vb_tree', 'vbplus_tree', 'verkle_trie']],
+    'width': [(tree, width_bits, 16, 12, 12, 0, 0)
+              for width_bits in range(2, 9) for tree in ['vb_tree', 'vbplus_tree']],
+}
+
+
+def get_suite(name: str, **kwargs) -> list:
+    return [BenchmarkConfig.from_exponents(*arguments, **kwargs) for arguments in SUITES[name]]
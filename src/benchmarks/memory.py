@@ -0,0 +1,183 @@
+import csv
+import gc
+import sys
+import tracemalloc
+from random import Random
+import blst
+from benchmarks.adapters import ADAPTERS
+
+#
+# Memory footprint
+#
+# A tree with n random keys is built (inserting the keys and computing the root) while tracemalloc traces
+# all allocations of the interpreter, which gives the peak and the steady-state (after the build) memory.
+# The setup of the tree is created before tracing starts and is not part of either.
+#
+# The steady state is then broken down by walking the tree, counting every object once:
+#   keys_values   key and value bytes (including the separator keys of VB+Tree inner nodes)
+#   nodes         node objects with their attribute dicts and key, value and children lists
+#   commitments   blst.P1 objects: the Python proxy plus the native point, which blst allocates outside
+#                 of the interpreter, so tracemalloc does not see it
+#   hashes        cached node hashes
+# bytes/key is the steady-state traced memory plus the native commitment memory, divided by n.
+#
+
+# Size of a blst_p1 (three 384 bit coordinates), allocated natively for every blst.P1
+P1_NATIVE_BYTES = 144
+
+CATEGORIES = ['keys_values', 'nodes', 'commitments', 'hashes']
+
+CSV_FIELDS = ['tree', 'width_bits', 'width', 'number_keys', 'peak_bytes', 'traced_bytes', 'native_bytes',
+              'total_bytes', 'bytes_per_key'] + \
+             ['{0}_bytes'.format(category) for category in CATEGORIES] + \
+             ['{0}_objects'.format(category) for category in CATEGORIES]
+
+
+class _Breakdown:
+    def __init__(self):
+        self.bytes = dict.fromkeys(CATEGORIES, 0)
+        self.objects = dict.fromkeys(CATEGORIES, 0)
+        self.native_bytes = 0
+        self.seen = set()
+
+    def add(self, category: str, x):
+        if x is None or id(x) in self.seen:
+            return
+        self.seen.add(id(x))
+        size = sys.getsizeof(x)
+        if hasattr(x, "__dict__"):
+            size += sys.getsizeof(x.__dict__)
+        if isinstance(x, blst.P1):
+            size += sys.getsizeof(x.this)
+            self.native_bytes += P1_NATIVE_BYTES
+        self.bytes[category] += size
+        self.objects[category] += 1
+
+    def add_all(self, category: str, xs: list):
+        for x in xs:
+            self.add(category, x)
+
+    def add_container(self, xs: list):
+        """
+        Adds the size of a list of a node, but not of its elements
+        """
+        if id(xs) not in self.seen:
+            self.seen.add(id(xs))
+            self.bytes['nodes'] += sys.getsizeof(xs)
+
+
+def _walk_vbst(node, breakdown: _Breakdown):
+    stack = [node]
+    while len(stack) > 0:
+        node = stack.pop()
+        if node is None:
+            continue
+        breakdown.add('nodes', node)
+        breakdown.add_all('keys_values', [node.key, node.value])
+        breakdown.add('commitments', node.commitment)
+        breakdown.add('hashes', node.hash)
+        stack += [node.left, node.right]
+
+
+def _walk_b_tree(node, breakdown: _Breakdown):
+    """
+    Walks a VB-Tree or VB+Tree
+    """
+    stack = [node]
+    while len(stack) > 0:
+        node = stack.pop()
+        breakdown.add('nodes', node)
+        breakdown.add_all('keys_values', node.keys)
+        breakdown.add_container(node.keys)
+        if hasattr(node, "values"):
+            breakdown.add_all('keys_values', node.values)
+            breakdown.add_container(node.values)
+        breakdown.add('commitments', node.commitment)
+        breakdown.add('hashes', node.hash)
+        if hasattr(node, "children"):
+            breakdown.add_container(node.children)
+            stack += node.children
+
+
+def _walk_verkle_trie(node, breakdown: _Breakdown):
+    stack = [node]
+    while len(stack) > 0:
+        node = stack.pop()
+        breakdown.add('nodes', node)
+        breakdown.add('hashes', node.get("hash"))
+        if node["node_type"] == "leaf":
+            breakdown.add_all('keys_values', [node["key"], node["value"]])
+        else:
+            breakdown.add('commitments', node["commitment"])
+            stack += [node[i] for i in node if isinstance(i, int)]
+
+
+def memory_breakdown(adapter) -> _Breakdown:
+    breakdown = _Breakdown()
+    if adapter.name == 'Verkle':
+        _walk_verkle_trie(adapter.root, breakdown)
+    elif adapter.name == 'VBST':
+        _walk_vbst(adapter.tree.root, breakdown)
+    else:
+        _walk_b_tree(adapter.tree.root, breakdown)
+    return breakdown
+
+
+def measure_memory(tree: str, width_bits: int, number_keys: int, seed: int = 0) -> dict:
+    """
+    Builds a tree of type 'tree' with 'number_keys' random keys and returns its memory footprint
+    """
+    adapter = ADAPTERS[tree](width_bits)
+    rng = Random(seed)
+
+    def random_bytes():
+        return rng.randbytes(32)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        adapter.new_tree(random_bytes(), random_bytes())
+        for i in range(number_keys - 1):
+            adapter.insert(random_bytes(), random_bytes())
+        adapter.compute_root()
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    breakdown = memory_breakdown(adapter)
+    traced_bytes = current - baseline
+    total_bytes = traced_bytes + breakdown.native_bytes
+    result = {'tree': tree, 'width_bits': width_bits, 'width': 2**width_bits, 'number_keys': number_keys,
+              'peak_bytes': peak - baseline + breakdown.native_bytes, 'traced_bytes': traced_bytes,
+              'native_bytes': breakdown.native_bytes, 'total_bytes': total_bytes,
+              'bytes_per_key': total_bytes / number_keys}
+    for category in CATEGORIES:
+        result['{0}_bytes'.format(category)] = breakdown.bytes[category]
+        result['{0}_objects'.format(category)] = breakdown.objects[category]
+    result['commitments_bytes'] += breakdown.native_bytes
+    return result
+
+
+def run_memory_benchmark(tree: str, width_bits: int, exponents=range(10, 23), seed: int = 0,
+                         display_progress: bool = False) -> list:
+    """
+    Measures the memory footprint for n = 2**x keys for every x in 'exponents'
+    """
+    results = []
+    for exponent in exponents:
+        results.append(measure_memory(tree, width_bits, 2**exponent, seed))
+        if display_progress:
+            print("{0} width 2^{1}, n = 2^{2}: {3:.1f} bytes/key".format(
+                tree, width_bits, exponent, results[-1]['bytes_per_key']), file=sys.stderr)
+    return results
+
+
+def write_memory_csv(results: list, path: str):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, CSV_FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result)
@@ -0,0 +1,145 @@
+import csv
+import sys
+from random import Random
+from time import perf_counter
+import blst
+import msm
+import pippenger
+from parallel_msm import MsmExecutor
+from benchmarks.harness import summarize
+
+#
+# MSM benchmarks and autotuner
+#
+# The benchmark times the MSM backends of msm for n = 2**x points and several densities, i.e. fractions
+# of nonzero factors (the delta updates of a commitment only have a few). Every MSM is done
+# 'repetitions' times, after one warmup. The points are distinct multiples of the generator, the factors
+# random 256 bit numbers. With 'workers', the MSMs are also timed with a parallel_msm executor (backend
+# 'parallel'), which holds the points in its workers.
+#
+# The autotuner times every backend, and pippenger_simple with the windows around its heuristic, for the
+# smallest size of every size bucket of msm, and chooses the fastest backend of every bucket (with the
+# fastest window for pippenger_simple, which is also kept when another backend is chosen, in case that
+# one is not available). Once the naive backend is more than PRUNE_FACTOR times slower than the fastest
+# one, it is not timed for the larger buckets anymore.
+#
+
+PRUNE_FACTOR = 8
+WINDOW_RADIUS = 2
+
+CSV_FIELDS = ['n', 'density', 'nonzero', 'backend', 'window', 'count', 'mean', 'median', 'p95', 'p99', 'min', 'max']
+
+
+def make_points(n: int, seed: int = 0) -> list:
+    """
+    Points (a + i) * G, which are cheaper to compute by additions than by random multiples
+    """
+    point = blst.G1().mult(Random(seed).randint(1, msm.MODULUS - 1))
+    points = []
+    for i in range(n):
+        points.append(point.dup())
+        point.add(blst.G1())
+    return points
+
+
+def make_factors(n: int, density: float, rng: Random) -> list:
+    """
+    n factors, of which round(n * density) (at least one) are nonzero
+    """
+    factors = [0] * n
+    for i in rng.sample(range(n), max(1, round(n * density))):
+        factors[i] = rng.randint(1, 2**256 - 1)
+    return factors
+
+
+def time_msm(backend: str, points: list, factors: list, window: int = None, repetitions: int = 3,
+             executor: MsmExecutor = None) -> list:
+    samples = []
+    for repetition in range(repetitions + 1):
+        time_a = perf_counter()
+        if backend == 'parallel':
+            executor.multiexp(points, factors)
+        else:
+            msm.multiexp_with(backend, points, factors, window)
+        if repetition > 0:
+            samples.append(perf_counter() - time_a)
+    return samples
+
+
+def run_msm_benchmark(exponents=range(0, 17), densities=(1.0, 0.1, 0.01), backends=None, repetitions: int = 3,
+                      seed: int = 0, display_progress: bool = False, workers: int = None) -> list:
+    """
+    Times every backend for n = 2**x points for every x in 'exponents' and every density. All MSMs of one n
+    and density have the same (nonzero) points and factors
+    """
+    backends = backends if backends is not None else \
+        [backend for backend in msm.BACKENDS if backend != 'native' or msm.native_available()]
+    rng = Random(seed)
+    points = make_points(2**max(exponents), seed)
+    executor = None
+    if workers is not None:
+        executor = MsmExecutor({"points": points}, workers, threshold=0)
+        backends = backends + ['parallel']
+    results = []
+    for exponent in exponents:
+        n = 2**exponent
+        for density in densities:
+            factors = make_factors(n, density, rng)
+            nonzero = [i for i in range(n) if factors[i] != 0]
+            nonzero_points = [points[i] for i in nonzero]
+            nonzero_factors = [factors[i] for i in nonzero]
+            for backend in backends:
+                window = pippenger.default_window(len(nonzero)) if backend == 'pippenger' else None
+                summary = summarize(time_msm(backend, nonzero_points, nonzero_factors, window, repetitions,
+                                             executor))
+                results.append(dict(summary, n=n, density=density, nonzero=len(nonzero), backend=backend,
+                                    window=window))
+                if display_progress:
+                    print("MSM n = 2^{0}, density {1}, {2}: {3:.6f} s".format(exponent, density, backend,
+                                                                               summary['median']), file=sys.stderr)
+    if executor is not None:
+        executor.close()
+    return results
+
+
+def write_msm_csv(results: list, path: str):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, CSV_FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow({field: result.get(field) for field in CSV_FIELDS})
+
+
+def _candidates(n: int) -> list:
+    default = pippenger.default_window(n)
+    windows = range(max(1, default - WINDOW_RADIUS), default + WINDOW_RADIUS + 1)
+    return [('naive', None)] + [('pippenger', window) for window in windows] + \
+        ([('native', None)] if msm.native_available() else [])
+
+
+def autotune(max_bucket: int = 17, repetitions: int = 3, seed: int = 0, display_progress: bool = False) -> dict:
+    """
+    Returns the choice {'backend', 'window', 'seconds'} of the size buckets 1 to 'max_bucket' (sizes up to
+    2**max_bucket - 1), for msm.set_tuning or msm.save_tuning
+    """
+    rng = Random(seed)
+    points = make_points(2**(max_bucket - 1), seed)
+    naive_pruned = False
+    tuning = {}
+    for bucket in range(1, max_bucket + 1):
+        n = 2**(bucket - 1)
+        factors = make_factors(n, 1.0, rng)
+        medians = {}
+        for candidate in _candidates(n):
+            if candidate[0] == 'naive' and naive_pruned:
+                continue
+            medians[candidate] = summarize(time_msm(candidate[0], points[:n], factors, candidate[1],
+                                                    repetitions))['median']
+        fastest = min(medians, key=medians.get)
+        window = min([candidate for candidate in medians if candidate[0] == 'pippenger'], key=medians.get)[1]
+        tuning[bucket] = {'backend': fastest[0], 'window': window, 'seconds': medians[fastest]}
+        naive_pruned = naive_pruned or medians.get(('naive', None), 0) > PRUNE_FACTOR * medians[fastest]
+        if display_progress:
+            print("MSM bucket {0} (n = {1}): {2}, window {3}, {4:.6f} s".format(
+                bucket, n, fastest[0], window, medians[fastest]), file=sys.stderr)
+    return tuning
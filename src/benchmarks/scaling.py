@@ -0,0 +1,282 @@
+import csv
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from benchmarks.harness import BenchmarkConfig, run_benchmark
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as pyplot
+except ImportError:
+    pyplot = None
+
+#
+# Scaling benchmarks, baselines and regression checks
+#
+# A sweep runs the benchmark phases for every tree, width and number of keys n = 2**x, keeping all samples.
+# Its results can be saved as a named baseline in evaluation/baselines, together with the environment it
+# was measured in. A later sweep is compared against a baseline benchmark by benchmark and phase: only
+# benchmarks with the same configuration (tree, width, keys and seed, but not the number of repetitions)
+# are compared. A phase has regressed if its median got slower by more than 'threshold' (relative) and a
+# two-sided Mann-Whitney U test of the samples rejects that both runs are equally fast at level 'alpha'.
+#
+# The curves of the former data_processing notebook are written as CSV files and, if matplotlib is
+# installed, as plots:
+#   throughput_vs_n     operations per second (1 / mean time per operation) over the number of keys
+#   latency_vs_width    median, p95 and p99 time per operation over the width, for the largest n
+#
+
+BASELINE_FORMAT_VERSION = 1
+BASELINE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "evaluation", "baselines")
+
+SWEEP_TREES = ['vb_tree', 'vbplus_tree', 'verkle_trie']
+SWEEP_KEY_RANGE_BITS = 256
+SWEEP_OPERATIONS = 256
+
+CURVE_PHASES = ['insert', 'add', 'search']
+
+# Configuration fields that do not change what is measured
+_NOT_COMPARED = ['repetitions', 'warmup']
+
+
+def sweep_configs(trees: list = None, widths: list = range(2, 9), exponents: list = range(8, 13),
+                  operations: int = SWEEP_OPERATIONS, repetitions: int = 5, warmup: int = 1, seed: int = 0) -> list:
+    """
+    Configs with n = 2**x initial keys for every x in 'exponents', and up to 'operations' added and searched
+    keys. VBST is binary and only runs with width 2
+    """
+    configs = []
+    for tree in trees if trees is not None else SWEEP_TREES:
+        for width_bits in widths if tree != 'vbst' else [1]:
+            for exponent in exponents:
+                number_keys = 2**exponent
+                configs.append(BenchmarkConfig(tree, width_bits, SWEEP_KEY_RANGE_BITS, number_keys,
+                                               min(number_keys, operations), min(number_keys, operations),
+                                               repetitions=repetitions, warmup=warmup, seed=seed))
+    return configs
+
+
+def run_sweep(configs: list, display_progress: bool = False) -> list:
+    return [run_benchmark(config, display_progress=display_progress, keep_samples=True) for config in configs]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def baseline_path(name: str, directory: str = BASELINE_DIRECTORY) -> str:
+    return os.path.join(directory, name + ".json")
+
+
+def save_baseline(results: list, name: str, directory: str = BASELINE_DIRECTORY) -> str:
+    """
+    Saves sweep results as baseline 'name' and returns its path
+    """
+    os.makedirs(directory, exist_ok=True)
+    baseline = {'version': BASELINE_FORMAT_VERSION,
+                'name': name,
+                'created': datetime.now(timezone.utc).isoformat(),
+                'git_commit': _git_commit(),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'results': results}
+    path = baseline_path(name, directory)
+    with open(path, "w") as file:
+        json.dump(baseline, file, indent=2)
+    return path
+
+
+def load_baseline(name: str, directory: str = BASELINE_DIRECTORY) -> dict:
+    with open(baseline_path(name, directory)) as file:
+        baseline = json.load(file)
+    assert baseline.get('version') == BASELINE_FORMAT_VERSION, \
+        "Baseline {0} has format version {1}, expected {2}".format(name, baseline.get('version'),
+                                                                   BASELINE_FORMAT_VERSION)
+    return baseline
+
+
+def list_baselines(directory: str = BASELINE_DIRECTORY) -> list:
+    if not os.path.isdir(directory):
+        return []
+    return sorted(file_name[:-len(".json")] for file_name in os.listdir(directory) if file_name.endswith(".json"))
+
+
+def mann_whitney_u(a: list, b: list) -> tuple:
+    """
+    Two-sided Mann-Whitney U test with the normal approximation (with tie and continuity correction).
+    Returns U of 'a' and the p-value
+    """
+    n_a, n_b = len(a), len(b)
+    n = n_a + n_b
+    combined = sorted([(x, 0) for x in a] + [(x, 1) for x in b])
+    rank_sum_a = 0
+    tie_term = 0
+    i = 0
+    while i < n:
+        j = i
+        while j < n and combined[j][0] == combined[i][0]:
+            j += 1
+        # Ranks i + 1 to j share their mean
+        rank = (i + 1 + j) / 2
+        rank_sum_a += rank * sum(1 for k in range(i, j) if combined[k][1] == 0)
+        tie_term += (j - i)**3 - (j - i)
+        i = j
+    u = rank_sum_a - n_a * (n_a + 1) / 2
+    mean = n_a * n_b / 2
+    variance = n_a * n_b / 12 * ((n + 1) - tie_term / (n * (n - 1))) if n > 1 else 0
+    if variance <= 0:
+        return u, 1.0
+    z = (abs(u - mean) - 0.5) / math.sqrt(variance)
+    return u, min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
+
+
+def _config_key(config: dict) -> str:
+    return json.dumps({field: value for field, value in config.items() if field not in _NOT_COMPARED},
+                      sort_keys=True)
+
+
+def compare(baseline_results: list, results: list, threshold: float = 0.05, alpha: float = 0.05) -> list:
+    """
+    Compares every phase of 'results' with the same benchmark of 'baseline_results'. Every comparison has a
+    status: 'regression', 'improvement', 'unchanged', or 'new' if the baseline does not have the phase
+    """
+    baseline_phases = {_config_key(result['config']): result['phases'] for result in baseline_results}
+    comparisons = []
+    for result in results:
+        config = result['config']
+        phases = baseline_phases.get(_config_key(config), {})
+        for phase, summary in result['phases'].items():
+            comparison = {'tree': config['tree'], 'width_bits': config['width_bits'],
+                          'number_keys': config.get('initial_keys', config.get('record_count')), 'phase': phase,
+                          'median': summary['median'], 'baseline_median': None, 'change': None, 'p_value': None,
+                          'status': 'new'}
+            comparisons.append(comparison)
+            if phase not in phases:
+                continue
+            baseline = phases[phase]
+            comparison['baseline_median'] = baseline['median']
+            comparison['change'] = summary['median'] / baseline['median'] - 1 if baseline['median'] > 0 else 0
+            if 'samples' in summary and 'samples' in baseline:
+                comparison['p_value'] = mann_whitney_u(summary['samples'], baseline['samples'])[1]
+            significant = comparison['p_value'] is not None and comparison['p_value'] < alpha
+            if significant and comparison['change'] > threshold:
+                comparison['status'] = 'regression'
+            elif significant and comparison['change'] < -threshold:
+                comparison['status'] = 'improvement'
+            else:
+                comparison['status'] = 'unchanged'
+    return comparisons
+
+
+def regressions(comparisons: list) -> list:
+    return [comparison for comparison in comparisons if comparison['status'] == 'regression']
+
+
+def throughput_vs_n(results: list, phase: str = 'insert') -> list:
+    """
+    Rows (tree, width_bits, number_keys, throughput in operations per second)
+    """
+    rows = []
+    for result in results:
+        summary = result['phases'].get(phase)
+        if summary is not None and summary['count'] > 0 and summary['mean'] > 0:
+            config = result['config']
+            rows.append({'tree': config['tree'], 'width_bits': config['width_bits'],
+                         'number_keys': config['initial_keys'], 'phase': phase, 'throughput': 1 / summary['mean']})
+    return sorted(rows, key=lambda row: (row['tree'], row['width_bits'], row['number_keys']))
+
+
+def latency_vs_width(results: list, phase: str = 'search') -> list:
+    """
+    Rows (tree, width_bits, number_keys, median, p95, p99), for the largest number of keys of every tree
+    """
+    largest = {}
+    for result in results:
+        config = result['config']
+        if phase in result['phases']:
+            largest[config['tree']] = max(largest.get(config['tree'], 0), config['initial_keys'])
+    rows = []
+    for result in results:
+        config = result['config']
+        summary = result['phases'].get(phase)
+        if summary is not None and config['initial_keys'] == largest[config['tree']]:
+            rows.append({'tree': config['tree'], 'width_bits': config['width_bits'],
+                         'number_keys': config['initial_keys'], 'phase': phase, 'median': summary['median'],
+                         'p95': summary['p95'], 'p99': summary['p99']})
+    return sorted(rows, key=lambda row: (row['tree'], row['width_bits']))
+
+
+def _write_rows(rows: list, path: str):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, list(rows[0].keys()) if len(rows) > 0 else ['tree'])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _plot(rows: list, x: str, ys: list, x_label: str, y_label: str, title: str, path: str):
+    """
+    Plots one line per tree (and width, unless the width is on the x axis) and y field
+    """
+    def line(row):
+        return (row['tree'],) if x == 'width_bits' else (row['tree'], row['width_bits'])
+
+    figure, axes = pyplot.subplots()
+    for key in sorted({line(row) for row in rows}):
+        line_rows = [row for row in rows if line(row) == key]
+        for y in ys:
+            label = " ".join([key[0]] + ["width 2^{0}".format(width_bits) for width_bits in key[1:]] +
+                             ([y] if len(ys) > 1 else []))
+            axes.plot([row[x] for row in line_rows], [row[y] for row in line_rows], marker="o", label=label)
+    if x == 'number_keys':
+        axes.set_xscale("log", base=2)
+    axes.set_yscale("log")
+    axes.set_xlabel(x_label)
+    axes.set_ylabel(y_label)
+    axes.set_title(title)
+    axes.legend(fontsize="small")
+    figure.savefig(path)
+    pyplot.close(figure)
+
+
+def write_curves(results: list, directory: str) -> list:
+    """
+    Writes the throughput-vs-n and latency-vs-width curves of every phase in CURVE_PHASES to 'directory',
+    as CSV files and, if matplotlib is installed, as PNG plots. Returns the paths of the written files
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for phase in CURVE_PHASES:
+        throughput = throughput_vs_n(results, phase)
+        latency = latency_vs_width(results, phase)
+        if len(throughput) == 0:
+            continue
+        for name, rows in [("throughput_vs_n", throughput), ("latency_vs_width", latency)]:
+            paths.append(os.path.join(directory, "{0}_{1}.csv".format(name, phase)))
+            _write_rows(rows, paths[-1])
+        if pyplot is not None:
+            paths.append(os.path.join(directory, "throughput_vs_n_{0}.png".format(phase)))
+            _plot(throughput, 'number_keys', ['throughput'], "number of keys", "operations / s",
+                  "{0} throughput".format(phase), paths[-1])
+            paths.append(os.path.join(directory, "latency_vs_width_{0}.png".format(phase)))
+            _plot(latency, 'width_bits', ['median', 'p95', 'p99'], "log2(width)", "s / operation",
+                  "{0} latency".format(phase), paths[-1])
+    return paths
+
+
+def print_comparisons(comparisons: list, file=sys.stdout):
+    for comparison in comparisons:
+        if comparison['status'] == 'new':
+            print("{tree}\t{width_bits}\t{number_keys}\t{phase}\tnew".format(**comparison), file=file)
+        else:
+            print("{tree}\t{width_bits}\t{number_keys}\t{phase}\t{change:+.1%}\tp {p}\t{status}".format(
+                p="{0:.4f}".format(comparison['p_value']) if comparison['p_value'] is not None else "-",
+                **comparison), file=file)
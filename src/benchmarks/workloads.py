@@ -0,0 +1,234 @@
+import hashlib
+from random import Random
+from time import perf_counter
+
+#
+# YCSB-style workloads
+#
+# A workload first loads 'record_count' records and then runs 'operation_count' operations drawn from a
+# mix of reads, updates, inserts, deletes and scans. Records are numbered in insert order. The record an
+# operation touches is chosen by the request distribution:
+#   uniform     every record equally likely
+#   zipfian     record i with probability proportional to 1 / (i + 1)**theta, so a few records are hot
+#   latest      like zipfian, but the most recently inserted records are the hot ones
+#   sequential  the records in turn
+# The key of a record is either the sha256 of its number ('hashed', keys spread over the keyspace) or the
+# number itself in big endian ('ordered', every insert is larger than all keys so far, in the byte order
+# that the trees compare keys in).
+#
+# Operations are streamed by generators as (operation, key, argument), where the argument is the value
+# for inserts and updates, the number of keys for scans and None otherwise. Everything is drawn from one
+# Random seeded with 'seed', so a workload always produces the same operations and can be replayed
+# against every tree type that supports its operations. Workloads with deletes are rejected by
+# 'check_workload' for trees whose adapter does not support deletes, before anything is generated.
+#
+
+READ = 'read'
+UPDATE = 'update'
+INSERT = 'insert'
+DELETE = 'delete'
+SCAN = 'scan'
+
+OPERATIONS = [READ, UPDATE, INSERT, DELETE, SCAN]
+
+ZIPFIAN_CONSTANT = 0.99
+
+
+class UniformGenerator:
+    def next(self, rng: Random, items: int) -> int:
+        return rng.randrange(items)
+
+
+class SequentialGenerator:
+    def __init__(self):
+        self.counter = 0
+
+    def next(self, rng: Random, items: int) -> int:
+        self.counter += 1
+        return (self.counter - 1) % items
+
+
+class ZipfianGenerator:
+    """
+    Zipfian distribution over [0, items) as in YCSB (Gray et al., Quickly generating billion-record
+    synthetic databases). The normalization constant is extended incrementally when items are added
+    """
+    def __init__(self, items: int, theta: float = ZIPFIAN_CONSTANT):
+        self.theta = theta
+        self.alpha = 1 / (1 - theta)
+        self.zeta2 = self._zeta(0, 2, 0)
+        self.items = 0
+        self.zetan = 0
+        self._set_items(items)
+
+    def _zeta(self, start: int, end: int, initial: float) -> float:
+        return initial + sum(1 / (i + 1)**self.theta for i in range(start, end))
+
+    def _set_items(self, items: int):
+        if items > self.items:
+            self.zetan = self._zeta(self.items, items, self.zetan)
+        else:
+            self.zetan = self._zeta(0, items, 0)
+        self.items = items
+        self.eta = (1 - (2 / items)**(1 - self.theta)) / (1 - self.zeta2 / self.zetan)
+
+    def next(self, rng: Random, items: int) -> int:
+        if items != self.items:
+            self._set_items(items)
+        u = rng.random()
+        uz = u * self.zetan
+        if uz < 1:
+            return 0
+        if uz < 1 + 0.5**self.theta:
+            return 1
+        return min(items - 1, int(items * (self.eta * u - self.eta + 1)**self.alpha))
+
+
+class LatestGenerator(ZipfianGenerator):
+    def next(self, rng: Random, items: int) -> int:
+        return items - 1 - super().next(rng, items)
+
+
+DISTRIBUTIONS = {
+    'uniform': lambda items: UniformGenerator(),
+    'zipfian': lambda items: ZipfianGenerator(items),
+    'latest': lambda items: LatestGenerator(items),
+    'sequential': lambda items: SequentialGenerator(),
+}
+
+
+class Workload:
+    """
+    Operation mix and parameters of a workload. The proportions are normalized
+    """
+    def __init__(self, record_count: int, operation_count: int, read: float = 0.5, update: float = 0.5,
+                 insert: float = 0, delete: float = 0, scan: float = 0, distribution: str = 'zipfian',
+                 key_order: str = 'hashed', max_scan_length: int = 100, value_size: int = 32, seed: int = 0):
+        assert record_count > 0
+        assert distribution in DISTRIBUTIONS, "Unknown distribution {0}".format(distribution)
+        assert key_order in ['hashed', 'ordered']
+        total = read + update + insert + delete + scan
+        assert total > 0
+        self.record_count = record_count
+        self.operation_count = operation_count
+        self.proportions = {READ: read / total, UPDATE: update / total, INSERT: insert / total,
+                            DELETE: delete / total, SCAN: scan / total}
+        self.distribution = distribution
+        self.key_order = key_order
+        self.max_scan_length = max_scan_length
+        self.value_size = value_size
+        self.seed = seed
+
+    def key(self, record: int) -> bytes:
+        if self.key_order == 'ordered':
+            return record.to_bytes(32, "big")
+        return hashlib.sha256(record.to_bytes(8, "little")).digest()
+
+    def load(self):
+        """
+        Yields the inserts of the initial records
+        """
+        rng = Random("{0}-load".format(self.seed))
+        for record in range(self.record_count):
+            yield INSERT, self.key(record), rng.randbytes(self.value_size)
+
+    def operations(self):
+        """
+        Yields the operations of the run phase
+        """
+        rng = Random("{0}-run".format(self.seed))
+        chooser = DISTRIBUTIONS[self.distribution](self.record_count)
+        thresholds = []
+        cumulative = 0
+        for operation in OPERATIONS:
+            cumulative += self.proportions[operation]
+            thresholds.append((cumulative, operation))
+
+        records = self.record_count
+        deleted = set()
+
+        def choose_record():
+            # Deleted records are skipped, so every operation but an insert touches an existing key
+            while True:
+                record = chooser.next(rng, records)
+                if record not in deleted:
+                    return record
+
+        for i in range(self.operation_count):
+            u = rng.random()
+            operation = next((operation for threshold, operation in thresholds if u < threshold), thresholds[-1][1])
+            if operation != INSERT and len(deleted) == records:
+                operation = INSERT
+
+            if operation == INSERT:
+                yield INSERT, self.key(records), rng.randbytes(self.value_size)
+                records += 1
+            elif operation == UPDATE:
+                yield UPDATE, self.key(choose_record()), rng.randbytes(self.value_size)
+            elif operation == DELETE:
+                record = choose_record()
+                deleted.add(record)
+                yield DELETE, self.key(record), None
+            elif operation == SCAN:
+                yield SCAN, self.key(choose_record()), rng.randint(1, self.max_scan_length)
+            else:
+                yield READ, self.key(choose_record()), None
+
+
+# The core YCSB workloads, and sorted inserts
+WORKLOADS = {
+    'a': dict(read=0.5, update=0.5),
+    'b': dict(read=0.95, update=0.05),
+    'c': dict(read=1, update=0),
+    'd': dict(read=0.95, update=0, insert=0.05, distribution='latest'),
+    'e': dict(read=0, update=0, scan=0.95, insert=0.05),
+    'sorted_inserts': dict(read=0, update=0, insert=1, key_order='ordered'),
+}
+
+
+def get_workload(name: str, record_count: int, operation_count: int, **kwargs) -> Workload:
+    return Workload(record_count, operation_count, **dict(WORKLOADS[name], **kwargs))
+
+
+def check_workload(adapter, workload: Workload):
+    """
+    Raises ValueError if 'workload' contains operations that 'adapter' does not support
+    """
+    if workload.proportions[DELETE] > 0 and not adapter.supports_deletes:
+        raise ValueError("{0} does not support deletes, which are {1:.0%} of the workload".format(
+            adapter.name, workload.proportions[DELETE]))
+
+
+def load(adapter, workload: Workload):
+    """
+    Builds a fresh tree of 'adapter' with the initial records and computes its commitments
+    """
+    check_workload(adapter, workload)
+    records = workload.load()
+    operation, key, value = next(records)
+    adapter.new_tree(key, value)
+    for operation, key, value in records:
+        adapter.insert(key, value)
+    adapter.compute_root()
+
+
+def replay(adapter, operations, samples: dict = None) -> dict:
+    """
+    Applies a stream of operations to 'adapter' and returns the number of operations of every type. If
+    'samples' is given, the latency of every operation is appended to 'samples[operation]'
+    """
+    counts = {operation: 0 for operation in OPERATIONS}
+    for operation, key, argument in operations:
+        time_a = perf_counter()
+        if operation == READ:
+            adapter.search(key)
+        elif operation == UPDATE or operation == INSERT:
+            adapter.upsert(key, argument)
+        elif operation == DELETE:
+            adapter.delete(key)
+        elif operation == SCAN:
+            adapter.scan(key, argument)
+        if samples is not None:
+            samples.setdefault(operation, []).append(perf_counter() - time_a)
+        counts[operation] += 1
+    return counts
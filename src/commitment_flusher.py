@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import verkle_trie
+from vbst import VBST
+from write_ahead_log import apply_operations, add_missing_hashes, UPSERT, DELETE
+
+#
+# Write-behind commitments
+#
+# Writes only record the operation in the pending batch (the current epoch) and return. A background
+# thread takes the pending batch, applies it to the tree with 'apply_operations' and then recomputes the
+# commitments of all changed nodes with 'add_missing_hashes', after which the epoch is flushed. 'root'
+# and 'make_proof' wait until the epoch they depend on is flushed; 'get' answers from the pending
+# operations or the tree and never waits for commitments.
+#
+# The flusher thread is the only one that changes the tree. Changing the structure is done under
+# 'structure_lock', which is all that 'get' needs; the commitment work only holds 'commit_lock', which
+# 'root' and 'make_proof' take so they see a tree whose commitments are complete.
+#
+# If applying a batch fails, the flusher thread stops and every later call raises its exception, so no
+# write is accepted that would never be applied and no read answers from a tree that is partly updated.
+#
+
+
+class CommitmentFlusher:
+    """
+    Applies writes to 'tree' (a VBST, VBTree, VBPlusTree or the root of a verkle trie) in the background
+    """
+    def __init__(self, tree):
+        self.tree = tree
+        self.structure_lock = threading.Lock()
+        self.commit_lock = threading.Lock()
+        # Protects the pending batch, the overlay and the epochs
+        self.condition = threading.Condition()
+        self.pending = []
+        # key -> (epoch, value) of the latest pending write of every key, value None for deletes
+        self.overlay = {}
+        self.epoch = 1
+        self.flushed_epoch = 0
+        self.error = None
+        self.closed = False
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _check_error(self):
+        """
+        Raises the exception of the flusher thread, if it failed. Needs 'condition'
+        """
+        if self.error is not None:
+            raise self.error
+
+    def _write(self, operation: int, key: bytes, value: bytes) -> int:
+        with self.condition:
+            self._check_error()
+            assert not self.closed, "Flusher is closed"
+            self.pending.append((operation, key, value if value is not None else b""))
+            self.overlay[key] = (self.epoch, value)
+            self.condition.notify_all()
+            return self.epoch
+
+    def put(self, key: bytes, value: bytes) -> int:
+        """
+        Inserts or updates 'key' and returns the epoch the write belongs to
+        """
+        return self._write(UPSERT, key, value)
+
+    def delete(self, key: bytes) -> int:
+        return self._write(DELETE, key, None)
+
+    def get(self, key: bytes) -> bytes:
+        with self.condition:
+            self._check_error()
+            if key in self.overlay:
+                return self.overlay[key][1]
+        with self.structure_lock:
+            if isinstance(self.tree, dict):
+                node = verkle_trie.find_node(self.tree, key)
+                return node["value"] if node is not None else None
+            node = self.tree.find_node(self.tree.root, key)
+            if node is None:
+                return None
+            if isinstance(self.tree, VBST):
+                return node.value
+            node, idx = node
+            return node.values[idx]
+
+    def wait(self, epoch: int = None) -> int:
+        """
+        Waits until 'epoch' (by default, the epoch of all writes so far) is flushed and returns it
+        """
+        with self.condition:
+            if epoch is None:
+                epoch = self.epoch if len(self.pending) > 0 else self.epoch - 1
+            self.condition.wait_for(lambda: self.flushed_epoch >= epoch or self.error is not None)
+            self._check_error()
+            return epoch
+
+    async def wait_async(self, epoch: int = None) -> int:
+        return await asyncio.get_running_loop().run_in_executor(None, self.wait, epoch)
+
+    def root(self, epoch: int = None) -> bytes:
+        """
+        Returns the compressed root commitment once 'epoch' is flushed. It can include later epochs
+        """
+        self.wait(epoch)
+        with self.commit_lock:
+            if isinstance(self.tree, dict):
+                return self.tree["commitment"].compress()
+            return self.tree.root.commitment.compress() if self.tree.root.commitment is not None else None
+
+    def make_proof(self, keys: list, epoch: int = None):
+        """
+        Makes a verkle proof for 'keys' once 'epoch' is flushed
+        """
+        assert isinstance(self.tree, dict), "Proofs are only supported for verkle tries"
+        self.wait(epoch)
+        with self.commit_lock:
+            return verkle_trie.make_verkle_proof(self.tree, keys, False)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.pending) > 0 or self.closed)
+                if len(self.pending) == 0:
+                    return
+                batch, self.pending = self.pending, []
+                epoch = self.epoch
+                self.epoch += 1
+
+            try:
+                with self.commit_lock:
+                    with self.structure_lock:
+                        apply_operations(self.tree, batch, commit=False)
+                    add_missing_hashes(self.tree)
+            except Exception as error:
+                with self.condition:
+                    self.error = error
+                    self.condition.notify_all()
+                return
+
+            with self.condition:
+                self.flushed_epoch = epoch
+                for key in [key for key, (key_epoch, value) in self.overlay.items() if key_epoch <= epoch]:
+                    del self.overlay[key]
+                self.condition.notify_all()
+
+    def close(self):
+        """
+        Flushes all pending writes and stops the background thread
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,79 @@
+import threading
+import verkle_trie
+import tree_snapshot
+from versioned_trie import VersionedVerkleTrie
+
+#
+# Snapshot isolated readers for a verkle trie
+#
+# A single writer builds every batch as a new version of a VersionedVerkleTrie. Building a version
+# only changes nodes that are not reachable from any published root, so readers never see a half
+# updated path. Once a version is complete, publishing it is a single reference swap under a short
+# lock; a reader takes the root that is current at that moment (its epoch) and keeps reading it, even
+# after newer epochs are published or its epoch is dropped by the retention policy.
+#
+# Readers in other processes can be served from 'export', which writes the root of an epoch as a
+# snapshot file.
+#
+
+
+class EpochSnapshot:
+    """
+    Read-only view of the trie at one epoch
+    """
+    def __init__(self, epoch: int, root: dict):
+        self.epoch = epoch
+        self.root = root
+
+    def root_commitment(self) -> bytes:
+        return self.root["commitment"].compress()
+
+    def get(self, key: bytes) -> bytes:
+        node = verkle_trie.find_node(self.root, key)
+        return node["value"] if node is not None else None
+
+    def make_proof(self, keys: list, display_times: bool = False, multiproof=verkle_trie.make_kzg_multiproof):
+        return verkle_trie.make_verkle_proof(self.root, keys, display_times, multiproof)
+
+
+class ConcurrentVerkleTrie:
+    """
+    Verkle trie with one writer and any number of reader threads, each reading a consistent epoch
+    """
+    def __init__(self, root: dict, retain: int = 8):
+        self.trie = VersionedVerkleTrie(root, retain)
+        # Serializes writers
+        self.write_lock = threading.Lock()
+        # Protects the version table, held only to read or publish a root
+        self.lock = threading.Lock()
+
+    @property
+    def epoch(self) -> int:
+        return self.trie.latest
+
+    def snapshot(self, epoch: int = None) -> EpochSnapshot:
+        """
+        Returns a snapshot of 'epoch', by default the latest published one
+        """
+        with self.lock:
+            epoch = epoch if epoch is not None else self.trie.latest
+            return EpochSnapshot(epoch, self.trie.root(epoch))
+
+    def write(self, updates: dict, deletes: list = ()) -> int:
+        """
+        Applies a batch of updates and deletes and publishes it as a new epoch, which is returned.
+        Readers are only blocked while the new root is published
+        """
+        with self.write_lock:
+            root = self.trie.build_version(updates, deletes)
+            with self.lock:
+                return self.trie.add_version(root)
+
+    def export(self, path: str, epoch: int = None) -> int:
+        """
+        Writes the root of 'epoch' to a snapshot file for readers in other processes, which load it with
+        'tree_snapshot.load'. Returns the exported epoch
+        """
+        snapshot = self.snapshot(epoch)
+        tree_snapshot.snapshot(snapshot.root, path)
+        return snapshot.epoch
@@ -0,0 +1,359 @@
+import sys
+import struct
+import weakref
+import blst
+from page_store import PageStore, DEFAULT_PAGE_SIZE
+from node_cache import NodeCache
+from vbplus_tree import VBPlusTree, VBPlusTreeNode, KzgIntegration, int_from_bytes
+
+#
+# Disk backed VB+Tree
+#
+# Every node is stored in one page of a PageStore, with children referenced by page id. A node that
+# has not been read yet is a PagedVBPlusTreeNode which only knows its page id; the first access to
+# any of its attributes loads the page. All methods of VBPlusTree therefore work unchanged, and only
+# the nodes on the paths that are actually visited are read from disk.
+#
+# Loaded nodes are tracked by a NodeCache. Between operations, and after every subtree while
+# 'add_node_hash' walks the tree, the least recently used nodes are written back if they are dirty and
+# unloaded again, i.e. turned back into stubs, until the loaded nodes fit into the cache's byte budget.
+# A stub knows its depth from the parent it was reached through, so a node in the pinned levels is
+# pinned however it is loaded.
+#
+# A new tree raises the page size of its store until a full node, with width - 1 keys and values of
+# ITEM_SIZE bytes, fits into a page. Larger keys or values need a larger page size from the start.
+#
+# Node page layout (little endian):
+#   node type        1 byte (0 = leaf, 1 = inner)
+#   has hash         1 byte
+#   hash             32 bytes
+#   commitment       48 bytes (compressed)
+#   key count        2 bytes
+#   next leaf        8 bytes (leaf only, 0 if none)
+#   keys             2 byte length + key, for every key
+#   values           2 byte length + value, for every value (leaf only)
+#   children         8 byte page id, key count + 1 of them (inner only)
+#
+
+NODE_HEADER = struct.Struct("<BB32s48sH")
+PAGE_ID = struct.Struct("<Q")
+LENGTH = struct.Struct("<H")
+
+NODE_TYPES = ['leaf', 'inner']
+
+# Size of the keys and values (int_to_bytes) that the page size is derived for
+ITEM_SIZE = 32
+
+# Approximate memory used by a blst.P1 (Python proxy plus the point in Jacobian coordinates)
+# and by an unloaded child node
+COMMITMENT_MEMORY_SIZE = 200
+STUB_MEMORY_SIZE = 150
+
+
+def encode_node(node: VBPlusTreeNode) -> bytes:
+    """
+    Encodes a node into its page representation. All children (and the next leaf) need to have a page id
+    """
+    out = bytearray(NODE_HEADER.pack(NODE_TYPES.index(node.node_type), node.hash is not None,
+                                     node.hash if node.hash is not None else bytes(32),
+                                     node.commitment.compress(), node.key_count()))
+    if node.node_type == 'leaf':
+        out += PAGE_ID.pack(node.next_leaf.page_id if node.next_leaf is not None else 0)
+    for key in node.keys:
+        out += LENGTH.pack(len(key)) + key
+    if node.node_type == 'leaf':
+        for value in node.values:
+            out += LENGTH.pack(len(value)) + value
+    else:
+        for child in node.children:
+            out += PAGE_ID.pack(child.page_id)
+    return bytes(out)
+
+
+def get_page_size(width: int, item_size: int = ITEM_SIZE) -> int:
+    """
+    Smallest multiple of DEFAULT_PAGE_SIZE that holds a full leaf of a tree of 'width', which is larger
+    than a full inner node
+    """
+    leaf_size = NODE_HEADER.size + PAGE_ID.size + (width - 1) * 2 * (LENGTH.size + item_size)
+    return -(-leaf_size // DEFAULT_PAGE_SIZE) * DEFAULT_PAGE_SIZE
+
+
+def decode_node(data: bytes) -> dict:
+    """
+    Decodes a node page into a dictionary of node attributes, with page ids in place of the child nodes
+    """
+    node_type, has_hash, node_hash, commitment, key_count = NODE_HEADER.unpack_from(data)
+    offset = NODE_HEADER.size
+    attributes = {'node_type': NODE_TYPES[node_type],
+                  'hash': node_hash if has_hash else None,
+                  'commitment': blst.P1(commitment),
+                  'parent': None}
+
+    if node_type == 0:
+        attributes['next_leaf'] = PAGE_ID.unpack_from(data, offset)[0]
+        offset += PAGE_ID.size
+
+    def read_items(offset, count):
+        items = []
+        for i in range(count):
+            length = LENGTH.unpack_from(data, offset)[0]
+            offset += LENGTH.size
+            items.append(data[offset:offset + length])
+            offset += length
+        return items, offset
+
+    attributes['keys'], offset = read_items(offset, key_count)
+    if node_type == 0:
+        attributes['values'], offset = read_items(offset, key_count)
+    else:
+        attributes['children'] = [PAGE_ID.unpack_from(data, offset + i * PAGE_ID.size)[0]
+                                  for i in range(key_count + 1)]
+    return attributes
+
+
+def get_node_size(node: VBPlusTreeNode) -> int:
+    """
+    Estimates the number of bytes a loaded node occupies in memory
+    """
+    size = sys.getsizeof(node.__dict__) + sys.getsizeof(node.keys) + COMMITMENT_MEMORY_SIZE
+    if node.hash is not None:
+        size += sys.getsizeof(node.hash)
+    size += sum(sys.getsizeof(key) for key in node.keys)
+    if node.node_type == 'leaf':
+        size += sys.getsizeof(node.values) + sum(sys.getsizeof(value) for value in node.values)
+    else:
+        size += sys.getsizeof(node.children) + STUB_MEMORY_SIZE * len(node.children)
+    return size
+
+
+class PagedVBPlusTreeNode(VBPlusTreeNode):
+    """
+    A VB+Tree node stored in a page. Its attributes are read from the page on first access
+    """
+    def __init__(self, tree, page_id: int, depth: int = None):
+        # VBPlusTreeNode.__init__ is deliberately not called, all attributes come from the page
+        self.tree = tree
+        self.page_id = page_id
+        self.depth = depth
+
+    def is_loaded(self) -> bool:
+        return 'node_type' in self.__dict__
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set, i.e. before the node has been loaded
+        if name.startswith('__') or name in ('tree', 'page_id', 'depth') or self.is_loaded():
+            raise AttributeError(name)
+        self.tree._load_node(self)
+        return object.__getattribute__(self, name)
+
+
+class DiskVBPlusTree(VBPlusTree):
+    """
+    VB+Tree whose nodes live in a PageStore and are loaded on demand. The stored nodes carry their
+    commitments and hashes, so a reopened tree does not need 'add_node_hash'.
+
+    If the store is empty, 'root' is used as the root of a new tree.
+    """
+    def __init__(self, kzg: KzgIntegration, store: PageStore, root: VBPlusTreeNode = None, cache: NodeCache = None):
+        self.store = store
+        self.cache = cache if cache is not None else NodeCache()
+        self.nodes = weakref.WeakValueDictionary()
+        self.dirty_nodes = {}
+        # Nodes whose subtree 'add_node_hash' is working on, by id
+        self.nodes_in_use = {}
+        # Set during an update, whose nodes must stay loaded until it is done
+        self.updating = False
+
+        if store.root_page_id != 0:
+            assert store.width == kzg.width, "Page store was written with a different width"
+            root = self._node(store.root_page_id, 0)
+        else:
+            assert root is not None, "A new tree needs a root node"
+            store.width = kzg.width
+            if store.page_size < get_page_size(kzg.width):
+                store.set_page_size(get_page_size(kzg.width))
+        super().__init__(kzg, root)
+
+    def _node(self, page_id: int, depth: int = None) -> PagedVBPlusTreeNode:
+        """
+        Returns the node stored in page 'page_id'. There is at most one node object per page
+        """
+        node = self.nodes.get(page_id)
+        if node is None:
+            node = PagedVBPlusTreeNode(self, page_id, depth)
+            self.nodes[page_id] = node
+        elif depth is not None:
+            node.depth = depth
+        return node
+
+    def _load_node(self, node: PagedVBPlusTreeNode, depth: int = None):
+        """
+        Reads the page of 'node' and sets its attributes. Without 'depth', the depth of the stub is used
+        """
+        if depth is None:
+            depth = node.depth
+        else:
+            node.depth = depth
+        attributes = decode_node(self.store.read_page(node.page_id))
+        if attributes['node_type'] == 'leaf':
+            next_leaf = attributes['next_leaf']
+            attributes['next_leaf'] = self._node(next_leaf) if next_leaf != 0 else None
+        else:
+            child_depth = depth + 1 if depth is not None else None
+            attributes['children'] = [self._node(page_id, child_depth) for page_id in attributes['children']]
+        node.__dict__.update(attributes)
+        self.cache.add(node.page_id, node, get_node_size(node), depth)
+
+    def _unload_node(self, node: PagedVBPlusTreeNode):
+        """
+        Turns a loaded node back into a stub. Its object stays valid and is reloaded on the next access
+        """
+        tree, page_id, depth = node.tree, node.page_id, node.depth
+        node.__dict__.clear()
+        node.tree = tree
+        node.page_id = page_id
+        node.depth = depth
+
+    def _touch(self, node: VBPlusTreeNode, depth: int):
+        """
+        Records an access to 'node' at 'depth' in the cache, loading it if necessary
+        """
+        if not isinstance(node, PagedVBPlusTreeNode):
+            # Created by a split and not written yet
+            return
+        if node.is_loaded():
+            node.depth = depth
+            self.cache.touch(node.page_id, node, get_node_size(node), depth)
+        else:
+            self._load_node(node, depth)
+
+    def evict(self):
+        """
+        Unloads the least recently used nodes until the loaded nodes fit into the cache's byte budget
+        """
+        self.cache.evict(lambda node: id(node) in self.dirty_nodes, self.flush, self._unload_node,
+                         lambda node: id(node) in self.nodes_in_use)
+
+    def _mark_dirty(self, node: VBPlusTreeNode):
+        self.dirty_nodes[id(node)] = node
+
+    def _mark_path_dirty(self, key: bytes) -> list:
+        """
+        Marks every node on the path to 'key' as dirty and returns them. Inserting 'key' only changes
+        these nodes and nodes that are newly created by splits
+        """
+        nodes = [node for node, idx in self.find_path_to_leaf(self.root, key)]
+        for node in nodes:
+            self._mark_dirty(node)
+        return nodes
+
+    def _assign_page_id(self, node: VBPlusTreeNode):
+        """
+        Gives a node created by VBPlusTree (splits or a new root) a page and turns it into a paged node
+        """
+        node.page_id = self.store.allocate()
+        node.tree = self
+        node.depth = None
+        node.__class__ = PagedVBPlusTreeNode
+        self.nodes[node.page_id] = node
+        self.cache.add(node.page_id, node, get_node_size(node))
+        self._mark_dirty(node)
+
+    def _assign_new_page_ids(self, nodes: list):
+        """
+        Gives a page to every new node that is reachable from 'nodes'. New nodes can only be reached
+        through nodes that were changed, i.e. dirty nodes
+        """
+        if getattr(self.root, 'page_id', None) is None:
+            self._assign_page_id(self.root)
+            nodes = [self.root] + nodes
+
+        stack = list(nodes)
+        while len(stack) > 0:
+            node = stack.pop()
+            references = node.children if node.node_type == 'inner' else [node.next_leaf]
+            for child in references:
+                if child is not None and getattr(child, 'page_id', None) is None:
+                    self._assign_page_id(child)
+                    stack.append(child)
+
+    def find_path_to_leaf(self, node: VBPlusTreeNode, key: bytes, path: list = None) -> list:
+        self._touch(node, len(path) if path is not None else 0)
+        return super().find_path_to_leaf(node, key, path)
+
+    def find_node(self, node: VBPlusTreeNode, key: bytes):
+        if node is not self.root:
+            return super().find_node(node, key)
+        leaf_node, leaf_idx = self.find_path_to_leaf(node, key)[-1]
+        self.evict()
+        if leaf_idx < leaf_node.key_count() and leaf_node.keys[leaf_idx] == key:
+            return (leaf_node, leaf_idx)
+        return None
+
+    def insert_node(self, key: bytes, value: bytes, update: bool = False):
+        path_nodes = self._mark_path_dirty(key)
+        super().insert_node(key, value, update)
+        self._assign_new_page_ids(path_nodes)
+        self.evict()
+
+    def upsert_vc_node(self, key: bytes, value: bytes):
+        """
+        Insert or update a node in the tree, update the hashes/commitments and write the changed nodes back
+        """
+        self._mark_path_dirty(key)
+        self.updating = True
+        try:
+            super().upsert_vc_node(key, value)
+        finally:
+            self.updating = False
+        self.flush()
+        self.evict()
+
+    def add_node_hash(self, node: VBPlusTreeNode, depth: int = None):
+        """
+        Adds node hashes and commitments down the tree like VBPlusTree.add_node_hash. After every child
+        subtree, nodes outside the current path are evicted (unless this is part of an update), so the
+        whole tree is never loaded at once. A node is only marked dirty once its hash is computed, so a
+        write back on the way down does not leave it clean with a stale commitment
+        """
+        if depth is None and node is self.root:
+            depth = 0
+        self._touch(node, depth)
+        if node.node_type == 'leaf':
+            node.node_hash()
+        else:
+            self.nodes_in_use[id(node)] = node
+            try:
+                values = {}
+                for i in range(len(node.children)):
+                    child = node.children[i]
+                    if child.hash is None:
+                        self.add_node_hash(child, depth + 1 if depth is not None else None)
+                        if not self.updating:
+                            self.evict()
+                    values[i] = int_from_bytes(child.hash)
+            finally:
+                del self.nodes_in_use[id(node)]
+            node.commitment = self.kzg.compute_commitment_lagrange(values)
+            node.node_hash()
+        self._mark_dirty(node)
+
+    def flush(self, sync: bool = False):
+        """
+        Writes all dirty nodes back to their pages
+        """
+        # Parents and neighbouring leaves refer to new nodes by page id, so all of them need a page before
+        # any node is encoded
+        self._assign_new_page_ids(list(self.dirty_nodes.values()))
+
+        for node in self.dirty_nodes.values():
+            self.store.write_page(node.page_id, encode_node(node))
+        self.dirty_nodes = {}
+
+        self.store.root_page_id = self.root.page_id
+        self.store.flush(sync)
+
+    def close(self):
+        self.flush()
+        self.store.close()
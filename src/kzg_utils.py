@@ -1,5 +1,6 @@
 import blst
-import pippenger
+import msm
+import op_counters
 
 #
 # Utilities for dealing with polynomials in evaluation form
@@ -28,8 +29,23 @@ class KzgUtils():
         self.SETUP = SETUP
         self.primefield = primefield
         # Precomputed inverses of 1 / (1 - DOMAIN[i])
-        self.inverses = [0] + [primefield.inv(1 - DOMAIN[i]) for i in range(1, WIDTH)]
+        self.inverses = [0] + primefield.multi_inv([1 - DOMAIN[i] for i in range(1, WIDTH)])
         self.inverse_width = primefield.inv(self.WIDTH)
+        # (z, [1 / (z - DOMAIN[i])]) of the last z given to domain_inverses
+        self.last_domain_inverses = (None, None)
+
+
+    def domain_inverses(self, z):
+        """
+        Returns [1 / (z - DOMAIN[i]) for i in range(WIDTH)], computed with one batch inversion (0 where z = DOMAIN[i]).
+        The inverses of the last z are kept, as a multiproof needs them several times for its challenge t
+        """
+        z = z % self.MODULUS
+        last_z, inverses = self.last_domain_inverses
+        if last_z != z:
+            inverses = self.primefield.multi_inv([z - x for x in self.DOMAIN])
+            self.last_domain_inverses = (z, inverses)
+        return inverses
 
 
     def evaluate_polynomial_in_evaluation_form(self, f, z):
@@ -38,9 +54,10 @@ class KzgUtils():
         Uses the barycentric formula:
         f(z) = (1 - z**WIDTH) / WIDTH  *  sum_(i=0)^WIDTH  (f(DOMAIN[i]) * DOMAIN[i]) / (z - DOMAIN[i])
         """
+        inverses = self.domain_inverses(z)
         r = 0
         for i in range(self.WIDTH):
-            r += self.primefield.div(f[i] * self.DOMAIN[i], (z - self.DOMAIN[i]) )
+            r += f[i] * self.DOMAIN[i] * inverses[i] % self.MODULUS
         r = r * (pow(z, self.WIDTH, self.MODULUS) - 1) * self.inverse_width % self.MODULUS
 
         return r
@@ -69,9 +86,10 @@ class KzgUtils():
         Compute the quotient q(X) = (f(X) - y)) / (X - z) in evaluation form. Note that this only works if the quotient
         is exact, i.e. f(z) = y, and otherwise returns garbage
         """
+        inverses = self.domain_inverses(z)
         q = [0] * self.WIDTH
         for i in range(self.WIDTH):
-            q[i] = self.primefield.div(f[i] - y, self.DOMAIN[i] - z)
+            q[i] = (y - f[i]) * inverses[i] % self.MODULUS
 
         return q
 
@@ -83,6 +101,7 @@ class KzgUtils():
         which is equivalent to
         e(C - [y], [1]) * e(-pi, [s - z]) == 1
         """
+        op_counters.count('mult', 'add')
         pairing = blst.PT(blst.G2().to_affine(), C.dup().add(blst.G1().mult(y).neg()).to_affine())
         pairing.mul(blst.PT(self.SETUP["g2"][1].dup().add(blst.G2().mult(z).neg()).to_affine(), pi.dup().neg().to_affine()))
 
@@ -102,13 +121,14 @@ class KzgUtils():
             y = self.evaluate_polynomial_in_evaluation_form(f, z)
             q = self.compute_outer_quotient_in_evaluation_form(f, z, y)
 
-        return y, pippenger.pippenger_simple(self.SETUP["g1_lagrange"], q)
+        return y, msm.multiexp(self.SETUP["g1_lagrange"], q)
 
 
     def compute_commitment_lagrange(self, values):
         """
         Computes a commitment for a function given in evaluation form.
         'values' is a dictionary and can have missing indices, which improves efficiency.
+        The MSM backend is chosen by the number of values, see msm.
         """
-        commitment = pippenger.pippenger_simple([self.SETUP["g1_lagrange"][i] for i in values.keys()], values.values())
+        commitment = msm.multiexp([self.SETUP["g1_lagrange"][i] for i in values.keys()], values.values())
         return commitment
\ No newline at end of file
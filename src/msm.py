@@ -0,0 +1,148 @@
+import json
+import os
+import blst
+import op_counters
+import pippenger
+
+#
+# Multi-scalar multiplication with tunable backends
+#
+# 'multiexp' computes sum(factors[i] * group_elements[i]) with one of the backends
+#   naive        lincomb_naive, one scalar multiplication per point
+#   pippenger    pippenger_simple with a given window size (None for its own heuristic)
+#   native       the Pippenger implementation of blst (P1_Affines.mult_pippenger)
+# chosen by the size of the MSM (after dropping zero factors). MSM sizes are bimodal: the sparse delta
+# updates of a few values next to full WIDTH commitments, so the choice is made per size bucket, where
+# bucket b holds the sizes 2**(b - 1) to 2**b - 1.
+#
+# The choices come from the autotuner of benchmarks.msm_tuning, which saves them to TUNING_PATH. Nothing
+# is loaded on import: until 'load_tuning' or 'set_tuning' is called (e.g. by 'python -m benchmarks
+# --use-tuning'), every MSM uses pippenger_simple with its heuristic.
+#
+# MSMs with at least the threshold of the executor set with 'set_executor' (see parallel_msm) are split
+# over its worker processes instead.
+#
+
+MODULUS = 0x73eda753299d7d483339d80809a1d80553bda402fffe5bfeffffffff00000001
+
+BACKENDS = ['naive', 'pippenger', 'native']
+DEFAULT_CHOICE = {'backend': 'pippenger', 'window': None}
+
+TUNING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evaluation", "msm_tuning.json")
+
+_tuning = {}
+_executor = None
+
+
+def native_available() -> bool:
+    return hasattr(blst, "P1_Affines") and hasattr(blst.P1_Affines, "mult_pippenger")
+
+
+def size_bucket(n: int) -> int:
+    return n.bit_length()
+
+
+def set_tuning(tuning: dict):
+    """
+    Sets the choice {'backend': ..., 'window': ...} of every size bucket. Buckets without a choice use
+    DEFAULT_CHOICE
+    """
+    global _tuning
+    for choice in tuning.values():
+        assert choice['backend'] in BACKENDS, "Unknown MSM backend {0}".format(choice['backend'])
+    _tuning = {int(bucket): choice for bucket, choice in tuning.items()}
+
+
+def get_tuning() -> dict:
+    return dict(_tuning)
+
+
+def save_tuning(tuning: dict, path: str = TUNING_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump({str(bucket): choice for bucket, choice in sorted(tuning.items())}, file, indent=2)
+
+
+def load_tuning(path: str = TUNING_PATH) -> bool:
+    """
+    Uses the tuning saved at 'path', if there is one
+    """
+    if not os.path.exists(path):
+        return False
+    with open(path) as file:
+        set_tuning(json.load(file))
+    return True
+
+
+def set_executor(executor):
+    """
+    Lets large MSMs use 'executor' (a parallel_msm.MsmExecutor), or none if it is None
+    """
+    global _executor
+    _executor = executor
+
+
+def get_executor():
+    return _executor
+
+
+def choose(n: int) -> dict:
+    choice = _tuning.get(size_bucket(n), DEFAULT_CHOICE)
+    if choice['backend'] == 'native' and not native_available():
+        return DEFAULT_CHOICE
+    return choice
+
+
+def native_multiexp(group_elements, factors):
+    """
+    MSM with the Pippenger implementation of blst. The factors are reduced modulo the group order, as blst
+    takes 256 bit scalars, and points at infinity are left out, as blst does not handle them
+    """
+    points = []
+    scalars = []
+    for group_element, factor in zip(group_elements, factors):
+        if not group_element.is_inf():
+            points.append(group_element)
+            scalars.append((factor % MODULUS).to_bytes(32, "little"))
+    if len(points) == 0:
+        return blst.P1_generator().mult(0)
+    return blst.P1_Affines.mult_pippenger(blst.P1_Affines.as_memory(points), b"".join(scalars))
+
+
+def multiexp_with(backend: str, group_elements, factors, window: int = None):
+    """
+    MSM with a given backend and, for pippenger, window size
+    """
+    if backend == 'naive':
+        return pippenger.lincomb_naive(group_elements, factors)
+    elif backend == 'native':
+        return native_multiexp(group_elements, factors)
+    return pippenger.pippenger_simple(group_elements, factors, window)
+
+
+def multiexp_serial(group_elements: list, factors: list):
+    """
+    MSM in this process with the backend chosen for its size
+    """
+    choice = choose(len(factors))
+    return multiexp_with(choice['backend'], group_elements, factors, choice.get('window'))
+
+
+def multiexp(group_elements, factors):
+    """
+    MSM with the backend chosen for its size, or with the executor if the MSM is large enough. Zero factors
+    are left out
+    """
+    group_elements = list(group_elements)
+    factors = list(factors)
+    assert len(group_elements) == len(factors)
+    op_counters.count_msm(len(factors))
+    nonzero = [i for i, factor in enumerate(factors) if factor != 0]
+    if len(nonzero) < len(factors):
+        group_elements = [group_elements[i] for i in nonzero]
+        factors = [factors[i] for i in nonzero]
+    if len(factors) == 0:
+        return blst.P1_generator().mult(0)
+    if _executor is not None and len(factors) >= _executor.threshold:
+        return _executor.multiexp(group_elements, factors)
+    return multiexp_serial(group_elements, factors)
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+
+#
+# LRU cache of loaded nodes in front of a page store
+#
+# The cache only does the bookkeeping: which nodes are loaded, how many bytes they take and in which
+# order they were used. Writing dirty nodes back and unloading a node are done by the tree through the
+# callbacks passed to 'evict'. Nodes in the upper 'pinned_levels' levels are never evicted, since every
+# operation goes through them.
+#
+
+
+class NodeCache:
+    """
+    Bounded LRU cache of loaded tree nodes with a byte budget, keyed by page id
+    """
+    def __init__(self, byte_budget: int = 64 * 2**20, pinned_levels: int = 2):
+        self.byte_budget = byte_budget
+        self.pinned_levels = pinned_levels
+        # page id -> [node, size, pinned]
+        self.entries = OrderedDict()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.write_backs = 0
+
+    def _set(self, page_id: int, node, size: int, pinned: bool):
+        entry = self.entries.get(page_id)
+        if entry is not None:
+            self.size -= entry[1]
+        self.entries[page_id] = [node, size, pinned]
+        self.entries.move_to_end(page_id)
+        self.size += size
+
+    def add(self, page_id: int, node, size: int, depth: int = None):
+        """
+        Adds a node that was just loaded from its page
+        """
+        self.misses += 1
+        self._set(page_id, node, size, depth is not None and depth < self.pinned_levels)
+
+    def touch(self, page_id: int, node, size: int, depth: int = None):
+        """
+        Marks a node as used. A node is pinned while it is touched at a depth above 'pinned_levels'
+        """
+        entry = self.entries.get(page_id)
+        if entry is not None:
+            self.hits += 1
+            pinned = depth < self.pinned_levels if depth is not None else entry[2]
+            self._set(page_id, node, size, pinned)
+
+    def remove(self, page_id: int):
+        entry = self.entries.pop(page_id, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def evict(self, is_dirty, write_back, unload, in_use=None):
+        """
+        Evicts the least recently used unpinned nodes until the cache is within its byte budget.
+        If any of them is dirty, 'write_back' is called once before it is unloaded. Nodes for which
+        'in_use' returns True are skipped like pinned ones
+        """
+        if self.size <= self.byte_budget:
+            return
+
+        written_back = False
+        for page_id in list(self.entries.keys()):
+            if self.size <= self.byte_budget:
+                break
+            node, size, pinned = self.entries[page_id]
+            if pinned or (in_use is not None and in_use(node)):
+                continue
+            if not written_back and is_dirty(node):
+                write_back()
+                self.write_backs += 1
+                written_back = True
+            self.remove(page_id)
+            unload(node)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "write_backs": self.write_backs,
+                "nodes": len(self.entries),
+                "bytes": self.size,
+                "pinned": sum(1 for node, size, pinned in self.entries.values() if pinned)}
@@ -0,0 +1,103 @@
+import threading
+
+#
+# Hot path operation counters
+#
+# Counts the expensive operations done by the trees:
+#   msm          multi-scalar multiplications (msm.multiexp, which backs the KZG commitments and proofs),
+#                whatever their backend
+#   msm_points   total number of points of these MSMs (including the ones with zero factors)
+#   mult         single scalar multiplications of G1 points
+#   add          additions of G1 points
+#   compress     point compressions
+#   sha256       sha256 invocations of the hash functions of the trees
+#   inversions   field inversions (PrimeField.inv, which also backs div and multi_inv)
+#   node_hash    node_hash calls of VBST, VB-Tree and VB+Tree nodes
+# Point operations done inside an MSM are part of its cost and are not counted as mult or add.
+#
+# The counted modules report their operations through the hooks 'count' and 'count_msm' where they do
+# them, so only the operations of the trees are counted (e.g. not the sha256 of a snapshot digest). Counting
+# is off by default, and a hook then only checks a flag: 'enable' and 'disable' switch it. The counters are
+# shared by all threads, and an enabled hook updates them under a lock so that no count is lost; MSMs of a
+# parallel_msm executor are counted once, in the process that calls it.
+#
+#   with op_counters.counting() as stats:
+#       tree.upsert_vc_node(key, value)
+#   print(stats)
+#
+
+COUNTERS = ['msm', 'msm_points', 'mult', 'add', 'compress', 'sha256', 'inversions', 'node_hash']
+
+_lock = threading.Lock()
+_counts = dict.fromkeys(COUNTERS, 0)
+_enabled = False
+
+
+def count(*counters: str, amount: int = 1):
+    """
+    Counts 'amount' operations of each of 'counters', if counting is enabled
+    """
+    if _enabled:
+        with _lock:
+            for counter in counters:
+                _counts[counter] += amount
+
+
+def count_msm(number_points: int):
+    """
+    Counts an MSM of 'number_points' points, if counting is enabled
+    """
+    if _enabled:
+        with _lock:
+            _counts['msm'] += 1
+            _counts['msm_points'] += number_points
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    with _lock:
+        for counter in COUNTERS:
+            _counts[counter] = 0
+
+
+def snapshot() -> dict:
+    """
+    Returns a copy of the current counters
+    """
+    with _lock:
+        return dict(_counts)
+
+
+def difference(after: dict, before: dict) -> dict:
+    return {counter: after[counter] - before[counter] for counter in COUNTERS}
+
+
+class counting:
+    """
+    Context manager that enables counting (if it is not enabled yet) and yields a dict that holds the
+    operations done within the context when it exits
+    """
+    def __enter__(self) -> dict:
+        self.was_enabled = is_enabled()
+        enable()
+        self.stats = dict.fromkeys(COUNTERS, 0)
+        self.before = snapshot()
+        return self.stats
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stats.update(difference(snapshot(), self.before))
+        if not self.was_enabled:
+            disable()
@@ -0,0 +1,94 @@
+import os
+import struct
+
+#
+# Fixed size page storage in a local file
+#
+# Page 0 holds the header, all other pages hold one tree node each. Since the header is never a
+# node, page id 0 can be used as the "no page" reference inside node pages. The page size of a store can
+# only change while it holds no node pages.
+#
+
+PAGE_STORE_MAGIC = b"VCTP"
+PAGE_STORE_VERSION = 1
+
+DEFAULT_PAGE_SIZE = 4096
+
+# magic, version, page size, tree width, number of pages, root page id
+HEADER = struct.Struct("<4sIIIQQ")
+
+
+class PageStore:
+    """
+    Maps page ids to fixed size pages in a local file
+    """
+    def __init__(self, path: str, page_size: int = DEFAULT_PAGE_SIZE, width: int = 0):
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.path = path
+        self.file = open(path, "r+b" if exists else "w+b")
+
+        if exists:
+            magic, version, page_size, width, number_pages, root_page_id = HEADER.unpack(
+                self.file.read(HEADER.size))
+            if magic != PAGE_STORE_MAGIC or version != PAGE_STORE_VERSION:
+                raise ValueError("{0} is not a page store".format(path))
+        else:
+            assert page_size >= HEADER.size
+            number_pages = 1
+            root_page_id = 0
+
+        self.page_size = page_size
+        self.width = width
+        self.number_pages = number_pages
+        self.root_page_id = root_page_id
+
+        if not exists:
+            self.flush()
+
+    def set_page_size(self, page_size: int):
+        assert self.number_pages == 1, "The page size can only change before any page is allocated"
+        assert page_size >= HEADER.size
+        self.page_size = page_size
+        self.flush()
+
+    def allocate(self) -> int:
+        """
+        Reserves a new page and returns its id
+        """
+        page_id = self.number_pages
+        self.number_pages += 1
+        return page_id
+
+    def read_page(self, page_id: int) -> bytes:
+        assert 0 < page_id < self.number_pages, "Tried to read a page that was never allocated"
+        self.file.seek(page_id * self.page_size)
+        return self.file.read(self.page_size)
+
+    def write_page(self, page_id: int, data: bytes):
+        assert 0 < page_id < self.number_pages, "Tried to write a page that was never allocated"
+        if len(data) > self.page_size:
+            raise ValueError("{0} bytes do not fit into a page of {1} bytes".format(len(data), self.page_size))
+        self.file.seek(page_id * self.page_size)
+        self.file.write(data + bytes(self.page_size - len(data)))
+
+    def flush(self, sync: bool = False):
+        """
+        Writes the header and flushes the file. With 'sync' the data is also fsync'ed to disk
+        """
+        self.file.seek(0)
+        self.file.write(HEADER.pack(PAGE_STORE_MAGIC, PAGE_STORE_VERSION, self.page_size, self.width,
+                                    self.number_pages, self.root_page_id))
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,116 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import blst
+import msm
+
+#
+# Parallel multi-scalar multiplication
+#
+# An MsmExecutor splits an MSM into one chunk per worker process, computes the partial MSMs of the chunks
+# with msm.multiexp in the workers and adds up the results. MSMs with fewer than 'threshold' nonzero
+# factors are computed serially, as the parallel version costs some milliseconds of overhead.
+#
+# blst points cannot be pickled, so points are sent to the workers serialized (uncompressed, which is
+# much cheaper to read than compressed). The point sets given to the executor (e.g. the Lagrange setup)
+# are sent to every worker once when it starts: a chunk of points from these sets is sent as indices.
+# Points are recognized as part of a set by their identity, which is cheap, and otherwise by their value,
+# so a setup that is rebuilt with the same points (e.g. by configuring verkle_trie again) is still sent as
+# indices. The workers hold copies, so the points of a set must not be changed in place.
+#
+# Once installed with msm.set_executor, every msm.multiexp (KZG commitments and proofs, multiproof
+# verification) with at least 'threshold' nonzero factors uses the executor. With the default threshold
+# that is not the case for any commitment or KZG proof of a verkle trie of width 256 (at most 256 points)
+# or of the narrower trees. Only the E MSM of check_kzg_multiproof, with one point per opening of a proof,
+# and full commitments of wider tries reach the executor. The overhead of splitting an MSM depends on the
+# machine, so time the serial and parallel MSMs with 'python -m benchmarks --msm --msm-workers N' and pass
+# the size from which the parallel one is faster as 'threshold' to use the executor for smaller MSMs.
+#
+#   with MsmExecutor({"g1_lagrange": SETUP["g1_lagrange"]}) as executor:
+#       msm.set_executor(executor)
+#       ...
+#
+
+PARALLEL_THRESHOLD = 512
+
+# Points of the point sets of a worker process, by set name
+_worker_point_sets = {}
+
+
+def _initialize_worker(serialized_point_sets: dict):
+    # A forked worker inherits the executor of its parent
+    msm.set_executor(None)
+    for name, serialized_points in serialized_point_sets.items():
+        _worker_point_sets[name] = [blst.P1(point) for point in serialized_points]
+
+
+def _partial_multiexp(point_set: str, points: list, factors: list) -> bytes:
+    """
+    MSM of a chunk in a worker. 'points' are indices into 'point_set', or serialized points if it is None
+    """
+    if point_set is not None:
+        group_elements = [_worker_point_sets[point_set][i] for i in points]
+    else:
+        group_elements = [blst.P1(point) for point in points]
+    return msm.multiexp(group_elements, factors).serialize()
+
+
+class MsmExecutor:
+    """
+    Computes MSMs in 'workers' processes (os.cpu_count() by default)
+    """
+    def __init__(self, point_sets: dict = None, workers: int = None, threshold: int = PARALLEL_THRESHOLD):
+        self.point_sets = point_sets if point_sets is not None else {}
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.threshold = threshold
+        serialized_point_sets = {name: [point.serialize() for point in points]
+                                 for name, points in self.point_sets.items()}
+        # id of a point -> (point set, index), and the same by serialized point
+        self.point_indices = {}
+        self.point_indices_by_value = {}
+        for name, points in self.point_sets.items():
+            for i, (point, serialized_point) in enumerate(zip(points, serialized_point_sets[name])):
+                self.point_indices.setdefault(id(point), (name, i))
+                self.point_indices_by_value.setdefault(serialized_point, (name, i))
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_initialize_worker,
+                                        initargs=(serialized_point_sets,))
+
+    def _chunk_arguments(self, group_elements: list, factors: list) -> tuple:
+        indices = [self.point_indices.get(id(group_element)) for group_element in group_elements]
+        serialized_points = None
+        if None in indices:
+            serialized_points = [group_element.serialize() for group_element in group_elements]
+            indices = [index if index is not None else self.point_indices_by_value.get(serialized_point)
+                       for index, serialized_point in zip(indices, serialized_points)]
+        if len(indices) > 0 and all(index is not None and index[0] == indices[0][0] for index in indices):
+            return indices[0][0], [index[1] for index in indices], factors
+        if serialized_points is None:
+            serialized_points = [group_element.serialize() for group_element in group_elements]
+        return None, serialized_points, factors
+
+    def multiexp(self, group_elements, factors):
+        """
+        MSM of 'group_elements' and 'factors', in parallel if there are at least 'threshold' points
+        """
+        group_elements = list(group_elements)
+        factors = list(factors)
+        assert len(group_elements) == len(factors)
+        n = len(group_elements)
+        if n < self.threshold or self.workers == 1:
+            return msm.multiexp_serial(group_elements, factors)
+        chunk_size = -(-n // self.workers)
+        futures = [self.pool.submit(_partial_multiexp,
+                                    *self._chunk_arguments(group_elements[i:i + chunk_size], factors[i:i + chunk_size]))
+                   for i in range(0, n, chunk_size)]
+        result = blst.P1_generator().mult(0)
+        for future in futures:
+            result.add(blst.P1(future.result()))
+        return result
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,222 @@
+import functools
+import math
+import sys
+import threading
+from time import perf_counter
+
+#
+# Phase timers
+#
+# Named phases of the proof computation, proof verification, root computation and updates are timed
+# in one of three ways:
+#   with phase("name"): ...        times the block
+#   @timed("name")                 times every (outermost, for recursive functions) call
+#   start("name") / checkpoint("name")
+#                                  sequential phases of one computation: every checkpoint is timed from
+#                                  the previous start or checkpoint of the same thread
+#
+# Nothing is recorded by default. After 'enable', every timed phase is added to the histogram of its
+# name, which can be read with 'export' (e.g. to attach it to benchmark results). Hooks added with
+# 'add_hook' are called with (name, seconds) for every timed phase, also when recording is disabled.
+# 'start' and 'checkpoint' can additionally print the phases to stderr ('display'), which is what the
+# 'display_times' arguments of verkle_trie do.
+#
+
+# Bucket bounds grow by a factor of 2**(1 / BUCKETS_PER_OCTAVE), from MIN_BUCKET seconds
+BUCKETS_PER_OCTAVE = 4
+MIN_BUCKET = 1e-7
+
+DISPLAY_WIDTH = 30
+
+
+class Histogram:
+    """
+    Log-bucketed histogram of durations in seconds. Percentiles are estimated by the upper bound of their
+    bucket, so they are at most 2**(1 / BUCKETS_PER_OCTAVE) times too large
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0
+        self.min = math.inf
+        self.max = 0
+
+    @staticmethod
+    def bucket_upper_bound(bucket: int) -> float:
+        return MIN_BUCKET * 2**(bucket / BUCKETS_PER_OCTAVE)
+
+    def record(self, seconds: float):
+        bucket = math.ceil(math.log2(max(seconds, MIN_BUCKET) / MIN_BUCKET) * BUCKETS_PER_OCTAVE)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> float:
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.bucket_upper_bound(bucket), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        if self.count == 0:
+            return {'count': 0}
+        return {'count': self.count,
+                'sum': self.sum,
+                'mean': self.sum / self.count,
+                'min': self.min,
+                'median': self.percentile(50),
+                'p95': self.percentile(95),
+                'p99': self.percentile(99),
+                'max': self.max,
+                'buckets': [[self.bucket_upper_bound(bucket), self.buckets[bucket]] for bucket in sorted(self.buckets)]}
+
+
+_lock = threading.Lock()
+_histograms = {}
+_hooks = []
+_enabled = False
+_thread_state = threading.local()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def add_hook(hook):
+    """
+    Calls 'hook(name, seconds)' for every timed phase
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+def record(name: str, seconds: float):
+    if _enabled:
+        with _lock:
+            if name not in _histograms:
+                _histograms[name] = Histogram()
+            _histograms[name].record(seconds)
+    for hook in _hooks:
+        hook(name, seconds)
+
+
+def export() -> dict:
+    """
+    Returns the histograms of all recorded phases, as dicts
+    """
+    with _lock:
+        return {name: histogram.to_dict() for name, histogram in _histograms.items()}
+
+
+def _is_active() -> bool:
+    return _enabled or len(_hooks) > 0
+
+
+class phase:
+    """
+    Context manager that times a block as phase 'name'
+    """
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.time_a = perf_counter() if _is_active() else None
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.time_a is not None:
+            record(self.name, perf_counter() - self.time_a)
+
+
+def timed(name: str):
+    """
+    Decorator that times the calls of a function as phase 'name'. Recursive calls are part of the
+    outermost call and are not timed on their own
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _is_active():
+                return function(*args, **kwargs)
+            running = getattr(_thread_state, "running", None)
+            if running is None:
+                running = _thread_state.running = set()
+            if name in running:
+                return function(*args, **kwargs)
+            running.add(name)
+            time_a = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, perf_counter() - time_a)
+                running.discard(name)
+        return wrapper
+    return decorator
+
+
+def start(name: str, display: bool = False):
+    """
+    Starts a sequence of phases in the current thread
+    """
+    if display:
+        print("   " + name, file=sys.stderr)
+    if display or _is_active():
+        _thread_state.last_time = perf_counter()
+
+
+def mark(display: bool = False):
+    """
+    Lets the next checkpoint of the current thread start now, without ending a phase. Used where a
+    sequence can be continued from a caller or started anew
+    """
+    if display or _is_active():
+        _thread_state.last_time = perf_counter()
+
+
+def checkpoint(name: str, display: bool = False):
+    """
+    Ends phase 'name', which began at the previous start or checkpoint of the current thread
+    """
+    if not display and not _is_active():
+        return
+    now = perf_counter()
+    last_time = getattr(_thread_state, "last_time", None)
+    _thread_state.last_time = now
+    if last_time is None:
+        return
+    if display:
+        string = "   " + name
+        print(string + ' ' * max(1, DISPLAY_WIDTH - len(string)) + "{0:7.3f} s".format(now - last_time),
+              file=sys.stderr)
+    record(name, now - last_time)
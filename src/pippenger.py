@@ -1,43 +1,87 @@
 import blst
 from itertools import zip_longest
-from collections import defaultdict
 from random import randint
 from time import time
 
-def integer_in_base(i, b):
-    r = []
-    while i > 0:
-        r.append(i % b)
-        i //= b
-    return r
+# Number of bits of the factors
+BITS = 256
+MAX_WINDOW = 16
 
-def pippenger_simple(group_elements, factors):
+def default_window(n):
+    """
+    Window size (in bits) used by pippenger_simple for n points if none is given. It minimizes the number of
+    point additions, about (BITS / d) * (n + 2**d) for window size d
+    """
+    return min(range(1, MAX_WINDOW + 1), key=lambda d: (BITS // d + 1) * (n + 2**d))
+
+def signed_digits(factor, d):
+    """
+    Digits of 'factor' in base 2**d, least significant first, in the range -2**(d - 1) < digit <= 2**(d - 1),
+    so that only 2**(d - 1) buckets are needed
+    """
+    digits = []
+    mask = 2**d - 1
+    half = 2**(d - 1)
+    while factor > 0:
+        digit = factor & mask
+        factor >>= d
+        if digit > half:
+            digit -= 2**d
+            factor += 1
+        digits.append(digit)
+    return digits
+
+def pippenger_simple(group_elements, factors, window=None):
     """
     A naive implementation of a Pippenger-like multiexponentiation algorithm. Don't use this
     in practice, a native implementation in the blst library will perform much better.
+    'window' is the number of bits of the digits, see default_window otherwise.
+
+    The factors are decomposed into signed digits once, so a negative digit adds the negated point to
+    the bucket of its absolute value. The bucket sums of a window are combined with running sums,
+    sum_j j * B_j = sum_j (B_j + B_(j + 1) + ... + B_max), which only needs additions.
     """
     assert len(group_elements) == len(factors)
     n = len(group_elements)
-    d = 1
-    while (d + 2) * 2**(d + 2) < n:
-        d += 1
-    b = 2**d
-    factors_decomposed = [integer_in_base(factor, b) for factor in factors]
+    d = window if window is not None else default_window(n)
+    windows = list(zip_longest(*[signed_digits(factor, d) for factor in factors], fillvalue=0))
+    # Reused by all windows, empty buckets are None
+    buckets = [None] * (2**(d - 1) + 1)
+    negated_elements = [None] * n
     result = blst.P1_generator().mult(0)
-    for bases in reversed(list(zip_longest(*factors_decomposed, fillvalue=0))):
-        total = blst.P1_generator().mult(0)
-        base_elements_dict = defaultdict(list)
-        for index, base in enumerate(bases):
-            if base > 0:
-                base_elements_dict[base].append(group_elements[index])
-        for base, base_elements in base_elements_dict.items():
-            if len(base_elements) > 0:
-                sum_base_elements = base_elements[0].dup()
-                for x in base_elements[1:]:
-                    sum_base_elements.add(x)
-                sum_base_elements.mult(base)
-                total.add(sum_base_elements)
-        result.mult(b).add(total)
+    for digits in reversed(windows):
+        for i in range(d):
+            result.dbl()
+        for index, digit in enumerate(digits):
+            if digit == 0:
+                continue
+            if digit > 0:
+                x = group_elements[index]
+            else:
+                x = negated_elements[index]
+                if x is None:
+                    x = negated_elements[index] = group_elements[index].dup().neg()
+                digit = -digit
+            if buckets[digit] is None:
+                buckets[digit] = x.dup()
+            else:
+                buckets[digit].add(x)
+        running_sum = None
+        total = None
+        for j in range(len(buckets) - 1, 0, -1):
+            if buckets[j] is not None:
+                if running_sum is None:
+                    running_sum = buckets[j]
+                else:
+                    running_sum.add(buckets[j])
+                buckets[j] = None
+            if running_sum is not None:
+                if total is None:
+                    total = running_sum.dup()
+                else:
+                    total.add(running_sum)
+        if total is not None:
+            result.add(total)
     return result
 
 def lincomb_naive(group_elements, factors):
@@ -1,3 +1,5 @@
+import op_counters
+
 # Creates an object that includes convenience operations for numbers
 # and polynomials in some prime field
 
@@ -117,6 +119,7 @@ class PrimeField():
 
     # Modular inverse using the extended Euclidean algorithm
     def inv(self, a):
+        op_counters.count('inversions')
         if a == 0:
             return 0
         lm, hm = 1, 0
@@ -0,0 +1,270 @@
+import struct
+import threading
+import blst
+from collections import OrderedDict
+
+#
+# Binary wire format for verkle proofs
+#
+# A proof is encoded as
+#
+#   version                1 byte
+#   number of depths       4 bytes, little endian
+#   number of commitments  4 bytes, little endian
+#   depths                 1 byte each
+#   commitments            48 bytes each (compressed G1 points)
+#   D                      48 bytes
+#   y                      32 bytes, little endian
+#   sigma                  48 bytes
+#
+# The counts come first and the commitments come before D, y and sigma so that a verifier
+# can start decompressing points while the rest of the proof is still arriving.
+#
+
+PROOF_FORMAT_VERSION = 1
+
+HEADER = struct.Struct("<BII")
+COMMITMENT_SIZE = 48
+FIELD_ELEMENT_SIZE = 32
+TRAILER_SIZE = COMMITMENT_SIZE + FIELD_ELEMENT_SIZE + COMMITMENT_SIZE
+
+
+class ProofFormatError(ValueError):
+    pass
+
+
+class CommitmentCache:
+    """
+    Bounded LRU cache of decompressed commitments, keyed by their compressed bytes.
+
+    Decompressing a point needs a square root and checking that it is in the G1 subgroup needs a scalar
+    multiplication. Consecutive proofs share most of their upper level commitments, so both are only done
+    once per distinct commitment. The returned points are shared and must not be modified in place.
+
+    The cache can be shared between threads. Points are decoded and checked outside of its lock, so two
+    threads can both decode a point that is missing
+    """
+    def __init__(self, max_size: int = 4096, check_subgroup: bool = True):
+        self.max_size = max_size
+        self.check_subgroup = check_subgroup
+        self.points = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _get(self, key):
+        with self.lock:
+            point = self.points.get(key)
+            if point is not None:
+                self.points.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return point
+
+    def _put(self, key, point):
+        with self.lock:
+            self.points[key] = point
+            self.points.move_to_end(key)
+            if len(self.points) > self.max_size:
+                self.points.popitem(last=False)
+
+    def _check_in_group(self, point):
+        if self.check_subgroup and not point.in_group():
+            raise ValueError("Commitment is not in the G1 subgroup")
+
+    def decompress(self, x, cache: bool = True):
+        """
+        Returns the commitment 'x' (bytes-like or blst.P1) as a blst.P1. Points that only appear once,
+        like D and sigma of a multiproof, can be decoded with 'cache=False' to keep them out of the cache
+        """
+        if isinstance(x, blst.P1):
+            return x
+        key = bytes(x)
+        if cache:
+            point = self._get(key)
+        else:
+            point = None
+            with self.lock:
+                self.misses += 1
+        if point is None:
+            point = blst.P1(key)
+            self._check_in_group(point)
+            if cache:
+                self._put(key, point)
+        return point
+
+    def decompress_batch(self, xs):
+        """
+        Decompresses a list of commitments. Duplicates are only decoded once, and the subgroup checks of all
+        points that were not cached are deferred until every point has been decoded, so a malformed
+        encoding is rejected before any of the expensive checks are done
+        """
+        points = [None] * len(xs)
+        missing = {}
+        for i, x in enumerate(xs):
+            if isinstance(x, blst.P1):
+                points[i] = x
+                continue
+            key = bytes(x)
+            if key in missing:
+                missing[key][1].append(i)
+                continue
+            point = self._get(key)
+            if point is not None:
+                points[i] = point
+            else:
+                missing[key] = (blst.P1(key), [i])
+
+        for key, (point, positions) in missing.items():
+            self._check_in_group(point)
+            self._put(key, point)
+            for i in positions:
+                points[i] = point
+
+        return points
+
+    def clear(self):
+        with self.lock:
+            self.points.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+default_commitment_cache = CommitmentCache()
+
+
+def get_serialized_proof_size(proof):
+    """
+    Returns the exact number of bytes 'serialize_verkle_proof' produces for 'proof'
+    """
+    depths, commitments_sorted_by_index_serialized, D_serialized, y, sigma_serialized = proof
+    return HEADER.size + len(depths) + COMMITMENT_SIZE * len(commitments_sorted_by_index_serialized) + TRAILER_SIZE
+
+
+def _check_point_size(point):
+    if len(point) != COMMITMENT_SIZE:
+        raise ProofFormatError("Expected a compressed point of {0} bytes, got {1}".format(COMMITMENT_SIZE, len(point)))
+
+
+def serialize_verkle_proof(proof):
+    """
+    Encodes a proof as returned by 'make_verkle_proof' in the binary wire format
+    """
+    depths, commitments_sorted_by_index_serialized, D_serialized, y, sigma_serialized = proof
+    for point in list(commitments_sorted_by_index_serialized) + [D_serialized, sigma_serialized]:
+        _check_point_size(point)
+    out = bytearray(HEADER.pack(PROOF_FORMAT_VERSION, len(depths), len(commitments_sorted_by_index_serialized)))
+    out += bytes(depths)
+    for commitment in commitments_sorted_by_index_serialized:
+        out += commitment
+    out += D_serialized
+    out += y.to_bytes(FIELD_ELEMENT_SIZE, "little")
+    out += sigma_serialized
+    return bytes(out)
+
+
+def _read_header(data):
+    if len(data) < HEADER.size:
+        raise ProofFormatError("Proof is shorter than its header")
+    version, number_depths, number_commitments = HEADER.unpack_from(data)
+    if version != PROOF_FORMAT_VERSION:
+        raise ProofFormatError("Unsupported proof format version {0}".format(version))
+    return number_depths, number_commitments
+
+
+def deserialize_verkle_proof(data):
+    """
+    Decodes a proof from the binary wire format without copying any of the fields.
+    Depths, commitments, D and sigma are returned as memoryview slices of 'data'
+    """
+    data = memoryview(data)
+    number_depths, number_commitments = _read_header(data)
+
+    offset = HEADER.size
+    size = offset + number_depths + COMMITMENT_SIZE * number_commitments + TRAILER_SIZE
+    if len(data) != size:
+        raise ProofFormatError("Expected a proof of {0} bytes, got {1}".format(size, len(data)))
+
+    depths = data[offset:offset + number_depths]
+    offset += number_depths
+
+    commitments_sorted_by_index_serialized = []
+    for i in range(number_commitments):
+        commitments_sorted_by_index_serialized.append(data[offset:offset + COMMITMENT_SIZE])
+        offset += COMMITMENT_SIZE
+
+    D_serialized = data[offset:offset + COMMITMENT_SIZE]
+    offset += COMMITMENT_SIZE
+    y = int.from_bytes(data[offset:offset + FIELD_ELEMENT_SIZE], "little")
+    offset += FIELD_ELEMENT_SIZE
+    sigma_serialized = data[offset:offset + COMMITMENT_SIZE]
+
+    return depths, commitments_sorted_by_index_serialized, D_serialized, y, sigma_serialized
+
+
+class StreamingProofDecoder:
+    """
+    Decodes a proof in the binary wire format from chunks as they arrive. Every commitment is
+    decompressed with 'commitment_cache' as soon as its 48 bytes are complete, so decompression overlaps
+    with receiving the proof
+    """
+    def __init__(self, commitment_cache: CommitmentCache = default_commitment_cache):
+        self.commitment_cache = commitment_cache
+        # Bytes that were received but not decoded yet
+        self.buffer = bytearray()
+        self.number_depths = None
+        self.number_commitments = None
+        self.depths = None
+        self.commitments = []
+        self.trailer = None
+
+    def _take(self, size: int) -> bytes:
+        """
+        Removes the first 'size' bytes from the buffer and returns them
+        """
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def feed(self, chunk):
+        """
+        Adds the next chunk of the proof and decodes everything that is complete. Decoded bytes are
+        dropped, so the buffer holds at most one incomplete field and the new chunk
+        """
+        if self.is_complete() and len(chunk) > 0:
+            raise ProofFormatError("Trailing bytes after the end of the proof")
+        self.buffer += chunk
+
+        if self.number_depths is None:
+            if len(self.buffer) < HEADER.size:
+                return
+            self.number_depths, self.number_commitments = _read_header(self._take(HEADER.size))
+
+        if self.depths is None:
+            if len(self.buffer) < self.number_depths:
+                return
+            self.depths = self._take(self.number_depths)
+
+        while len(self.commitments) < self.number_commitments and len(self.buffer) >= COMMITMENT_SIZE:
+            self.commitments.append(self.commitment_cache.decompress(self._take(COMMITMENT_SIZE)))
+
+        if len(self.commitments) == self.number_commitments and len(self.buffer) >= TRAILER_SIZE:
+            if len(self.buffer) > TRAILER_SIZE:
+                raise ProofFormatError("Trailing bytes after the end of the proof")
+            self.trailer = self._take(TRAILER_SIZE)
+
+    def is_complete(self):
+        return self.trailer is not None
+
+    def proof(self):
+        """
+        Returns the decoded proof, with the commitments, D and sigma already decompressed. D and sigma are
+        only used by this proof and kept out of the cache
+        """
+        if not self.is_complete():
+            raise ProofFormatError("Proof is incomplete")
+        D = self.commitment_cache.decompress(self.trailer[:COMMITMENT_SIZE], cache=False)
+        y = int.from_bytes(self.trailer[COMMITMENT_SIZE:COMMITMENT_SIZE + FIELD_ELEMENT_SIZE], "little")
+        sigma = self.commitment_cache.decompress(self.trailer[COMMITMENT_SIZE + FIELD_ELEMENT_SIZE:], cache=False)
+        return self.depths, self.commitments, D, y, sigma
@@ -0,0 +1,358 @@
+import asyncio
+import struct
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import blst
+import msm
+import verkle_trie
+from concurrent_trie import ConcurrentVerkleTrie
+from kzg_utils import KzgUtils
+from poly_utils import PrimeField
+from proof_serialization import serialize_verkle_proof
+
+#
+# Asyncio key-value and proof service for a verkle trie
+#
+# Requests that arrive within 'batch_window' seconds of each other are coalesced: all puts and deletes
+# become one batch written by the single writer of a ConcurrentVerkleTrie, and all prove calls are
+# answered by one multiproof over the union of their keys. Batches are processed in threads, so the event
+# loop keeps accepting requests meanwhile; gets and root calls read the latest epoch directly. Write batches
+# have a thread of their own, so they are applied (and get their epochs) in the order they were submitted
+# and are never held up by proofs, which run in a pool of 'workers' threads.
+#
+# The trie lives in this process, so writes and finding the openings of a proof hold the GIL. The KZG
+# multiproof over the openings, which is most of the work of a proof, is made in a pool of prover processes
+# instead (blst holds the GIL too), which get the parameters and Lagrange setup of verkle_trie when they
+# start. The commitments are sent to them serialized, as blst points cannot be pickled.
+#
+# Every connection has at most 'max_in_flight' requests that are not answered yet, where a request is
+# answered once its response is handed to the socket (after 'drain'). Past that, the connection is not
+# read any further, so a client that does not read its responses cannot grow the memory of the service.
+#
+# Messages (little endian) are framed as
+#   length             4 bytes, length of the rest of the message
+#   request id         4 bytes, echoed in the response
+#   operation/status   1 byte
+#   items              4 byte length + bytes, for every item
+#
+# Request items: get (key), put (key, value), delete (key), prove (keys), root ().
+# Response items on success:
+#   get                (value), or no item if the key does not exist
+#   put, delete        (epoch)
+#   prove              (epoch, root commitment, proof, then key and value for every key in the proof)
+#   root               (epoch, root commitment)
+# On error the only item is the error message.
+#
+
+GET = 0
+PUT = 1
+DELETE = 2
+PROVE = 3
+ROOT = 4
+
+OK = 0
+ERROR = 1
+
+FRAME_HEADER = struct.Struct("<IIB")
+ITEM_LENGTH = struct.Struct("<I")
+EPOCH = struct.Struct("<Q")
+
+# Seconds that requests are collected before a batch is processed
+BATCH_WINDOW = 0.002
+
+# Requests of one connection that are handled at the same time
+MAX_IN_FLIGHT = 64
+
+
+def _initialize_prover(width_bits: int, serialized_lagrange: list):
+    """
+    Installs the parameters and the Lagrange setup of verkle_trie in a prover process
+    """
+    # A forked process inherits the MSM executor of its parent
+    msm.set_executor(None)
+    width = 2**width_bits
+    verkle_trie.WIDTH_BITS = width_bits
+    verkle_trie.WIDTH = width
+    verkle_trie.primefield = PrimeField(verkle_trie.MODULUS, width)
+    verkle_trie.ROOT_OF_UNITY = pow(verkle_trie.PRIMITIVE_ROOT, (verkle_trie.MODULUS - 1) // width, verkle_trie.MODULUS)
+    verkle_trie.DOMAIN = [pow(verkle_trie.ROOT_OF_UNITY, i, verkle_trie.MODULUS) for i in range(width)]
+    verkle_trie.SETUP = {"g1_lagrange": [blst.P1(point) for point in serialized_lagrange]}
+    verkle_trie.kzg_utils = KzgUtils(verkle_trie.MODULUS, width, verkle_trie.DOMAIN, verkle_trie.SETUP,
+                                     verkle_trie.primefield)
+
+
+def _make_multiproof(serialized_commitments: list, fs: list, indices: list, ys: list) -> tuple:
+    """
+    make_kzg_multiproof in a prover process
+    """
+    Cs = [blst.P1(commitment) for commitment in serialized_commitments]
+    return verkle_trie.make_kzg_multiproof(Cs, fs, indices, ys, False)
+
+
+def encode_message(request_id: int, operation: int, items: list) -> bytes:
+    body = b"".join(ITEM_LENGTH.pack(len(item)) + item for item in items)
+    return FRAME_HEADER.pack(FRAME_HEADER.size - 4 + len(body), request_id, operation) + body
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple:
+    """
+    Returns (request id, operation/status, items) of the next message
+    """
+    length, request_id, operation = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    body = await reader.readexactly(length - (FRAME_HEADER.size - 4))
+    items = []
+    offset = 0
+    while offset < len(body):
+        item_length = ITEM_LENGTH.unpack_from(body, offset)[0]
+        items.append(body[offset + ITEM_LENGTH.size:offset + ITEM_LENGTH.size + item_length])
+        offset += ITEM_LENGTH.size + item_length
+    return request_id, operation, items
+
+
+class MicroBatcher:
+    """
+    Collects requests for 'window' seconds and processes them together with 'process_batch', which is
+    called in 'executor' with the list of requests and returns one result per request
+    """
+    def __init__(self, process_batch, window: float, executor):
+        self.process_batch = process_batch
+        self.window = window
+        self.executor = executor
+        self.pending = []
+        self.batches = 0
+
+    async def submit(self, request):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if len(self.pending) == 0:
+            loop.call_later(self.window, lambda: asyncio.ensure_future(self._flush()))
+        self.pending.append((request, future))
+        return await future
+
+    async def _flush(self):
+        batch, self.pending = self.pending, []
+        self.batches += 1
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.process_batch, [request for request, future in batch])
+        except Exception as error:
+            results = [error] * len(batch)
+        for (request, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class ProofService:
+    """
+    Serves gets, puts, deletes, proofs and the root of 'trie' over TCP or a Unix socket
+    """
+    def __init__(self, trie: ConcurrentVerkleTrie, batch_window: float = BATCH_WINDOW, workers: int = 2,
+                 max_in_flight: int = MAX_IN_FLIGHT):
+        self.trie = trie
+        self.max_in_flight = max_in_flight
+        self.write_executor = ThreadPoolExecutor(1)
+        self.executor = ThreadPoolExecutor(workers)
+        self.provers = ProcessPoolExecutor(workers, initializer=_initialize_prover, initargs=(
+            verkle_trie.WIDTH_BITS, [point.serialize() for point in verkle_trie.SETUP["g1_lagrange"]]))
+        self.writes = MicroBatcher(self._write_batch, batch_window, self.write_executor)
+        self.proofs = MicroBatcher(self._prove_batch, batch_window, self.executor)
+        self.server = None
+
+    def _write_batch(self, requests: list) -> list:
+        """
+        Applies all puts and deletes in one epoch. The last request for a key wins
+        """
+        updates = {}
+        deletes = set()
+        for operation, key, value in requests:
+            if operation == PUT:
+                updates[key] = value
+                deletes.discard(key)
+            else:
+                updates.pop(key, None)
+                deletes.add(key)
+        epoch = self.trie.write(updates, list(deletes))
+        return [epoch] * len(requests)
+
+    def _multiproof(self, Cs: list, fs: list, indices: list, ys: list, display_times: bool) -> tuple:
+        """
+        make_kzg_multiproof in the prover pool. The calling thread waits without holding the GIL
+        """
+        return self.provers.submit(_make_multiproof, [C.serialize() for C in Cs], fs, indices, ys).result()
+
+    def _prove_batch(self, requests: list) -> list:
+        """
+        Makes one proof for the keys of all requests. Requests with a missing key fail on their own
+        """
+        snapshot = self.trie.snapshot()
+        results = [None] * len(requests)
+        keys = []
+        keys_in_proof = set()
+        for i, request_keys in enumerate(requests):
+            missing = [key for key in request_keys if snapshot.get(key) is None]
+            if len(missing) > 0:
+                results[i] = KeyError("Cannot prove non-existent key {0}".format(missing[0].hex()))
+            else:
+                for key in request_keys:
+                    if key not in keys_in_proof:
+                        keys.append(key)
+                        keys_in_proof.add(key)
+
+        if len(keys) > 0:
+            proof = serialize_verkle_proof(snapshot.make_proof(keys, multiproof=self._multiproof))
+            values = [snapshot.get(key) for key in keys]
+            response = (snapshot.epoch, snapshot.root_commitment(), proof, keys, values)
+            results = [result if result is not None else response for result in results]
+        return results
+
+    async def _handle_request(self, request_id: int, operation: int, items: list) -> bytes:
+        try:
+            if operation == GET:
+                value = self.trie.snapshot().get(items[0])
+                response = [value] if value is not None else []
+            elif operation == PUT or operation == DELETE:
+                epoch = await self.writes.submit((operation, items[0], items[1] if operation == PUT else None))
+                response = [EPOCH.pack(epoch)]
+            elif operation == PROVE:
+                epoch, commitment, proof, keys, values = await self.proofs.submit(items)
+                response = [EPOCH.pack(epoch), commitment, proof]
+                for key, value in zip(keys, values):
+                    response += [key, value]
+            elif operation == ROOT:
+                snapshot = self.trie.snapshot()
+                response = [EPOCH.pack(snapshot.epoch), snapshot.root_commitment()]
+            else:
+                raise ValueError("Unknown operation {0}".format(operation))
+        except Exception as error:
+            return encode_message(request_id, ERROR, [str(error).encode()])
+        return encode_message(request_id, OK, response)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+
+        async def respond(request_id, operation, items):
+            try:
+                writer.write(await self._handle_request(request_id, operation, items))
+                await writer.drain()
+            except ConnectionError:
+                # The peer is gone, so there is nobody to respond to
+                pass
+            finally:
+                in_flight.release()
+
+        tasks = set()
+        try:
+            while True:
+                try:
+                    request_id, operation, items = await read_message(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                await in_flight.acquire()
+                # Requests on one connection are handled concurrently, so they can share a batch
+                task = asyncio.ensure_future(respond(request_id, operation, items))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if len(tasks) > 0:
+                await asyncio.wait(tasks)
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, path: str = None):
+        """
+        Starts listening on a Unix socket if 'path' is given, on TCP otherwise. Returns the server
+        """
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self._handle_connection, path)
+        else:
+            self.server = await asyncio.start_server(self._handle_connection, host, port)
+        return self.server
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.write_executor.shutdown()
+        self.executor.shutdown()
+        self.provers.shutdown()
+
+
+class ProofServiceClient:
+    """
+    Client of a ProofService. Calls can be made concurrently on one connection
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.next_request_id = 0
+        self.pending = {}
+        # Set once the connection is lost
+        self.error = None
+        self.receiver = asyncio.ensure_future(self._receive())
+
+    @staticmethod
+    async def connect(host: str = "127.0.0.1", port: int = 0, path: str = None):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return ProofServiceClient(reader, writer)
+
+    async def _receive(self):
+        try:
+            while True:
+                request_id, status, items = await read_message(self.reader)
+                future = self.pending.pop(request_id)
+                if status == OK:
+                    future.set_result(items)
+                else:
+                    future.set_exception(RuntimeError(items[0].decode()))
+        except (asyncio.IncompleteReadError, ConnectionError) as error:
+            self.error = ConnectionError("Connection to service lost: {0}".format(error))
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(self.error)
+            self.pending.clear()
+
+    async def _call(self, operation: int, items: list) -> list:
+        if self.error is not None:
+            raise self.error
+        request_id = self.next_request_id
+        self.next_request_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(encode_message(request_id, operation, items))
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            self.pending.pop(request_id, None)
+            raise
+        return await future
+
+    async def get(self, key: bytes) -> bytes:
+        items = await self._call(GET, [key])
+        return items[0] if len(items) > 0 else None
+
+    async def put(self, key: bytes, value: bytes) -> int:
+        return EPOCH.unpack((await self._call(PUT, [key, value]))[0])[0]
+
+    async def delete(self, key: bytes) -> int:
+        return EPOCH.unpack((await self._call(DELETE, [key]))[0])[0]
+
+    async def prove(self, keys: list) -> tuple:
+        """
+        Returns (epoch, root commitment, serialized proof, keys, values). The proof can cover more keys
+        than requested, if other requests were batched with this one
+        """
+        items = await self._call(PROVE, keys)
+        return EPOCH.unpack(items[0])[0], items[1], items[2], items[3::2], items[4::2]
+
+    async def root(self) -> tuple:
+        """
+        Returns (epoch, root commitment)
+        """
+        items = await self._call(ROOT, [])
+        return EPOCH.unpack(items[0])[0], items[1]
+
+    async def close(self):
+        self.writer.close()
+        await self.receiver
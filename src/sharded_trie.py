@@ -0,0 +1,174 @@
+import multiprocessing
+import blst
+import verkle_trie
+from verkle_trie import MODULUS, hash
+from kzg_utils import KzgUtils
+from proof_serialization import serialize_verkle_proof, deserialize_verkle_proof
+from write_ahead_log import apply_operations
+
+#
+# Keyspace sharded verkle trie
+#
+# The keyspace is split into 'number_shards' contiguous ranges by the first key byte, and every range is
+# owned by a worker process holding an independent verkle trie. Workers apply their writes and compute
+# their commitments in parallel. The coordinator commits to the shard roots with a top-level node that
+# works exactly like an inner node of the verkle trie: the value at index i is the hash of the commitment
+# of shard i.
+#
+# A sharded proof is stitched from one verkle proof per involved shard and one KZG multiproof opening
+# the top-level commitment at the indices of these shards:
+#   (number of shards, shard indices, top-level multiproof, shard root commitments, shard proofs)
+# with the shard proofs in the wire format of proof_serialization.
+#
+
+
+def get_shard(key: bytes, number_shards: int) -> int:
+    return key[0] * number_shards // 256
+
+
+def _shard_worker(connection, secret: int):
+    """
+    Main loop of a shard process. Requests are (command, argument) tuples
+    """
+    if not hasattr(verkle_trie, "kzg_utils"):
+        verkle_trie.SETUP = verkle_trie.generate_setup(verkle_trie.WIDTH, secret)
+        verkle_trie.kzg_utils = KzgUtils(MODULUS, verkle_trie.WIDTH, verkle_trie.DOMAIN, verkle_trie.SETUP,
+                                         verkle_trie.primefield)
+    root = {"node_type": "inner", "commitment": blst.G1().mult(0)}
+    verkle_trie.add_node_hash(root)
+
+    while True:
+        command, argument = connection.recv()
+        try:
+            if command == "apply":
+                apply_operations(root, argument)
+                result = root["commitment"].compress()
+            elif command == "get":
+                node = verkle_trie.find_node(root, argument)
+                result = node["value"] if node is not None else None
+            elif command == "prove":
+                result = serialize_verkle_proof(verkle_trie.make_verkle_proof(root, argument, False))
+            elif command == "root":
+                result = root["commitment"].compress()
+            else:
+                connection.send(("ok", None))
+                break
+            connection.send(("ok", result))
+        except Exception as error:
+            connection.send(("error", error))
+    connection.close()
+
+
+class ShardedVerkleTrie:
+    """
+    Verkle trie split over 'number_shards' worker processes. The coordinator needs the verkle_trie setup
+    """
+    def __init__(self, number_shards: int, secret: int):
+        assert 1 <= number_shards <= min(verkle_trie.WIDTH, 256)
+        self.number_shards = number_shards
+        self.connections = []
+        self.processes = []
+        for i in range(number_shards):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_shard_worker, args=(worker_connection, secret), daemon=True)
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+        roots = self._request_all({i: ("root", None) for i in range(number_shards)})
+        self.shard_roots = [roots[i] for i in range(number_shards)]
+        self._update_top_level()
+
+    def _request_all(self, requests: dict) -> dict:
+        """
+        Sends one request to each shard in 'requests' (shard -> request) and then collects the results, so
+        the shards work in parallel. If shards fail, the first error is raised after all replies have been
+        received, so no reply is left behind for the next request
+        """
+        for shard, request in requests.items():
+            self.connections[shard].send(request)
+        results = {}
+        error = None
+        for shard in requests:
+            status, result = self.connections[shard].recv()
+            if status != "ok":
+                error = error or result
+            else:
+                results[shard] = result
+        if error is not None:
+            raise error
+        return results
+
+    def _update_top_level(self):
+        self.top_level_values = [int.from_bytes(hash(root), "little") for root in self.shard_roots] + \
+                                [0] * (verkle_trie.WIDTH - self.number_shards)
+        self.top_level_commitment = verkle_trie.kzg_utils.compute_commitment_lagrange(
+            {i: value for i, value in enumerate(self.top_level_values[:self.number_shards])})
+
+    def root_commitment(self) -> bytes:
+        return self.top_level_commitment.compress()
+
+    def apply(self, operations: list):
+        """
+        Applies (operation, key, value) tuples as in 'apply_operations', every shard its own part
+        """
+        operations_by_shard = {}
+        for operation in operations:
+            operations_by_shard.setdefault(get_shard(operation[1], self.number_shards), []).append(operation)
+        results = self._request_all({shard: ("apply", shard_operations)
+                                     for shard, shard_operations in operations_by_shard.items()})
+        for shard, root in results.items():
+            self.shard_roots[shard] = root
+        self._update_top_level()
+
+    def get(self, key: bytes) -> bytes:
+        shard = get_shard(key, self.number_shards)
+        return self._request_all({shard: ("get", key)})[shard]
+
+    def make_proof(self, keys: list):
+        keys_by_shard = {}
+        for key in keys:
+            keys_by_shard.setdefault(get_shard(key, self.number_shards), []).append(key)
+        shard_indices = sorted(keys_by_shard.keys())
+        shard_proofs = self._request_all({shard: ("prove", keys_by_shard[shard]) for shard in shard_indices})
+
+        top_level_proof = verkle_trie.make_kzg_multiproof(
+            [self.top_level_commitment] * len(shard_indices), [self.top_level_values] * len(shard_indices),
+            shard_indices, [self.top_level_values[shard] for shard in shard_indices], False)
+        return (self.number_shards, shard_indices, top_level_proof,
+                [self.shard_roots[shard] for shard in shard_indices], [shard_proofs[shard] for shard in shard_indices])
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(("close", None))
+            connection.recv()
+            connection.close()
+        for process in self.processes:
+            process.join()
+
+
+def check_sharded_proof(root_commitment: bytes, number_shards: int, keys: list, values: list, proof) -> bool:
+    """
+    Checks a sharded proof against the root commitment of a trie with 'number_shards' shards. The number of
+    shards is part of the verifier's configuration, a proof for a different one is rejected
+    """
+    proof_number_shards, shard_indices, top_level_proof, shard_roots, shard_proofs = proof
+    if proof_number_shards != number_shards:
+        return False
+    top_level_commitment = verkle_trie.decompress_point(root_commitment)
+    if not verkle_trie.check_kzg_multiproof([top_level_commitment] * len(shard_indices), shard_indices,
+                                            [int.from_bytes(hash(root), "little") for root in shard_roots],
+                                            top_level_proof, False):
+        return False
+
+    keys_by_shard = {}
+    for key, value in zip(keys, values):
+        keys_by_shard.setdefault(get_shard(key, number_shards), []).append((key, value))
+    if sorted(keys_by_shard.keys()) != list(shard_indices):
+        return False
+    for shard, shard_root, shard_proof in zip(shard_indices, shard_roots, shard_proofs):
+        shard_keys = [key for key, value in keys_by_shard[shard]]
+        shard_values = [value for key, value in keys_by_shard[shard]]
+        if not verkle_trie.check_verkle_proof(shard_root, shard_keys, shard_values,
+                                              deserialize_verkle_proof(shard_proof), False):
+            return False
+    return True
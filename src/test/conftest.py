@@ -0,0 +1,72 @@
+from random import Random
+
+import pytest
+
+import blst
+import verkle_trie
+from benchmarks.adapters import configure_verkle_trie
+
+#
+# Shared test setup
+#
+# verkle_trie keeps its parameters and setup in module globals. The verkle_setup fixture installs them
+# for one width for the tests of a module and restores the previous globals afterwards, so no test
+# depends on the setup left behind by another one. The width is 2**WIDTH_BITS of verkle_trie unless the
+# fixture is parametrized indirectly:
+#
+#   @pytest.mark.parametrize("verkle_setup", [4], indirect=True)
+#
+# The helpers 'random_values' and 'build_trie' make the verkle tries of the tests:
+#
+#   from test.conftest import random_values, build_trie
+#
+
+DEFAULT_WIDTH_BITS = verkle_trie.WIDTH_BITS
+
+VERKLE_GLOBALS = ['WIDTH_BITS', 'WIDTH', 'primefield', 'ROOT_OF_UNITY', 'DOMAIN', 'SETUP', 'kzg_utils']
+
+# Globals of verkle_trie by width, as the setup is expensive to generate
+_verkle_setups = {}
+
+
+def _get_verkle_globals():
+    return {name: getattr(verkle_trie, name) for name in VERKLE_GLOBALS if hasattr(verkle_trie, name)}
+
+
+def _set_verkle_globals(values: dict):
+    for name in VERKLE_GLOBALS:
+        if name in values:
+            setattr(verkle_trie, name, values[name])
+        elif hasattr(verkle_trie, name):
+            delattr(verkle_trie, name)
+
+
+@pytest.fixture(scope="module")
+def verkle_setup(request):
+    width_bits = getattr(request, "param", DEFAULT_WIDTH_BITS)
+    previous = _get_verkle_globals()
+    if width_bits not in _verkle_setups:
+        configure_verkle_trie(width_bits)
+        _verkle_setups[width_bits] = _get_verkle_globals()
+    _set_verkle_globals(_verkle_setups[width_bits])
+    yield verkle_trie
+    _set_verkle_globals(previous)
+
+
+def random_values(number_keys: int, seed: int) -> dict:
+    """
+    'number_keys' random 32 byte keys with random 32 byte values
+    """
+    rng = Random(seed)
+    return {rng.randbytes(32): rng.randbytes(32) for i in range(number_keys)}
+
+
+def build_trie(values: dict) -> dict:
+    """
+    Verkle trie of 'values', with all commitments computed
+    """
+    root = {"node_type": "inner", "commitment": blst.G1().mult(0)}
+    for key, value in values.items():
+        verkle_trie.insert_verkle_node(root, key, value)
+    verkle_trie.add_node_hash(root)
+    return root
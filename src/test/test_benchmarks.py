@@ -0,0 +1,43 @@
+import csv
+import json
+
+import pytest
+
+from benchmarks import BenchmarkConfig, run_benchmark, write_json, write_csv, get_suite, SUITES
+
+
+class TestBenchmarks:
+    @pytest.mark.usefixtures("verkle_setup")
+    def test_all_trees(self, tmp_path):
+        results = []
+        # The verkle trie uses full length keys like in the verkle trie scripts
+        for tree, width_bits, key_range_bits in [('vbst', 1, 16), ('vb_tree', 2, 16), ('vbplus_tree', 2, 16),
+                                                 ('verkle_trie', 4, 256)]:
+            config = BenchmarkConfig(tree, width_bits, key_range_bits, 32, added_keys=8, search_keys=8, deleted_keys=4,
+                                     repetitions=3, warmup=1)
+            result = run_benchmark(config)
+            phases = result['phases']
+            assert phases['insert']['count'] == 3 * 31
+            assert phases['add']['count'] == 3 * 8
+            assert phases['search']['count'] == 3 * 8
+            assert phases['compute_root']['count'] == 3
+            assert ('delete' in phases) == (tree in ['vbst', 'verkle_trie'])
+            assert ('delete' in result.get('skipped_phases', {})) == (tree not in ['vbst', 'verkle_trie'])
+            for summary in phases.values():
+                assert summary['min'] <= summary['median'] <= summary['p95'] <= summary['p99'] <= summary['max']
+            results.append(result)
+
+        write_json(results, str(tmp_path / "results.json"))
+        with open(str(tmp_path / "results.json")) as file:
+            assert json.load(file) == results
+        write_csv(results, str(tmp_path / "results.csv"))
+        with open(str(tmp_path / "results.csv")) as file:
+            rows = list(csv.DictReader(file))
+        assert len(rows) == sum(len(result['phases']) for result in results)
+        assert rows[0]['tree'] == 'vbst' and rows[0]['phase'] == 'insert'
+
+    def test_suites(self):
+        configs = get_suite('search', repetitions=2)
+        assert len(configs) == len(SUITES['search'])
+        assert configs[0].tree == 'vbst' and configs[0].initial_keys == 2**16
+        assert configs[0].added_keys == 0 and configs[0].search_keys == 2**12
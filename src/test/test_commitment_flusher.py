@@ -0,0 +1,88 @@
+from random import Random
+
+import pytest
+
+import blst
+import verkle_trie
+from commitment_flusher import CommitmentFlusher
+from vbplus_tree import VBPlusTree, VBPlusTreeNode, KzgIntegration, int_to_bytes
+
+
+MODULUS = 0x73eda753299d7d483339d80809a1d80553bda402fffe5bfeffffffff00000001
+WIDTH = 4
+PRIMITIVE_ROOT = 7
+SECRET = 8927347823478352432985
+
+NUMBER_KEYS = 100
+
+pytestmark = pytest.mark.usefixtures("verkle_setup")
+
+
+def random_key_values(number_keys, seed):
+    rng = Random(seed)
+    return [(int_to_bytes(rng.randint(0, 2**32)), int_to_bytes(rng.randint(0, 2**32))) for i in range(number_keys)]
+
+
+class TestCommitmentFlusher:
+    kzg_integration = KzgIntegration(SECRET, MODULUS, WIDTH, PRIMITIVE_ROOT)
+    key_values = random_key_values(NUMBER_KEYS, 0)
+
+    def test_vbplus_tree(self):
+        key, value = self.key_values[0]
+        tree = VBPlusTree(self.kzg_integration, VBPlusTreeNode('leaf', [key], [value]))
+        tree.add_node_hash(tree.root)
+        expected = VBPlusTree(self.kzg_integration, VBPlusTreeNode('leaf', [key], [value]))
+        expected.add_node_hash(expected.root)
+
+        flusher = CommitmentFlusher(tree)
+        epochs = []
+        for key, value in self.key_values[1:]:
+            epochs.append(flusher.put(key, value))
+            expected.upsert_vc_node(key, value)
+            # Writes are visible before their commitments are computed
+            assert flusher.get(key) == value
+        assert epochs == sorted(epochs)
+
+        assert flusher.root() == expected.root.commitment.compress()
+        assert flusher.flushed_epoch >= epochs[-1]
+        flusher.close()
+        assert tree.root.hash == expected.root.hash
+        tree.check_valid_tree(tree.root)
+
+    def test_verkle_trie_proof_waits_for_epoch(self):
+        rng = Random(1)
+        values = {rng.randbytes(32): rng.randbytes(32) for i in range(NUMBER_KEYS)}
+        root = {"node_type": "inner", "commitment": blst.G1().mult(0)}
+        verkle_trie.add_node_hash(root)
+        flusher = CommitmentFlusher(root)
+        for key, value in values.items():
+            epoch = flusher.put(key, value)
+        deleted_key = next(iter(values))
+        epoch = flusher.delete(deleted_key)
+        assert flusher.get(deleted_key) is None
+        del values[deleted_key]
+
+        keys = list(values.keys())[:8]
+        proof = flusher.make_proof(keys, epoch)
+        commitment = flusher.root(epoch)
+        assert verkle_trie.check_verkle_proof(commitment, keys, [values[key] for key in keys], proof, False)
+        flusher.close()
+        verkle_trie.check_valid_tree(root)
+
+    def test_background_error(self):
+        key, value = self.key_values[0]
+        tree = VBPlusTree(self.kzg_integration, VBPlusTreeNode('leaf', [key], [value]))
+        tree.add_node_hash(tree.root)
+        flusher = CommitmentFlusher(tree)
+        # Deletes are not supported by VB+Trees, so the flusher thread fails
+        epoch = flusher.delete(key)
+        with pytest.raises(ValueError):
+            flusher.wait(epoch)
+
+        # Later writes and reads are refused instead of being lost
+        with pytest.raises(ValueError):
+            flusher.put(*self.key_values[1])
+        with pytest.raises(ValueError):
+            flusher.get(key)
+        with pytest.raises(ValueError):
+            flusher.close()
@@ -0,0 +1,66 @@
+import threading
+from random import Random
+
+import pytest
+
+import verkle_trie
+import tree_snapshot
+from concurrent_trie import ConcurrentVerkleTrie
+from test.conftest import build_trie
+
+
+NUMBER_INITIAL_KEYS = 256
+NUMBER_WRITES = 6
+NUMBER_READERS = 3
+
+pytestmark = pytest.mark.usefixtures("verkle_setup")
+
+
+def random_keys(number_keys, seed):
+    rng = Random(seed)
+    return [rng.randbytes(32) for i in range(number_keys)]
+
+
+class TestConcurrentVerkleTrie:
+    keys = random_keys(NUMBER_INITIAL_KEYS, 0)
+
+    def test_readers_see_consistent_epochs(self):
+        values = {key: bytes(32) for key in self.keys}
+        trie = ConcurrentVerkleTrie(build_trie(values), retain=2)
+        # The value of every key in an epoch is the epoch number
+        keys_read = self.keys[:4]
+        errors = []
+        done = threading.Event()
+
+        def read():
+            try:
+                while not done.is_set():
+                    snapshot = trie.snapshot()
+                    expected = snapshot.epoch.to_bytes(32, "little")
+                    assert [snapshot.get(key) for key in keys_read] == [expected] * len(keys_read)
+                    proof = snapshot.make_proof(keys_read)
+                    assert verkle_trie.check_verkle_proof(snapshot.root_commitment(), keys_read,
+                                                          [expected] * len(keys_read), proof, False)
+            except AssertionError as error:
+                errors.append(error)
+
+        readers = [threading.Thread(target=read) for i in range(NUMBER_READERS)]
+        for reader in readers:
+            reader.start()
+        for epoch in range(1, NUMBER_WRITES + 1):
+            assert trie.write({key: epoch.to_bytes(32, "little") for key in self.keys}) == epoch
+        done.set()
+        for reader in readers:
+            reader.join()
+
+        assert errors == []
+        assert list(trie.trie.versions.keys()) == [NUMBER_WRITES - 1, NUMBER_WRITES]
+
+    def test_export(self, tmp_path):
+        trie = ConcurrentVerkleTrie(build_trie({key: bytes(32) for key in self.keys}))
+        trie.write({self.keys[0]: b"\x01" * 32}, [self.keys[1]])
+        path = str(tmp_path / "epoch.snapshot")
+        assert trie.export(path, 0) == 0
+        assert tree_snapshot.load(path)["hash"] == trie.snapshot(0).root["hash"]
+        assert trie.snapshot().get(self.keys[1]) is None
+        assert trie.snapshot(0).get(self.keys[1]) == bytes(32)
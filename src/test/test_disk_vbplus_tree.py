@@ -0,0 +1,144 @@
+from random import Random
+
+from disk_vbplus_tree import DiskVBPlusTree, PagedVBPlusTreeNode, get_page_size
+from page_store import PageStore, DEFAULT_PAGE_SIZE
+from node_cache import NodeCache
+from vbplus_tree import VBPlusTree, VBPlusTreeNode, KzgIntegration, int_to_bytes
+
+
+MODULUS = 0x73eda753299d7d483339d80809a1d80553bda402fffe5bfeffffffff00000001
+WIDTH = 4
+PRIMITIVE_ROOT = 7
+SECRET = 8927347823478352432985
+
+NUMBER_INITIAL_KEYS = 200
+NUMBER_ADDED_KEYS = 50
+
+
+def random_key_values(number_keys, seed):
+    rng = Random(seed)
+    return [(int_to_bytes(rng.randint(0, 2**32)), int_to_bytes(rng.randint(0, 2**32))) for i in range(number_keys)]
+
+
+class TestDiskVBPlusTree:
+    kzg_integration = KzgIntegration(SECRET, MODULUS, WIDTH, PRIMITIVE_ROOT)
+    initial_key_values = random_key_values(NUMBER_INITIAL_KEYS, 0)
+    added_key_values = random_key_values(NUMBER_ADDED_KEYS, 1)
+
+    def build_memory_tree(self):
+        key, value = self.initial_key_values[0]
+        tree = VBPlusTree(self.kzg_integration, VBPlusTreeNode('leaf', [key], [value]))
+        for key, value in self.initial_key_values[1:]:
+            tree.insert_node(key, value)
+        tree.add_node_hash(tree.root)
+        return tree
+
+    def build_disk_tree(self, path):
+        key, value = self.initial_key_values[0]
+        tree = DiskVBPlusTree(self.kzg_integration, PageStore(path), VBPlusTreeNode('leaf', [key], [value]))
+        for key, value in self.initial_key_values[1:]:
+            tree.insert_node(key, value)
+        tree.add_node_hash(tree.root)
+        tree.flush()
+        return tree
+
+    def test_reopen(self, tmp_path):
+        path = str(tmp_path / "tree.pages")
+        tree = self.build_disk_tree(path)
+        root_hash = tree.root.hash
+        tree.close()
+
+        tree = DiskVBPlusTree(self.kzg_integration, PageStore(path))
+        assert isinstance(tree.root, PagedVBPlusTreeNode)
+        assert tree.root.hash == root_hash
+        assert tree.root.hash == self.build_memory_tree().root.hash
+
+        # Only the nodes on the search path are loaded
+        key, value = self.initial_key_values[10]
+        node, idx = tree.find_node(tree.root, key)
+        assert node.values[idx] == value
+        assert not all(child.is_loaded() for child in tree.root.children)
+
+        tree.check_valid_tree(tree.root)
+        tree.close()
+
+    def test_upsert_after_reopen(self, tmp_path):
+        path = str(tmp_path / "tree.pages")
+        self.build_disk_tree(path).close()
+        memory_tree = self.build_memory_tree()
+
+        tree = DiskVBPlusTree(self.kzg_integration, PageStore(path))
+        for key, value in self.added_key_values + self.initial_key_values[:10]:
+            tree.upsert_vc_node(key, value)
+            memory_tree.upsert_vc_node(key, value)
+        assert tree.root.hash == memory_tree.root.hash
+        tree.close()
+
+        tree = DiskVBPlusTree(self.kzg_integration, PageStore(path))
+        assert tree.root.hash == memory_tree.root.hash
+        tree.check_valid_tree(tree.root)
+        tree.close()
+
+    def test_bounded_cache(self, tmp_path):
+        path = str(tmp_path / "tree.pages")
+        key, value = self.initial_key_values[0]
+        cache = NodeCache(byte_budget=20000, pinned_levels=2)
+        tree = DiskVBPlusTree(self.kzg_integration, PageStore(path), VBPlusTreeNode('leaf', [key], [value]), cache)
+        for key, value in self.initial_key_values[1:]:
+            tree.insert_node(key, value)
+        evictions = cache.evictions
+        tree.add_node_hash(tree.root)
+        # Evicted while the commitments are computed, not only between operations
+        assert cache.evictions > evictions and cache.size <= cache.byte_budget
+        tree.flush()
+        assert cache.write_backs > 0
+
+        memory_tree = self.build_memory_tree()
+        for key, value in self.added_key_values:
+            tree.upsert_vc_node(key, value)
+            memory_tree.upsert_vc_node(key, value)
+            assert cache.size <= cache.byte_budget
+        assert tree.root.hash == memory_tree.root.hash
+
+        for key, value in self.added_key_values:
+            node, idx = tree.find_node(tree.root, key)
+            assert node.values[idx] == value
+
+        stats = cache.stats()
+        assert stats["hits"] > 0 and stats["misses"] > 0
+        assert tree.root.is_loaded() and all(child.is_loaded() for child in tree.root.children)
+        tree.close()
+
+        tree = DiskVBPlusTree(self.kzg_integration, PageStore(path))
+        tree.check_valid_tree(tree.root)
+        tree.close()
+
+        # Nodes loaded by attribute access know their depth from their parent and are pinned accordingly
+        cache = NodeCache(byte_budget=20000, pinned_levels=2)
+        tree = DiskVBPlusTree(self.kzg_integration, PageStore(path), cache=cache)
+        child = tree.root.children[0]
+        grandchild = child.children[0]
+        grandchild.keys
+        assert [cache.entries[node.page_id][2] for node in [tree.root, child, grandchild]] == [True, True, False]
+        tree.close()
+
+    def test_full_leaf_at_width_64(self, tmp_path):
+        path = str(tmp_path / "tree.pages")
+        kzg_integration = KzgIntegration(SECRET, MODULUS, 64, PRIMITIVE_ROOT)
+        # The root stays a single leaf with 63 keys, which does not fit into a page of the default size
+        key_values = self.initial_key_values[:63]
+        key, value = key_values[0]
+        tree = DiskVBPlusTree(kzg_integration, PageStore(path), VBPlusTreeNode('leaf', [key], [value]))
+        for key, value in key_values[1:]:
+            tree.insert_node(key, value)
+        tree.add_node_hash(tree.root)
+        assert tree.root.node_type == 'leaf' and tree.root.key_count() == 63
+        assert tree.store.page_size == get_page_size(64) > DEFAULT_PAGE_SIZE
+        root_hash = tree.root.hash
+        tree.close()
+
+        tree = DiskVBPlusTree(kzg_integration, PageStore(path))
+        assert tree.store.page_size == get_page_size(64)
+        assert tree.root.hash == root_hash
+        tree.check_valid_tree(tree.root)
+        tree.close()
@@ -0,0 +1,30 @@
+import pytest
+
+from benchmarks.memory import CATEGORIES, measure_memory, run_memory_benchmark
+
+
+NUMBER_KEYS = 64
+
+
+class TestMemory:
+    @pytest.mark.parametrize("tree, width_bits", [("vbst", 1), ("vb_tree", 3), ("vbplus_tree", 3),
+                                                  ("verkle_trie", 8)])
+    @pytest.mark.usefixtures("verkle_setup")
+    def test_breakdown(self, tree, width_bits):
+        result = measure_memory(tree, width_bits, NUMBER_KEYS)
+        for category in CATEGORIES:
+            assert result['{0}_bytes'.format(category)] > 0
+            assert result['{0}_objects'.format(category)] > 0
+        # VB+Tree inner nodes also hold separator keys
+        if tree == "vbplus_tree":
+            assert result['keys_values_objects'] >= 2 * NUMBER_KEYS
+        else:
+            assert result['keys_values_objects'] == 2 * NUMBER_KEYS
+        assert result['native_bytes'] > 0
+        assert result['peak_bytes'] >= result['total_bytes'] > 0
+        assert result['bytes_per_key'] == result['total_bytes'] / NUMBER_KEYS
+
+    def test_scaling(self):
+        results = run_memory_benchmark("vbst", 1, range(4, 7))
+        assert [result['number_keys'] for result in results] == [16, 32, 64]
+        assert results[0]['total_bytes'] < results[1]['total_bytes'] < results[2]['total_bytes']
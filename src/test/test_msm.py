@@ -0,0 +1,95 @@
+from random import Random
+
+import pytest
+
+import blst
+import msm
+import pippenger
+from benchmarks.__main__ import main
+from benchmarks.msm_tuning import make_points, make_factors, autotune, run_msm_benchmark
+from kzg_utils import KzgUtils
+from poly_utils import PrimeField
+
+
+MODULUS = 0x73eda753299d7d483339d80809a1d80553bda402fffe5bfeffffffff00000001
+WIDTH = 16
+PRIMITIVE_ROOT = 7
+SECRET = 8927347823478352432985
+
+
+class TestMsm:
+    rng = Random(0)
+    points = make_points(40)
+    factors = make_factors(40, 0.5, rng)
+
+    def test_backends(self):
+        # Factors above the group order and points at infinity
+        factors = self.factors[:-2] + [2**256 - 1, 5]
+        points = self.points[:-1] + [blst.G1().mult(0)]
+        expected = pippenger.lincomb_naive(points, factors)
+        for backend in msm.BACKENDS:
+            for window in [None, 1, 4, 9]:
+                assert msm.multiexp_with(backend, points, factors, window).is_equal(expected)
+        assert msm.multiexp(points, factors).is_equal(expected)
+        assert msm.multiexp(points, [0] * len(points)).is_inf()
+        assert msm.multiexp([], []).is_inf()
+
+    def test_signed_digits(self):
+        for d in [1, 2, 5, 8]:
+            for factor in [0, 1, 2**d - 1, 2**256 - 1] + self.factors:
+                digits = pippenger.signed_digits(factor, d)
+                assert sum(digit * 2**(d * i) for i, digit in enumerate(digits)) == factor
+                assert all(-2**(d - 1) < digit <= 2**(d - 1) for digit in digits)
+        assert pippenger.default_window(1) >= 1
+        assert pippenger.default_window(2**16) > pippenger.default_window(2**8)
+
+    def test_tuning(self, tmp_path):
+        modulus = MODULUS
+        root_of_unity = pow(PRIMITIVE_ROOT, (modulus - 1) // WIDTH, modulus)
+        domain = [pow(root_of_unity, i, modulus) for i in range(WIDTH)]
+        setup = {"g1_lagrange": make_points(WIDTH, 1)}
+        kzg_utils = KzgUtils(modulus, WIDTH, domain, setup, PrimeField(modulus, WIDTH))
+        values = {i: self.rng.randint(0, 2**256 - 1) for i in range(0, WIDTH, 3)}
+        expected = kzg_utils.compute_commitment_lagrange(values)
+
+        tuning = msm.get_tuning()
+        try:
+            for backend in msm.BACKENDS:
+                msm.set_tuning({bucket: {'backend': backend, 'window': 2} for bucket in range(1, 6)})
+                assert msm.choose(len(values))['backend'] == backend
+                assert msm.choose(2**5) == msm.DEFAULT_CHOICE
+                assert kzg_utils.compute_commitment_lagrange(values).is_equal(expected)
+
+            path = str(tmp_path / "msm_tuning.json")
+            msm.save_tuning({3: {'backend': 'naive', 'window': 1}}, path)
+            msm.set_tuning({})
+            assert msm.load_tuning(path) and msm.get_tuning() == {3: {'backend': 'naive', 'window': 1}}
+            assert not msm.load_tuning(str(tmp_path / "missing.json"))
+        finally:
+            msm.set_tuning(tuning)
+
+    def test_tuning_opt_in(self, tmp_path):
+        # Only loaded on request, never on import
+        assert msm.get_tuning() == {}
+        path = str(tmp_path / "msm_tuning.json")
+        msm.save_tuning({3: {'backend': 'naive', 'window': 1}}, path)
+        try:
+            main(["--msm", "--max-exponent", "0", "--densities", "1", "--repetitions", "1", "--tuning-file", path])
+            assert msm.get_tuning() == {}
+            main(["--msm", "--max-exponent", "0", "--densities", "1", "--repetitions", "1", "--tuning-file", path,
+                  "--use-tuning"])
+            assert msm.get_tuning() == {3: {'backend': 'naive', 'window': 1}}
+            with pytest.raises(SystemExit):
+                main(["--msm", "--use-tuning", "--tuning-file", str(tmp_path / "missing.json")])
+        finally:
+            msm.set_tuning({})
+
+    def test_autotune(self):
+        tuning = autotune(4, repetitions=1)
+        assert sorted(tuning.keys()) == [1, 2, 3, 4]
+        for choice in tuning.values():
+            assert choice['backend'] in msm.BACKENDS and choice['window'] >= 1 and choice['seconds'] > 0
+
+        results = run_msm_benchmark(range(2, 4), (1.0, 0.25), repetitions=1)
+        assert len(results) == 2 * 2 * len(msm.BACKENDS)
+        assert [result['nonzero'] for result in results[::len(msm.BACKENDS)]] == [4, 1, 8, 2]
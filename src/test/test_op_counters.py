@@ -0,0 +1,100 @@
+import hashlib
+from random import Random
+import threading
+
+import pytest
+
+import blst
+import msm
+import verkle_trie
+import vbplus_tree
+import op_counters
+from poly_utils import PrimeField
+from vbplus_tree import VBPlusTree, VBPlusTreeNode, KzgIntegration, int_to_bytes
+
+
+MODULUS = 0x73eda753299d7d483339d80809a1d80553bda402fffe5bfeffffffff00000001
+WIDTH = 4
+PRIMITIVE_ROOT = 7
+SECRET = 8927347823478352432985
+
+NUMBER_KEYS = 64
+
+pytestmark = pytest.mark.usefixtures("verkle_setup")
+
+
+def random_key_values(number_keys, seed):
+    rng = Random(seed)
+    return [(int_to_bytes(rng.randint(0, 2**32)), int_to_bytes(rng.randint(0, 2**32))) for i in range(number_keys)]
+
+
+class TestOpCounters:
+    kzg_integration = KzgIntegration(SECRET, MODULUS, WIDTH, PRIMITIVE_ROOT)
+    key_values = random_key_values(NUMBER_KEYS, 0)
+
+    def test_disabled_by_default(self):
+        points = [blst.G1().mult(i) for i in range(1, 4)]
+        primefield = PrimeField(MODULUS, WIDTH)
+        before = op_counters.snapshot()
+        msm.multiexp(points, [1, 2, 3])
+        vbplus_tree.hash(b"")
+        assert not op_counters.is_enabled() and op_counters.snapshot() == before
+
+        with op_counters.counting() as stats:
+            msm.multiexp(points, [1, 0, 3])
+            vbplus_tree.hash([b"", points[0]])
+            primefield.div(1, 3)
+            # Only the operations of the counted modules
+            blst.G1().mult(3).add(blst.G1()).compress()
+            hashlib.sha256(b"")
+        assert stats['msm'] == 1 and stats['msm_points'] == 3
+        assert stats['sha256'] == 2 and stats['compress'] == 1 and stats['inversions'] == 1
+        assert stats['mult'] == 0 and stats['add'] == 0
+
+        assert not op_counters.is_enabled()
+        vbplus_tree.hash(b"")
+        assert op_counters.snapshot() == dict(before, **{counter: before[counter] + stats[counter]
+                                                         for counter in op_counters.COUNTERS})
+
+    def test_vbplus_tree_upsert(self):
+        key, value = self.key_values[0]
+        tree = VBPlusTree(self.kzg_integration, VBPlusTreeNode('leaf', [key], [value]))
+        for key, value in self.key_values[1:-1]:
+            tree.insert_node(key, value)
+        with op_counters.counting() as stats:
+            tree.add_node_hash(tree.root)
+        assert stats['node_hash'] > 0 and stats['sha256'] == stats['node_hash']
+        assert stats['msm'] > 0 and stats['msm_points'] >= stats['msm']
+
+        key, value = self.key_values[-1]
+        with op_counters.counting() as stats:
+            tree.upsert_vc_node(key, value)
+        assert stats['node_hash'] >= 1 and stats['msm'] == 0
+        tree.check_valid_tree(tree.root)
+
+    def test_verkle_trie_proof(self):
+        rng = Random(1)
+        values = {rng.randbytes(32): rng.randbytes(32) for i in range(NUMBER_KEYS)}
+        root = {"node_type": "inner", "commitment": blst.G1().mult(0)}
+        for key, value in values.items():
+            verkle_trie.insert_verkle_node(root, key, value)
+        verkle_trie.add_node_hash(root)
+
+        keys = list(values.keys())[:4]
+        with op_counters.counting() as stats:
+            verkle_trie.make_verkle_proof(root, keys, False)
+        assert stats['msm'] > 0 and stats['inversions'] > 0 and stats['compress'] > 0
+
+    def test_threads(self):
+        def count_operations():
+            for i in range(1000):
+                op_counters.count('mult', 'add')
+                op_counters.count_msm(3)
+
+        with op_counters.counting() as stats:
+            threads = [threading.Thread(target=count_operations) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert stats['mult'] == stats['add'] == stats['msm'] == 4000 and stats['msm_points'] == 12000
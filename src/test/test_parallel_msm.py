@@ -0,0 +1,55 @@
+from random import Random
+
+import blst
+import msm
+import pippenger
+from benchmarks.msm_tuning import make_points, make_factors
+from kzg_utils import KzgUtils
+from parallel_msm import MsmExecutor
+from poly_utils import PrimeField
+
+
+MODULUS = 0x73eda753299d7d483339d80809a1d80553bda402fffe5bfeffffffff00000001
+WIDTH = 64
+PRIMITIVE_ROOT = 7
+
+
+class TestParallelMsm:
+    rng = Random(0)
+    setup = make_points(WIDTH, 1)
+
+    def test_executor(self):
+        factors = make_factors(WIDTH, 0.5, self.rng)
+        # Not part of the point set, including the point at infinity
+        other_points = make_points(WIDTH, 2)[:-1] + [blst.G1().mult(0)]
+        with MsmExecutor({"setup": self.setup}, workers=2, threshold=8) as executor:
+            for points in [self.setup, other_points, self.setup[:WIDTH // 2] + other_points[WIDTH // 2:]]:
+                expected = pippenger.lincomb_naive(points, factors)
+                assert executor.multiexp(points, factors).is_equal(expected)
+            assert executor._chunk_arguments(self.setup[3:5], [1, 2]) == ("setup", [3, 4], [1, 2])
+            assert executor._chunk_arguments(other_points[:1], [1])[0] is None
+            # Equal points that are other objects, as in a rebuilt setup, are still sent as indices
+            rebuilt_setup = [point.dup() for point in self.setup]
+            assert executor._chunk_arguments(rebuilt_setup[3:5], [1, 2]) == ("setup", [3, 4], [1, 2])
+            assert executor._chunk_arguments([self.setup[3], rebuilt_setup[4]], [1, 2]) == ("setup", [3, 4], [1, 2])
+            assert executor.multiexp(rebuilt_setup, factors).is_equal(pippenger.lincomb_naive(self.setup, factors))
+            # Serial below the threshold
+            assert executor.multiexp(self.setup[:4], factors[:4]).is_equal(
+                pippenger.lincomb_naive(self.setup[:4], factors[:4]))
+
+    def test_kzg_utils(self):
+        root_of_unity = pow(PRIMITIVE_ROOT, (MODULUS - 1) // WIDTH, MODULUS)
+        domain = [pow(root_of_unity, i, MODULUS) for i in range(WIDTH)]
+        kzg_utils = KzgUtils(MODULUS, WIDTH, domain, {"g1_lagrange": self.setup}, PrimeField(MODULUS, WIDTH))
+        values = {i: self.rng.randint(0, 2**256 - 1) for i in range(WIDTH)}
+        sparse_values = {i: values[i] for i in range(0, WIDTH, 16)}
+        expected = kzg_utils.compute_commitment_lagrange(values)
+        expected_sparse = kzg_utils.compute_commitment_lagrange(sparse_values)
+
+        with MsmExecutor({"g1_lagrange": self.setup}, workers=2, threshold=16) as executor:
+            msm.set_executor(executor)
+            try:
+                assert kzg_utils.compute_commitment_lagrange(values).is_equal(expected)
+                assert kzg_utils.compute_commitment_lagrange(sparse_values).is_equal(expected_sparse)
+            finally:
+                msm.set_executor(None)
@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+import verkle_trie
+import phase_timers
+from test.conftest import random_values, build_trie
+
+
+NUMBER_KEYS = 64
+NUMBER_PROOFS = 4
+
+pytestmark = pytest.mark.usefixtures("verkle_setup")
+
+
+class TestPhaseTimers:
+    values = random_values(NUMBER_KEYS, 0)
+
+    def test_histogram(self):
+        histogram = phase_timers.Histogram()
+        for i in range(1, 101):
+            histogram.record(i / 1000)
+        exported = histogram.to_dict()
+        assert exported['count'] == 100 and exported['min'] == 0.001 and exported['max'] == 0.1
+        bound = 2**(1 / phase_timers.BUCKETS_PER_OCTAVE)
+        assert 0.05 <= exported['median'] <= 0.05 * bound
+        assert 0.099 <= exported['p99'] <= 0.1
+        assert sum(count for upper_bound, count in exported['buckets']) == 100
+
+    def test_disabled_records_nothing(self):
+        phase_timers.reset()
+        root = build_trie(self.values)
+        verkle_trie.make_verkle_proof(root, list(self.values.keys())[:4], False)
+        assert phase_timers.export() == {}
+
+    def test_proof_phases_from_threads(self):
+        root = build_trie(self.values)
+        keys = list(self.values.keys())
+        hooked = []
+
+        def hook(name, seconds):
+            hooked.append(name)
+
+        phase_timers.reset()
+        phase_timers.enable()
+        phase_timers.add_hook(hook)
+        try:
+            def prove_and_check(i):
+                proof_keys = keys[4 * i:4 * i + 4]
+                proof = verkle_trie.make_verkle_proof(root, proof_keys, False)
+                assert verkle_trie.check_verkle_proof(root["commitment"].compress(), proof_keys,
+                                                      [self.values[key] for key in proof_keys], proof, False)
+
+            threads = [threading.Thread(target=prove_and_check, args=(i,)) for i in range(NUMBER_PROOFS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            with phase_timers.phase("update"):
+                verkle_trie.update_verkle_node(root, keys[0], bytes(32))
+        finally:
+            phase_timers.disable()
+            phase_timers.remove_hook(hook)
+
+        exported = phase_timers.export()
+        for name in ["Computed g polynomial", "Computed h polynomial", "Decompressed D and sigma",
+                     "Checked KZG proofs", "make_verkle_proof", "check_verkle_proof"]:
+            assert exported[name]['count'] == NUMBER_PROOFS
+        assert exported["update"]['count'] == 1 and exported["update_verkle_node"]['count'] == 1
+        assert exported["make_verkle_proof"]['max'] >= exported["Computed g polynomial"]['max']
+        assert hooked.count("Computed g polynomial") == NUMBER_PROOFS
+
+    def test_display(self, capsys):
+        root = build_trie(self.values)
+        verkle_trie.make_verkle_proof(root, list(self.values.keys())[:4], True)
+        lines = capsys.readouterr().err.splitlines()
+        assert lines[0] == "   Starting proof computation"
+        assert lines[-1].startswith("   Serialized commitments") and lines[-1].endswith(" s")
+        assert any(line.startswith("   Computed g polynomial ") for line in lines)
@@ -0,0 +1,126 @@
+import asyncio
+import socket
+import struct
+import time
+
+import pytest
+
+import verkle_trie
+from concurrent_trie import ConcurrentVerkleTrie
+from proof_serialization import deserialize_verkle_proof
+from proof_service import ProofService, ProofServiceClient, FRAME_HEADER
+from test.conftest import random_values, build_trie
+
+
+NUMBER_INITIAL_KEYS = 128
+NUMBER_REQUESTS = 16
+
+pytestmark = pytest.mark.usefixtures("verkle_setup")
+
+
+class TestProofService:
+    values = random_values(NUMBER_INITIAL_KEYS, 0)
+
+    async def run_service(self, test, path=None, **options):
+        service = ProofService(ConcurrentVerkleTrie(build_trie(self.values)), batch_window=0.02, **options)
+        server = await service.start(path=path)
+        port = server.sockets[0].getsockname()[1] if path is None else None
+        client = await ProofServiceClient.connect(port=port, path=path)
+        try:
+            await test(service, client)
+        finally:
+            await client.close()
+            await service.close()
+
+    def test_batched_puts(self):
+        new_values = random_values(NUMBER_REQUESTS, 1)
+
+        async def test(service, client):
+            epochs = await asyncio.gather(*[client.put(key, value) for key, value in new_values.items()])
+            assert service.writes.batches < NUMBER_REQUESTS
+            assert max(epochs) == service.trie.epoch
+            for key, value in new_values.items():
+                assert await client.get(key) == value
+
+            key = next(iter(self.values))
+            await client.delete(key)
+            assert await client.get(key) is None
+
+            values = dict(self.values)
+            values.update(new_values)
+            del values[key]
+            epoch, commitment = await client.root()
+            assert epoch == service.trie.epoch
+            assert commitment == build_trie(values)["commitment"].compress()
+
+        # Fewer requests in flight than are sent, so reading the connection has to wait for responses
+        asyncio.run(self.run_service(test, max_in_flight=4))
+
+    def test_pipelined_puts(self):
+        new_values = random_values(NUMBER_REQUESTS, 2)
+        key = next(iter(self.values))
+
+        async def test(service, client):
+            write = service.trie.write
+
+            def slow_write(updates, deletes=()):
+                # The first batch is still on its way to the trie when the second one is submitted
+                if updates.get(key) == b"first":
+                    time.sleep(0.1)
+                return write(updates, deletes)
+
+            service.trie.write = slow_write
+            first = [asyncio.ensure_future(client.put(new_key, value)) for new_key, value in new_values.items()]
+            first.append(asyncio.ensure_future(client.put(key, b"first")))
+            await asyncio.sleep(0.03)
+            second = asyncio.ensure_future(client.put(key, b"second"))
+            epochs = await asyncio.gather(*first)
+            assert await second > max(epochs)
+            assert await client.get(key) == b"second"
+            assert service.writes.batches >= 2
+
+        asyncio.run(self.run_service(test))
+
+    def test_aggregated_proofs(self, tmp_path):
+        keys = list(self.values.keys())
+
+        async def test(service, client):
+            requests = [keys[2 * i:2 * i + 2] for i in range(NUMBER_REQUESTS // 2)]
+            responses = await asyncio.gather(*[client.prove(request) for request in requests])
+            assert service.proofs.batches < len(requests)
+            # The multiproofs are made in the prover processes
+            assert len(service.provers._processes) > 0
+
+            for request, (epoch, commitment, proof, proof_keys, proof_values) in zip(requests, responses):
+                assert set(request) <= set(proof_keys)
+                assert proof_values == [self.values[key] for key in proof_keys]
+                assert verkle_trie.check_verkle_proof(commitment, proof_keys, proof_values,
+                                                      deserialize_verkle_proof(proof), False)
+
+            with pytest.raises(RuntimeError):
+                await client.prove([bytes(32)])
+
+        asyncio.run(self.run_service(test, str(tmp_path / "service.sock")))
+
+    def test_connection_reset(self):
+        async def reset(reader, writer):
+            await reader.readexactly(FRAME_HEADER.size)
+            # Closing with a zero linger time resets the connection
+            writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            writer.transport.abort()
+
+        async def test():
+            server = await asyncio.start_server(reset, "127.0.0.1", 0)
+            client = await ProofServiceClient.connect(port=server.sockets[0].getsockname()[1])
+            try:
+                with pytest.raises(ConnectionError):
+                    await asyncio.wait_for(client.get(bytes(32)), 5)
+                # Later calls fail instead of waiting forever
+                with pytest.raises(ConnectionError):
+                    await asyncio.wait_for(client.root(), 5)
+            finally:
+                await client.close()
+                server.close()
+                await server.wait_closed()
+
+        asyncio.run(test())
@@ -0,0 +1,67 @@
+import csv
+
+import pytest
+
+from benchmarks.scaling import sweep_configs, run_sweep, save_baseline, load_baseline, list_baselines, compare, \
+    regressions, mann_whitney_u, throughput_vs_n, latency_vs_width, write_curves
+
+
+def result(width_bits, initial_keys, samples):
+    samples = sorted(samples)
+    return {'config': {'tree': 'vb_tree', 'width_bits': width_bits, 'initial_keys': initial_keys, 'seed': 0,
+                       'repetitions': len(samples)},
+            'phases': {'search': {'count': len(samples), 'mean': sum(samples) / len(samples),
+                                  'median': samples[len(samples) // 2], 'p95': samples[-1], 'p99': samples[-1],
+                                  'samples': samples}}}
+
+
+class TestScaling:
+    def test_mann_whitney_u(self):
+        u, p = mann_whitney_u([1, 2, 3, 4, 5], [6, 7, 8, 9, 10])
+        assert u == 0 and p == pytest.approx(0.01219, abs=1e-4)
+        u, p = mann_whitney_u([1, 2, 2, 3], [1, 2, 2, 3])
+        assert u == 8 and p == 1
+        assert mann_whitney_u([1], [1]) == (0.5, 1.0)
+
+    def test_compare(self):
+        baseline = [result(2, 64, [1.0 + i / 100 for i in range(20)]),
+                    result(3, 64, [1.0 + i / 100 for i in range(20)])]
+        results = [result(2, 64, [1.5 + i / 100 for i in range(20)]),
+                   result(3, 64, [1.0 + i / 100 for i in range(1, 21)]),
+                   result(4, 64, [1.0])]
+        # The number of repetitions is not part of the configuration that is compared
+        results[0]['config']['repetitions'] = 7
+        comparisons = compare(baseline, results, threshold=0.05)
+        assert [comparison['status'] for comparison in comparisons] == ['regression', 'unchanged', 'new']
+        assert comparisons[0]['change'] == pytest.approx(0.5 / 1.1)
+        assert regressions(comparisons) == [comparisons[0]]
+        # Not a regression if the slowdown is below the threshold
+        assert regressions(compare(baseline, results, threshold=0.6)) == []
+        assert compare(results, baseline)[0]['status'] == 'improvement'
+
+    def test_sweep(self, tmp_path):
+        configs = sweep_configs(['vbst', 'vbplus_tree'], [2, 3], range(4, 6), operations=8, repetitions=2)
+        assert [(config.tree, config.width_bits, config.initial_keys) for config in configs] == \
+            [('vbst', 1, 16), ('vbst', 1, 32), ('vbplus_tree', 2, 16), ('vbplus_tree', 2, 32),
+             ('vbplus_tree', 3, 16), ('vbplus_tree', 3, 32)]
+        results = run_sweep(configs)
+        assert len(results[0]['phases']['insert']['samples']) == 2 * 15
+
+        path = save_baseline(results, "test", str(tmp_path))
+        assert path.endswith("test.json") and list_baselines(str(tmp_path)) == ["test"]
+        baseline = load_baseline("test", str(tmp_path))
+        assert baseline['version'] == 1 and baseline['results'] == results
+        assert all(comparison['status'] != 'new' for comparison in compare(baseline['results'], results))
+
+        throughput = throughput_vs_n(results, 'insert')
+        assert [(row['tree'], row['width_bits'], row['number_keys']) for row in throughput][:3] == \
+            [('vbplus_tree', 2, 16), ('vbplus_tree', 2, 32), ('vbplus_tree', 3, 16)]
+        assert all(row['throughput'] > 0 for row in throughput)
+        latency = latency_vs_width(results, 'search')
+        assert [(row['tree'], row['width_bits'], row['number_keys']) for row in latency] == \
+            [('vbplus_tree', 2, 32), ('vbplus_tree', 3, 32), ('vbst', 1, 32)]
+
+        paths = write_curves(results, str(tmp_path / "curves"))
+        with open(str(tmp_path / "curves" / "latency_vs_width_search.csv")) as file:
+            assert len(list(csv.DictReader(file))) == 3
+        assert str(tmp_path / "curves" / "throughput_vs_n_insert.csv") in paths
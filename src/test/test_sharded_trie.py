@@ -0,0 +1,70 @@
+import pytest
+
+import verkle_trie
+from sharded_trie import ShardedVerkleTrie, check_sharded_proof, get_shard
+from write_ahead_log import UPSERT, DELETE
+from test.conftest import random_values, build_trie
+
+
+SECRET = 8927347823478352432985
+NUMBER_SHARDS = 4
+NUMBER_KEYS = 128
+
+pytestmark = pytest.mark.usefixtures("verkle_setup")
+
+
+class TestShardedVerkleTrie:
+    values = random_values(NUMBER_KEYS, 0)
+
+    def test_sharded_trie(self):
+        trie = ShardedVerkleTrie(NUMBER_SHARDS, SECRET)
+        try:
+            trie.apply([(UPSERT, key, value) for key, value in self.values.items()])
+            deleted_key = next(iter(self.values))
+            trie.apply([(DELETE, deleted_key, b"")])
+            values = dict(self.values)
+            del values[deleted_key]
+
+            # Every shard root matches a trie built from the keys of that shard
+            for shard in range(NUMBER_SHARDS):
+                shard_values = {key: value for key, value in values.items() if get_shard(key, NUMBER_SHARDS) == shard}
+                assert trie.shard_roots[shard] == build_trie(shard_values)["commitment"].compress()
+            assert trie.get(deleted_key) is None
+
+            keys = list(values.keys())[:10]
+            proof = trie.make_proof(keys)
+            root = trie.root_commitment()
+            assert len(proof[1]) > 1
+            assert check_sharded_proof(root, NUMBER_SHARDS, keys, [values[key] for key in keys], proof)
+            assert not check_sharded_proof(root, NUMBER_SHARDS, keys, [bytes(32)] + [values[key] for key in keys[1:]], proof)
+
+            # The shard count comes from the verifier, not from the proof
+            assert not check_sharded_proof(root, NUMBER_SHARDS * 2, keys, [values[key] for key in keys], proof)
+            assert not check_sharded_proof(root, NUMBER_SHARDS, keys, [values[key] for key in keys],
+                                           (NUMBER_SHARDS * 2,) + proof[1:])
+
+            # A failing shard does not leave the replies of the other shards behind
+            other_shard = (get_shard(keys[0], NUMBER_SHARDS) + 1) % NUMBER_SHARDS
+            with pytest.raises(ValueError):
+                trie._request_all({get_shard(keys[0], NUMBER_SHARDS): ("apply", [(7, keys[0], b"")]),
+                                   other_shard: ("root", None)})
+            assert trie.get(keys[0]) == values[keys[0]]
+            assert trie._request_all({other_shard: ("root", None)})[other_shard] == trie.shard_roots[other_shard]
+
+            trie.apply([(UPSERT, keys[0], bytes(32))])
+            assert not check_sharded_proof(trie.root_commitment(), NUMBER_SHARDS, keys, [values[key] for key in keys], proof)
+        finally:
+            trie.close()
+
+    @pytest.mark.parametrize("verkle_setup", [4], indirect=True)
+    def test_narrow_width(self):
+        trie = ShardedVerkleTrie(NUMBER_SHARDS, SECRET)
+        try:
+            trie.apply([(UPSERT, key, value) for key, value in self.values.items()])
+            assert len(trie.top_level_values) == verkle_trie.WIDTH == 16
+            keys = list(self.values.keys())[:10]
+            proof = trie.make_proof(keys)
+            assert check_sharded_proof(trie.root_commitment(), NUMBER_SHARDS, keys, [self.values[key] for key in keys],
+                                       proof)
+        finally:
+            trie.close()
@@ -0,0 +1,149 @@
+from random import Random
+
+import pytest
+
+import blst
+import verkle_trie
+import tree_snapshot
+from tree_snapshot import SnapshotError
+from vbst import VBST, VBSTNode
+from vb_tree import VBTree, VBTreeNode
+from vbplus_tree import VBPlusTree, VBPlusTreeNode, KzgIntegration, int_to_bytes
+
+
+MODULUS = 0x73eda753299d7d483339d80809a1d80553bda402fffe5bfeffffffff00000001
+WIDTH = 4
+PRIMITIVE_ROOT = 7
+SECRET = 8927347823478352432985
+
+NUMBER_KEYS = 100
+
+pytestmark = pytest.mark.usefixtures("verkle_setup")
+
+
+def random_key_values(number_keys, seed):
+    rng = Random(seed)
+    return [(int_to_bytes(rng.randint(0, 2**32)), int_to_bytes(rng.randint(0, 2**32))) for i in range(number_keys)]
+
+
+class TestTreeSnapshot:
+    kzg_integration = KzgIntegration(SECRET, MODULUS, WIDTH, PRIMITIVE_ROOT)
+    vbst_kzg_integration = KzgIntegration(SECRET, MODULUS, 2, PRIMITIVE_ROOT)
+    key_values = random_key_values(NUMBER_KEYS, 0)
+
+    def build_tree(self, tree_class, node_class, kzg):
+        key, value = self.key_values[0]
+        if node_class is VBPlusTreeNode:
+            root = node_class('leaf', [key], [value])
+        elif node_class is VBTreeNode:
+            root = node_class([key], [value])
+        else:
+            root = node_class(key, value)
+        tree = tree_class(kzg, root)
+        for key, value in self.key_values[1:]:
+            tree.insert_node(key, value)
+        tree.add_node_hash(tree.root)
+        return tree
+
+    @pytest.mark.parametrize("tree_class, node_class", [(VBST, VBSTNode), (VBTree, VBTreeNode),
+                                                        (VBPlusTree, VBPlusTreeNode)])
+    def test_roundtrip(self, tmp_path, tree_class, node_class):
+        kzg = self.vbst_kzg_integration if tree_class is VBST else self.kzg_integration
+        tree = self.build_tree(tree_class, node_class, kzg)
+        path = str(tmp_path / "tree.snapshot")
+        tree_snapshot.snapshot(tree, path)
+
+        loaded = tree_snapshot.load(path, kzg, check_samples=20, seed=0)
+        assert isinstance(loaded, tree_class)
+        assert loaded.root.hash == tree.root.hash
+        loaded.check_valid_tree(loaded.root)
+        for key, value in self.key_values:
+            if tree_class is VBST:
+                assert loaded.find_node(loaded.root, key).value == value
+            else:
+                node, idx = loaded.find_node(loaded.root, key)
+                assert node.values[idx] == value
+
+        # The loaded tree can be updated like the original one
+        key, value = int_to_bytes(2**33), int_to_bytes(1)
+        tree.upsert_vc_node(key, value)
+        loaded.upsert_vc_node(key, value)
+        assert loaded.root.hash == tree.root.hash
+
+    def test_bounded_buffers(self, tmp_path, monkeypatch):
+        tree = self.build_tree(VBST, VBSTNode, self.vbst_kzg_integration)
+        monkeypatch.setattr(tree_snapshot, "WRITE_BUFFER_SIZE", 256)
+        monkeypatch.setattr(tree_snapshot, "READ_BUFFER_SIZE", 100)
+        flushed = []
+        flush = tree_snapshot._Writer.flush
+
+        def record_flush(writer):
+            flushed.append(len(writer.buffer))
+            flush(writer)
+        monkeypatch.setattr(tree_snapshot._Writer, "flush", record_flush)
+
+        path = str(tmp_path / "tree.snapshot")
+        tree_snapshot.snapshot(tree, path)
+        # Flushed once the buffer reaches the threshold, which one node can only exceed by its own size
+        assert len(flushed) > 2 and max(flushed) < 256 + 200
+
+        loaded = tree_snapshot.load(path, self.vbst_kzg_integration)
+        assert loaded.root.hash == tree.root.hash
+        loaded.check_valid_tree(loaded.root)
+
+    def test_vbplus_tree_leaves_linked(self, tmp_path):
+        tree = self.build_tree(VBPlusTree, VBPlusTreeNode, self.kzg_integration)
+        path = str(tmp_path / "tree.snapshot")
+        tree_snapshot.snapshot(tree, path)
+        loaded = tree_snapshot.load(path, self.kzg_integration)
+
+        node = loaded.root
+        while node.node_type == 'inner':
+            node = node.children[0]
+        keys = []
+        while node is not None:
+            keys.extend(node.keys)
+            node = node.next_leaf
+        assert keys == sorted(key for key, value in self.key_values)
+
+    def test_verkle_trie(self, tmp_path):
+        rng = Random(0)
+        root = {"node_type": "inner", "commitment": blst.G1().mult(0)}
+        for i in range(NUMBER_KEYS):
+            verkle_trie.insert_verkle_node(root, rng.randbytes(32), rng.randbytes(32))
+        verkle_trie.add_node_hash(root)
+
+        path = str(tmp_path / "trie.snapshot")
+        tree_snapshot.snapshot(root, path)
+        loaded = tree_snapshot.load(path, check_samples=10, seed=0)
+        assert loaded["hash"] == root["hash"]
+        assert verkle_trie.get_total_depth(loaded) == verkle_trie.get_total_depth(root)
+
+    def test_corrupted_snapshot(self, tmp_path):
+        tree = self.build_tree(VBTree, VBTreeNode, self.kzg_integration)
+        path = str(tmp_path / "tree.snapshot")
+        tree_snapshot.snapshot(tree, path)
+        with open(path, "rb") as file:
+            data = bytearray(file.read())
+
+        with open(path, "wb") as file:
+            file.write(data[:len(data) // 2])
+        with pytest.raises(SnapshotError):
+            tree_snapshot.load(path, self.kzg_integration)
+
+        data[len(data) // 2] ^= 1
+        with open(path, "wb") as file:
+            file.write(data)
+        with pytest.raises(SnapshotError):
+            tree_snapshot.load(path, self.kzg_integration)
+
+    def test_sampled_check(self, tmp_path):
+        tree = self.build_tree(VBTree, VBTreeNode, self.kzg_integration)
+        # A stale hash in the root is written as is, but found by the check of the root
+        tree.root.hash = bytes(32)
+        path = str(tmp_path / "tree.snapshot")
+        tree_snapshot.snapshot(tree, path)
+
+        tree_snapshot.load(path, self.kzg_integration)
+        with pytest.raises(SnapshotError):
+            tree_snapshot.load(path, self.kzg_integration, check_samples=NUMBER_KEYS)
@@ -0,0 +1,134 @@
+import socket
+import threading
+from random import Random
+
+import pytest
+
+from tree_sync import LocalPeer, SocketPeer, serve, diff, sync
+from vbplus_tree import VBPlusTree, VBPlusTreeNode, KzgIntegration, int_to_bytes
+from test.conftest import build_trie
+
+
+MODULUS = 0x73eda753299d7d483339d80809a1d80553bda402fffe5bfeffffffff00000001
+WIDTH = 4
+PRIMITIVE_ROOT = 7
+SECRET = 8927347823478352432985
+
+NUMBER_INITIAL_KEYS = 300
+NUMBER_CHANGED_KEYS = 10
+
+pytestmark = pytest.mark.usefixtures("verkle_setup")
+
+
+class CountingPeer(LocalPeer):
+    def __init__(self, tree):
+        super().__init__(tree)
+        self.requests = 0
+        self.leaves_sent = 0
+
+    def describe(self, path=()):
+        self.requests += 1
+        return super().describe(path)
+
+    def leaves(self, path=()):
+        for leaf in super().leaves(path):
+            self.leaves_sent += 1
+            yield leaf
+
+
+class TestTreeSync:
+    kzg_integration = KzgIntegration(SECRET, MODULUS, WIDTH, PRIMITIVE_ROOT)
+
+    def build_vbplus_tree(self, key_values):
+        key, value = key_values[0]
+        tree = VBPlusTree(self.kzg_integration, VBPlusTreeNode('leaf', [key], [value]))
+        for key, value in key_values[1:]:
+            tree.insert_node(key, value)
+        tree.add_node_hash(tree.root)
+        return tree
+
+    def test_verkle_trie_sync(self):
+        rng = Random(0)
+        values = {rng.randbytes(32): rng.randbytes(32) for i in range(NUMBER_INITIAL_KEYS)}
+        lagging = build_trie(values)
+
+        keys = list(values.keys())
+        changes = {key: rng.randbytes(32) for key in rng.sample(keys, NUMBER_CHANGED_KEYS)}
+        changes.update({rng.randbytes(32): rng.randbytes(32) for i in range(NUMBER_CHANGED_KEYS)})
+        deleted = keys[:NUMBER_CHANGED_KEYS]
+        current_values = dict(values)
+        current_values.update(changes)
+        for key in deleted:
+            del current_values[key]
+        current = build_trie(current_values)
+
+        remote = CountingPeer(current)
+        differences = list(diff(LocalPeer(lagging), remote))
+        assert sorted(key for key, local_value, remote_value in differences) == sorted(list(changes) + deleted)
+        assert remote.requests < NUMBER_INITIAL_KEYS // 2
+
+        assert sync(lagging, remote) == len(differences)
+        assert lagging["hash"] == current["hash"]
+        assert list(diff(LocalPeer(lagging), remote)) == []
+
+    def test_vbplus_tree_sync_over_socket(self):
+        rng = Random(1)
+        key_values = [(int_to_bytes(rng.randint(0, 2**32)), int_to_bytes(rng.randint(0, 2**32)))
+                      for i in range(NUMBER_INITIAL_KEYS)]
+        lagging = self.build_vbplus_tree(key_values)
+        current = self.build_vbplus_tree(key_values)
+        for key, value in key_values[:NUMBER_CHANGED_KEYS]:
+            current.upsert_vc_node(key, int_to_bytes(rng.randint(0, 2**32)))
+        for i in range(NUMBER_CHANGED_KEYS):
+            current.upsert_vc_node(int_to_bytes(rng.randint(0, 2**32)), int_to_bytes(i))
+
+        server_socket, client_socket = socket.socketpair()
+        server = threading.Thread(target=serve, args=(current, server_socket))
+        server.start()
+        peer = SocketPeer(client_socket)
+        try:
+            assert len(list(diff(LocalPeer(lagging), peer))) == 2 * NUMBER_CHANGED_KEYS
+            sync(lagging, peer)
+            assert lagging.root.hash == current.root.hash
+            assert list(diff(LocalPeer(lagging), peer)) == []
+        finally:
+            peer.close()
+            client_socket.close()
+            server.join()
+            server_socket.close()
+        lagging.check_valid_tree(lagging.root)
+
+    def test_vbplus_tree_different_separators(self):
+        rng = Random(2)
+        key_values = [(int_to_bytes(rng.randint(0, 2**32)), int_to_bytes(rng.randint(0, 2**32)))
+                      for i in range(NUMBER_INITIAL_KEYS)]
+        lagging = self.build_vbplus_tree(key_values)
+        current = self.build_vbplus_tree(key_values)
+        added = [(int_to_bytes(rng.randint(0, 2**32)), int_to_bytes(i)) for i in range(NUMBER_CHANGED_KEYS)]
+        for key, value in added:
+            current.upsert_vc_node(key, value)
+
+        # Only the children whose key ranges overlap changed ones are compared, not whole subtrees
+        remote = CountingPeer(current)
+        differences = list(diff(LocalPeer(lagging), remote))
+        assert differences == [(key, None, value) for key, value in sorted(added)]
+        assert remote.leaves_sent <= 4 * NUMBER_CHANGED_KEYS
+
+        assert sync(lagging, remote) == NUMBER_CHANGED_KEYS
+        assert list(diff(LocalPeer(lagging), remote)) == []
+        lagging.check_valid_tree(lagging.root)
+
+    def test_vbplus_tree_delete_rejected(self):
+        rng = Random(3)
+        key_values = [(int_to_bytes(rng.randint(0, 2**32)), int_to_bytes(rng.randint(0, 2**32)))
+                      for i in range(NUMBER_INITIAL_KEYS)]
+        lagging = self.build_vbplus_tree(key_values)
+        # The remote misses the largest key, whose delete comes after the other changes
+        current = self.build_vbplus_tree([key_value for key_value in key_values if key_value != max(key_values)])
+        for key, value in key_values[:NUMBER_CHANGED_KEYS]:
+            current.upsert_vc_node(key, bytes(32))
+        root_hash = lagging.root.hash
+
+        with pytest.raises(ValueError):
+            sync(lagging, LocalPeer(current), batch_size=1)
+        assert lagging.root.hash == root_hash
@@ -0,0 +1,254 @@
+import threading
+from random import Random
+
+import pytest
+
+import blst
+import verkle_trie
+from proof_serialization import (serialize_verkle_proof, deserialize_verkle_proof, StreamingProofDecoder,
+                                 ProofFormatError, CommitmentCache, COMMITMENT_SIZE)
+from test.conftest import random_values, build_trie
+
+
+NUMBER_INITIAL_KEYS = 512
+NUMBER_KEYS_PROOF = 128
+
+pytestmark = pytest.mark.usefixtures("verkle_setup")
+
+
+@pytest.fixture(scope="module")
+def trie(verkle_setup):
+    values = random_values(NUMBER_INITIAL_KEYS, 0)
+    root = build_trie(values)
+    keys_in_proof = list(values.keys())[:NUMBER_KEYS_PROOF]
+    return root, values, keys_in_proof
+
+
+@pytest.fixture(scope="module")
+def proof(trie):
+    root, values, keys_in_proof = trie
+    return verkle_trie.make_verkle_proof(root, keys_in_proof, False)
+
+
+class TestVerkleTrie:
+    def test_proof(self, trie):
+        root, values, keys = trie
+        proof = verkle_trie.make_verkle_proof(root, keys, False)
+
+        assert verkle_trie.check_verkle_proof(root["commitment"].compress(), keys,
+                                              [values[key] for key in keys], proof, False)
+
+    def test_proof_wrong_value(self, trie):
+        root, values, keys = trie
+        proof = verkle_trie.make_verkle_proof(root, keys, False)
+        wrong_values = [values[key] for key in keys]
+        wrong_values[0] = bytes(32)
+
+        assert not verkle_trie.check_verkle_proof(root["commitment"].compress(), keys,
+                                                  wrong_values, proof, False)
+
+    def test_proof_single_key(self, trie):
+        root, values, keys_in_proof = trie
+        keys = keys_in_proof[:1]
+        proof = verkle_trie.make_verkle_proof(root, keys, False)
+
+        assert verkle_trie.check_verkle_proof(root["commitment"].compress(), keys,
+                                              [values[key] for key in keys], proof, False)
+
+    def test_proof_unsorted_keys(self, trie):
+        root, values, keys_in_proof = trie
+        keys = list(reversed(keys_in_proof))
+        proof = verkle_trie.make_verkle_proof(root, keys, False)
+
+        assert verkle_trie.check_verkle_proof(root["commitment"].compress(), keys,
+                                              [values[key] for key in keys], proof, False)
+
+    def test_multiproof_same_polynomial(self):
+        rng = Random(2)
+        polynomials = [[rng.randint(0, verkle_trie.MODULUS - 1) for i in range(verkle_trie.WIDTH)] for j in range(2)]
+        commitments = [verkle_trie.kzg_utils.compute_commitment_lagrange(dict(enumerate(f))) for f in polynomials]
+        Cs = [commitments[0], commitments[0], commitments[1], commitments[0]]
+        indices = [1, 2, 1, 1]
+        ys = [polynomials[j][index] for j, index in zip([0, 0, 1, 0], indices)]
+        shared = verkle_trie.make_kzg_multiproof(Cs, [polynomials[j] for j in [0, 0, 1, 0]], indices, ys, False)
+        # The same polynomial in separate lists, as for nodes that are copied
+        copied = verkle_trie.make_kzg_multiproof(Cs, [list(polynomials[j]) for j in [0, 0, 1, 0]], indices, ys,
+                                                 False)
+
+        assert copied == shared
+        assert verkle_trie.check_kzg_multiproof(Cs, indices, ys, copied, False)
+
+
+class TestProofSerialization:
+    def test_domain_inverses(self):
+        kzg_utils = verkle_trie.kzg_utils
+        primefield = verkle_trie.primefield
+        z = Random(1).randint(0, 2**256)
+        inverses = kzg_utils.domain_inverses(z)
+        assert inverses == [primefield.div(1, z - x) for x in verkle_trie.DOMAIN]
+        # Cached for the same z, also if it is not reduced
+        assert kzg_utils.domain_inverses(z + verkle_trie.MODULUS) is inverses
+        # No inverse on the domain
+        assert kzg_utils.domain_inverses(verkle_trie.DOMAIN[3])[3] == 0
+
+    def test_roundtrip(self, trie, proof):
+        data = serialize_verkle_proof(proof)
+        assert len(data) == verkle_trie.get_proof_size(proof)
+
+        depths, commitments, D, y, sigma = deserialize_verkle_proof(data)
+        assert list(depths) == proof[0]
+        assert [bytes(x) for x in commitments] == proof[1]
+        assert (bytes(D), y, bytes(sigma)) == proof[2:]
+
+        root, values, keys = trie
+        assert verkle_trie.check_verkle_proof(root["commitment"].compress(), keys,
+                                              [values[key] for key in keys], (depths, commitments, D, y, sigma), False)
+
+    def test_streaming_decoder(self, trie, proof):
+        data = serialize_verkle_proof(proof)
+        cache = CommitmentCache()
+        decoder = StreamingProofDecoder(cache)
+        for i in range(0, len(data), 100):
+            assert not decoder.is_complete()
+            decoder.feed(data[i:i + 100])
+            # Decoded bytes are dropped
+            assert len(decoder.buffer) < 100 + max(COMMITMENT_SIZE, len(proof[0]))
+        assert decoder.is_complete()
+        assert len(decoder.buffer) == 0
+
+        root, values, keys = trie
+        assert verkle_trie.check_verkle_proof(root["commitment"].compress(), keys,
+                                              [values[key] for key in keys], decoder.proof(), False)
+        # D and sigma are not cached
+        assert set(cache.points.keys()) == set(proof[1])
+
+    def test_truncated_proof(self, proof):
+        data = serialize_verkle_proof(proof)
+        with pytest.raises(ProofFormatError):
+            deserialize_verkle_proof(data[:-1])
+
+    def test_point_size(self, proof):
+        depths, commitments, D, y, sigma = proof
+        for invalid_proof in [(depths, commitments, D[:-1], y, sigma), (depths, commitments, D, y, sigma + b"\0"),
+                              (depths, [commitments[0][:-1]] + commitments[1:], D, y, sigma)]:
+            with pytest.raises(ProofFormatError):
+                serialize_verkle_proof(invalid_proof)
+
+
+class TestCommitmentCache:
+    def test_decompress_batch(self):
+        cache = CommitmentCache(max_size=2)
+        points = [blst.G1().mult(i) for i in range(1, 4)]
+        serialized = [point.compress() for point in points]
+
+        decoded = cache.decompress_batch(serialized + serialized[:1])
+        assert all(x.is_equal(y) for x, y in zip(decoded, points + points[:1]))
+        assert decoded[0] is decoded[3]
+        assert cache.misses == 3 and len(cache.points) == 2
+
+        assert cache.decompress(serialized[2]) is decoded[2]
+        assert cache.hits == 1
+
+    def test_shared_between_threads(self):
+        cache = CommitmentCache(max_size=8)
+        serialized = [blst.G1().mult(i).compress() for i in range(1, 17)]
+        errors = []
+
+        def decompress(seed):
+            rng = Random(seed)
+            try:
+                for i in range(200):
+                    x = serialized[rng.randrange(len(serialized))]
+                    assert cache.decompress(x).compress() == x
+            except AssertionError as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=decompress, args=(seed,)) for seed in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert len(cache.points) <= 8 and cache.hits + cache.misses == 4 * 200
+
+    def test_point_not_in_subgroup(self):
+        # x = 4 gives a point on the curve which is not in the G1 subgroup
+        serialized = (4 | (1 << 383)).to_bytes(48, "big")
+        with pytest.raises(ValueError):
+            CommitmentCache().decompress(serialized)
+        assert not CommitmentCache(check_subgroup=False).decompress(serialized).in_group()
+
+
+class TestStatelessUpdate:
+    def test_compute_updated_verkle_root(self):
+        values = random_values(256, 1)
+        root = build_trie(values)
+        keys = list(values.keys())[:32]
+        old_values = [values[key] for key in keys]
+        updated_values = [bytes([i]) * 32 if i % 3 != 0 else None for i in range(len(keys))]
+
+        proof = verkle_trie.make_verkle_proof(root, keys, False)
+        result, update_hint = verkle_trie.check_verkle_proof(root["commitment"].compress(), keys, old_values,
+                                                             proof, False, return_update_hint=True)
+        assert result
+
+        updated_root = verkle_trie.compute_updated_verkle_root(root["commitment"].compress(), keys, old_values,
+                                                               updated_values, update_hint, False)
+
+        for key, updated_value in zip(keys, updated_values):
+            if updated_value is not None:
+                verkle_trie.update_verkle_node(root, key, updated_value)
+
+        assert updated_root.is_equal(root["commitment"])
+        verkle_trie.check_valid_tree(root)
+
+    def test_invalid_proof(self):
+        values = random_values(64, 2)
+        root = build_trie(values)
+        keys = list(values.keys())[:4]
+        old_values = [values[key] for key in keys]
+        proof = verkle_trie.make_verkle_proof(root, keys, False)
+
+        wrong_values = [bytes(32)] + old_values[1:]
+        result, update_hint = verkle_trie.check_verkle_proof(root["commitment"].compress(), keys, wrong_values,
+                                                             proof, False, return_update_hint=True)
+        assert not result and update_hint is None
+        with pytest.raises(ValueError):
+            verkle_trie.compute_updated_verkle_root(root["commitment"].compress(), keys, wrong_values,
+                                                    [bytes(32)] * len(keys), update_hint, False)
+
+        # The old values have to be the ones that were checked
+        result, update_hint = verkle_trie.check_verkle_proof(root["commitment"].compress(), keys, old_values,
+                                                             proof, False, return_update_hint=True)
+        assert result
+        with pytest.raises(ValueError):
+            verkle_trie.compute_updated_verkle_root(root["commitment"].compress(), keys, wrong_values,
+                                                    [bytes(32)] * len(keys), update_hint, False)
+
+    def test_duplicate_keys(self):
+        values = random_values(64, 3)
+        root = build_trie(values)
+        keys = list(values.keys())[:4]
+        proof = verkle_trie.make_verkle_proof(root, keys, False)
+        commitment = root["commitment"].compress()
+
+        # A key cannot be proven with two values, even if one of them is right
+        duplicate_keys = keys + keys[:1]
+        wrong_values = [bytes(32)] + [values[key] for key in keys]
+        assert not verkle_trie.check_verkle_proof(commitment, duplicate_keys, wrong_values,
+                                                  verkle_trie.make_verkle_proof(root, duplicate_keys, False), False)
+
+        old_values = [values[key] for key in duplicate_keys]
+        result, update_hint = verkle_trie.check_verkle_proof(commitment, keys, old_values[:-1], proof, False,
+                                                             return_update_hint=True)
+        assert result
+        with pytest.raises(ValueError):
+            verkle_trie.compute_updated_verkle_root(commitment, duplicate_keys, old_values,
+                                                    [bytes(32)] * 4 + [bytes([1]) * 32], update_hint, False)
+
+        # The same update of a key given twice is applied once
+        updated_values = [bytes(32)] + [None] * 3 + [bytes(32)]
+        updated_root = verkle_trie.compute_updated_verkle_root(commitment, duplicate_keys, old_values, updated_values,
+                                                               update_hint, False)
+        verkle_trie.update_verkle_node(root, keys[0], bytes(32))
+        assert updated_root.is_equal(root["commitment"])
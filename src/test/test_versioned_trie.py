@@ -0,0 +1,89 @@
+from random import Random
+
+import pytest
+
+import verkle_trie
+from versioned_trie import VersionedVerkleTrie
+from test.conftest import random_values, build_trie
+
+
+NUMBER_INITIAL_KEYS = 256
+NUMBER_UPDATED_KEYS = 16
+
+pytestmark = pytest.mark.usefixtures("verkle_setup")
+
+
+def count_nodes(node, seen):
+    if id(node) in seen:
+        return 0
+    seen.add(id(node))
+    if node["node_type"] == "leaf":
+        return 1
+    return 1 + sum(count_nodes(node[i], seen) for i in range(verkle_trie.WIDTH) if i in node)
+
+
+class TestVersionedVerkleTrie:
+    values = random_values(NUMBER_INITIAL_KEYS, 0)
+
+    def make_versions(self, retain=8):
+        rng = Random(1)
+        trie = VersionedVerkleTrie(build_trie(self.values), retain)
+        keys = list(self.values.keys())
+        expected = [dict(self.values)]
+        for version in range(3):
+            updates = {key: rng.randbytes(32) for key in rng.sample(keys, NUMBER_UPDATED_KEYS)}
+            updates.update({rng.randbytes(32): rng.randbytes(32) for i in range(NUMBER_UPDATED_KEYS)})
+            deletes = rng.sample(keys, 4)
+            trie.commit(updates, deletes)
+
+            current = dict(expected[-1])
+            current.update(updates)
+            for key in deletes:
+                current.pop(key, None)
+            keys = list(current.keys())
+            expected.append(current)
+        return trie, expected
+
+    def test_versions_match_rebuilt_tries(self):
+        trie, expected = self.make_versions()
+        for version, values in enumerate(expected):
+            root = trie.root(version)
+            verkle_trie.check_valid_tree(root)
+            assert root["hash"] == build_trie(values)["hash"]
+            for key, value in list(values.items())[:20]:
+                assert trie.get(key, version) == value
+
+    @pytest.mark.parametrize("verkle_setup", [9], indirect=True)
+    def test_wide_trie(self):
+        # Inner nodes have children beyond index 255
+        trie, expected = self.make_versions()
+        assert verkle_trie.WIDTH == 512
+        for version, values in enumerate(expected):
+            assert trie.root(version)["hash"] == build_trie(values)["hash"]
+
+    def test_structural_sharing(self):
+        trie, expected = self.make_versions()
+        seen = set()
+        first_version_nodes = count_nodes(trie.root(0), seen)
+        new_nodes = count_nodes(trie.root(1), seen)
+        assert 0 < new_nodes < first_version_nodes // 2
+
+    def test_proof_against_old_version(self):
+        trie, expected = self.make_versions()
+        keys = list(expected[1].keys())[:8]
+        proof = trie.make_proof(keys, 1)
+        assert verkle_trie.check_verkle_proof(trie.root_commitment(1), keys, [expected[1][key] for key in keys],
+                                              proof, False)
+        assert not verkle_trie.check_verkle_proof(trie.root_commitment(2), keys,
+                                                  [expected[1][key] for key in keys], proof, False)
+
+    def test_retention(self):
+        trie, expected = self.make_versions(retain=2)
+        assert list(trie.versions.keys()) == [2, 3]
+
+        trie.pin(2)
+        trie.commit({b"\x01" * 32: b"\x02" * 32})
+        trie.commit({b"\x03" * 32: b"\x04" * 32})
+        assert list(trie.versions.keys()) == [2, 4, 5]
+        trie.unpin(2)
+        assert list(trie.versions.keys()) == [4, 5]
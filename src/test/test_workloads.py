@@ -0,0 +1,85 @@
+import sys
+from collections import Counter
+from random import Random
+
+import pytest
+
+from benchmarks.adapters import ADAPTERS
+from benchmarks.harness import run_workload_benchmark
+from benchmarks.workloads import Workload, ZipfianGenerator, get_workload, load, replay, READ, INSERT, DELETE, SCAN
+
+
+NUMBER_RECORDS = 64
+NUMBER_OPERATIONS = 64
+
+
+class TestWorkloads:
+    def test_deterministic(self):
+        workload = get_workload('a', NUMBER_RECORDS, NUMBER_OPERATIONS, seed=3)
+        assert list(workload.operations()) == list(workload.operations())
+        assert list(workload.load()) == list(get_workload('a', NUMBER_RECORDS, NUMBER_OPERATIONS, seed=3).load())
+        assert list(workload.operations()) != list(get_workload('a', NUMBER_RECORDS, NUMBER_OPERATIONS,
+                                                                seed=4).operations())
+
+    def test_zipfian_is_skewed(self):
+        rng = Random(0)
+        generator = ZipfianGenerator(1000)
+        counts = Counter(generator.next(rng, 1000) for i in range(10000))
+        assert all(0 <= record < 1000 for record in counts)
+        # The hottest record gets a large share, far above the uniform 1 / 1000
+        assert counts.most_common(1)[0][0] == 0
+        assert counts[0] > 1000
+
+    def test_deletes_and_inserts(self):
+        workload = Workload(NUMBER_RECORDS, 4 * NUMBER_OPERATIONS, read=1, insert=1, delete=1,
+                            distribution='uniform')
+        keys = set(key for operation, key, value in workload.load())
+        for operation, key, argument in workload.operations():
+            if operation == INSERT:
+                assert key not in keys
+                keys.add(key)
+            else:
+                assert key in keys
+                if operation == DELETE:
+                    keys.remove(key)
+
+    @pytest.mark.usefixtures("verkle_setup")
+    def test_replay_all_trees(self):
+        workload = Workload(NUMBER_RECORDS, NUMBER_OPERATIONS, read=1, update=1, insert=1, scan=1,
+                            key_order='ordered', max_scan_length=10)
+        keys = sorted(key for operation, key, value in workload.load())
+        keys += sorted(key for operation, key, value in workload.operations() if operation == INSERT)
+        for tree, width_bits in [('vbst', 1), ('vb_tree', 2), ('vbplus_tree', 2), ('verkle_trie', 4)]:
+            adapter = ADAPTERS[tree](width_bits)
+            load(adapter, workload)
+            samples = {}
+            counts = replay(adapter, workload.operations(), samples)
+            assert sum(counts.values()) == NUMBER_OPERATIONS
+            assert len(samples[READ]) == counts[READ]
+            adapter.check_valid()
+            for key in keys:
+                assert adapter.search(key)
+            assert adapter.scan(keys[10], 20) == keys[10:30]
+            assert adapter.scan(keys[-3], 20) == keys[-3:]
+
+    def test_deletes_rejected_for_trees_without_deletes(self):
+        workload = Workload(NUMBER_RECORDS, NUMBER_OPERATIONS, read=1, delete=0.1)
+        for tree in ['vb_tree', 'vbplus_tree']:
+            with pytest.raises(ValueError, match="does not support deletes"):
+                load(ADAPTERS[tree](2), workload)
+            with pytest.raises(ValueError, match="does not support deletes"):
+                run_workload_benchmark(tree, 2, workload, repetitions=1, warmup=0)
+
+    def test_replay_scans_in_workload_e(self):
+        workload = get_workload('e', NUMBER_RECORDS, NUMBER_OPERATIONS)
+        adapter = ADAPTERS['vbplus_tree'](2)
+        load(adapter, workload)
+        assert replay(adapter, workload.operations())[SCAN] > 0
+
+    def test_sorted_inserts_on_vbst(self):
+        # Sorted keys make the VBST a path deeper than the recursion limit
+        workload = get_workload('sorted_inserts', sys.getrecursionlimit() + 100, 8)
+        adapter = ADAPTERS['vbst'](1)
+        load(adapter, workload)
+        assert replay(adapter, workload.operations())[INSERT] == 8
+        adapter.check_valid()
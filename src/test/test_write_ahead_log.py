@@ -0,0 +1,178 @@
+from random import Random
+from time import sleep, time
+
+import pytest
+
+import blst
+import verkle_trie
+import tree_snapshot
+from write_ahead_log import WriteAheadLog, LoggedTree, apply_operations, recover, UPSERT, DELETE
+from vbst import VBST, VBSTNode
+from vbplus_tree import VBPlusTree, VBPlusTreeNode, KzgIntegration, int_to_bytes
+
+
+MODULUS = 0x73eda753299d7d483339d80809a1d80553bda402fffe5bfeffffffff00000001
+WIDTH = 4
+PRIMITIVE_ROOT = 7
+SECRET = 8927347823478352432985
+
+NUMBER_INITIAL_KEYS = 100
+NUMBER_LOGGED_KEYS = 40
+
+pytestmark = pytest.mark.usefixtures("verkle_setup")
+
+
+def random_key_values(number_keys, seed):
+    rng = Random(seed)
+    return [(int_to_bytes(rng.randint(0, 2**32)), int_to_bytes(rng.randint(0, 2**32))) for i in range(number_keys)]
+
+
+class TestWriteAheadLog:
+    kzg_integration = KzgIntegration(SECRET, MODULUS, WIDTH, PRIMITIVE_ROOT)
+    vbst_kzg_integration = KzgIntegration(SECRET, MODULUS, 2, PRIMITIVE_ROOT)
+    initial_key_values = random_key_values(NUMBER_INITIAL_KEYS, 0)
+    logged_key_values = random_key_values(NUMBER_LOGGED_KEYS, 1)
+
+    def test_group_commit(self, tmp_path):
+        path = str(tmp_path / "tree.wal")
+        log = WriteAheadLog(path, group_size=10)
+        syncs = log.syncs
+        for key, value in self.logged_key_values:
+            log.append(UPSERT, key, value)
+        assert log.syncs - syncs == NUMBER_LOGGED_KEYS // 10
+        log.append(DELETE, self.logged_key_values[0][0])
+        log.close()
+
+        operations = list(WriteAheadLog.read(path))
+        assert operations[:-1] == [(UPSERT, key, value) for key, value in self.logged_key_values]
+        assert operations[-1] == (DELETE, self.logged_key_values[0][0], b"")
+
+    def test_group_interval(self, tmp_path):
+        log = WriteAheadLog(str(tmp_path / "tree.wal"), group_size=1000, group_interval=0.05)
+        syncs = log.syncs
+        for key, value in self.logged_key_values[:3]:
+            log.append(UPSERT, key, value)
+        assert log.pending == 3
+        # Synced by the timer, without another append
+        deadline = time() + 5
+        while log.pending > 0 and time() < deadline:
+            sleep(0.01)
+        assert log.pending == 0 and log.syncs == syncs + 1
+        log.close()
+
+    def test_torn_record(self, tmp_path):
+        path = str(tmp_path / "tree.wal")
+        log = WriteAheadLog(path)
+        for key, value in self.logged_key_values[:3]:
+            log.append(UPSERT, key, value)
+        log.close()
+        with open(path, "r+b") as file:
+            file.truncate(file.seek(0, 2) - 1)
+
+        assert len(list(WriteAheadLog.read(path))) == 2
+        # Reopening drops the torn record, new records follow the last complete one
+        log = WriteAheadLog(path)
+        key, value = self.logged_key_values[3]
+        log.append(UPSERT, key, value)
+        log.close()
+        assert [key for operation, key, value in WriteAheadLog.read(path)] == \
+            [key for key, value in self.logged_key_values[:2]] + [self.logged_key_values[3][0]]
+
+    def test_recover_vbplus_tree(self, tmp_path):
+        key, value = self.initial_key_values[0]
+        tree = VBPlusTree(self.kzg_integration, VBPlusTreeNode('leaf', [key], [value]))
+        for key, value in self.initial_key_values[1:]:
+            tree.insert_node(key, value)
+        tree.add_node_hash(tree.root)
+
+        snapshot_path = str(tmp_path / "tree.snapshot")
+        log_path = str(tmp_path / "tree.wal")
+        logged_tree = LoggedTree(tree, WriteAheadLog(log_path, group_size=8), snapshot_path)
+        logged_tree.checkpoint()
+        for key, value in self.logged_key_values + self.initial_key_values[:10]:
+            logged_tree.upsert(key, value)
+        logged_tree.close()
+
+        recovered = recover(snapshot_path, log_path, self.kzg_integration)
+        assert recovered.root.hash == tree.root.hash
+        recovered.check_valid_tree(recovered.root)
+
+        # Rejected before anything is applied or logged, so the log can still be recovered
+        new_key, new_value = self.initial_key_values[10][0] + b"\x01", b"\x02"
+        with pytest.raises(ValueError):
+            apply_operations(recovered, [(UPSERT, new_key, new_value), (DELETE, key, b"")])
+        assert recovered.find_node(recovered.root, new_key) is None
+        logged_tree = LoggedTree(recovered, WriteAheadLog(log_path), snapshot_path)
+        with pytest.raises(ValueError):
+            logged_tree.delete(key)
+        logged_tree.close()
+        assert recover(snapshot_path, log_path, self.kzg_integration).root.hash == tree.root.hash
+
+    def test_recover_vbst(self, tmp_path):
+        key, value = self.initial_key_values[0]
+        tree = VBST(self.vbst_kzg_integration, VBSTNode(key, value))
+        for key, value in self.initial_key_values[1:]:
+            tree.insert_node(key, value)
+        tree.add_node_hash(tree.root)
+
+        snapshot_path = str(tmp_path / "tree.snapshot")
+        log_path = str(tmp_path / "tree.wal")
+        logged_tree = LoggedTree(tree, WriteAheadLog(log_path), snapshot_path)
+        logged_tree.checkpoint()
+        for key, value in self.logged_key_values:
+            logged_tree.upsert(key, value)
+        for key, value in self.initial_key_values[:20:2] + self.logged_key_values[:5]:
+            logged_tree.delete(key)
+        logged_tree.close()
+
+        recovered = recover(snapshot_path, log_path, self.vbst_kzg_integration)
+        assert recovered.root.hash == tree.root.hash
+        recovered.check_valid_tree(recovered.root)
+
+    def test_recover_verkle_trie(self, tmp_path):
+        rng = Random(0)
+        root = {"node_type": "inner", "commitment": blst.G1().mult(0)}
+        keys = [rng.randbytes(32) for i in range(NUMBER_INITIAL_KEYS)]
+        for key in keys:
+            verkle_trie.insert_verkle_node(root, key, rng.randbytes(32))
+        verkle_trie.add_node_hash(root)
+
+        snapshot_path = str(tmp_path / "trie.snapshot")
+        log_path = str(tmp_path / "trie.wal")
+        logged_tree = LoggedTree(root, WriteAheadLog(log_path), snapshot_path)
+        logged_tree.checkpoint()
+        for key in keys[:20] + [rng.randbytes(32) for i in range(20)]:
+            logged_tree.upsert(key, rng.randbytes(32))
+        for key in keys[10:30]:
+            logged_tree.delete(key)
+        logged_tree.close()
+
+        recovered = recover(snapshot_path, log_path)
+        assert recovered["hash"] == root["hash"]
+        verkle_trie.check_valid_tree(recovered)
+
+    def test_batched_update_matches_upserts(self):
+        key, value = self.initial_key_values[0]
+        tree = VBPlusTree(self.kzg_integration, VBPlusTreeNode('leaf', [key], [value]))
+        apply_operations(tree, [(UPSERT, key, value) for key, value in self.initial_key_values[1:]])
+
+        expected = VBPlusTree(self.kzg_integration, VBPlusTreeNode('leaf', [key], [value]))
+        expected.add_node_hash(expected.root)
+        for key, value in self.initial_key_values[1:]:
+            expected.upsert_vc_node(key, value)
+        assert tree.root.hash == expected.root.hash
+        tree.check_valid_tree(tree.root)
+
+    def test_checkpoint_empties_log(self, tmp_path):
+        key, value = self.initial_key_values[0]
+        tree = VBPlusTree(self.kzg_integration, VBPlusTreeNode('leaf', [key], [value]))
+        tree.add_node_hash(tree.root)
+        snapshot_path = str(tmp_path / "tree.snapshot")
+        log_path = str(tmp_path / "tree.wal")
+        logged_tree = LoggedTree(tree, WriteAheadLog(log_path), snapshot_path)
+        for key, value in self.logged_key_values:
+            logged_tree.upsert(key, value)
+        logged_tree.checkpoint()
+        assert list(WriteAheadLog.read(log_path)) == []
+        assert tree_snapshot.load(snapshot_path, self.kzg_integration).root.hash == tree.root.hash
+        logged_tree.close()
@@ -0,0 +1,444 @@
+import os
+import hashlib
+import struct
+from random import Random
+import blst
+import verkle_trie
+from vbst import VBST, VBSTNode, KzgIntegration, int_from_bytes
+from vb_tree import VBTree, VBTreeNode
+from vbplus_tree import VBPlusTree, VBPlusTreeNode
+
+#
+# Snapshots of whole trees
+#
+# A snapshot stores all nodes of a tree in preorder, including their hashes and compressed commitments,
+# so loading it is a single linear pass without any multiexponentiations. It is laid out as
+#
+#   magic              4 bytes
+#   version            1 byte
+#   tree type          1 byte
+#   width              4 bytes, little endian
+#   nodes              in preorder, see the '_write_*' functions
+#   digest             32 bytes, sha256 of everything before it
+#
+# Keys and values are written as 2 byte length + bytes, hashes as 32 bytes and commitments as 48 bytes.
+# Nodes are written and read with explicit stacks, since a VBST can be as deep as it has keys.
+#
+# Neither side holds the whole snapshot in memory: writes are buffered up to WRITE_BUFFER_SIZE bytes, and
+# loading first checks the digest in one pass over the file and then parses the nodes from a buffered
+# reader in a second one.
+#
+
+SNAPSHOT_MAGIC = b"VCTS"
+SNAPSHOT_VERSION = 1
+
+HEADER = struct.Struct("<4sBBI")
+U8 = struct.Struct("<B")
+U16 = struct.Struct("<H")
+
+TREE_TYPE_VBST = 0
+TREE_TYPE_VB_TREE = 1
+TREE_TYPE_VBPLUS_TREE = 2
+TREE_TYPE_VERKLE_TRIE = 3
+
+HAS_HASH = 1
+HAS_COMMITMENT = 2
+HAS_LEFT = 4
+HAS_RIGHT = 8
+
+# Size of the buffer that is collected before writing to the file
+WRITE_BUFFER_SIZE = 2**20
+
+# Size of the buffer of the file when loading, and of the chunks in which the digest is computed
+READ_BUFFER_SIZE = 2**20
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class _Writer:
+    def __init__(self, file):
+        self.file = file
+        self.buffer = bytearray()
+        self.digest = hashlib.sha256()
+
+    def write(self, data: bytes):
+        self.buffer += data
+        if len(self.buffer) >= WRITE_BUFFER_SIZE:
+            self.flush()
+
+    def write_item(self, item: bytes):
+        self.write(U16.pack(len(item)) + item)
+
+    def write_node_fields(self, flags: int, node_hash: bytes, commitment: blst.P1):
+        if node_hash is not None:
+            flags |= HAS_HASH
+        if commitment is not None:
+            flags |= HAS_COMMITMENT
+        self.write(U8.pack(flags) + (node_hash if node_hash is not None else b"") +
+                   (commitment.compress() if commitment is not None else b""))
+
+    def flush(self):
+        self.digest.update(self.buffer)
+        self.file.write(self.buffer)
+        self.buffer = bytearray()
+
+
+class _Reader:
+    """
+    Reads the nodes from 'file', which has 'size' bytes of them from its current position 'offset' on
+    """
+    def __init__(self, file, offset: int, size: int):
+        self.file = file
+        self.offset = offset
+        self.size = size
+
+    def read(self, size: int) -> bytes:
+        if self.offset + size > self.size:
+            raise SnapshotError("Snapshot is truncated")
+        data = self.file.read(size)
+        if len(data) < size:
+            raise SnapshotError("Snapshot is truncated")
+        self.offset += size
+        return data
+
+    def read_u8(self) -> int:
+        return self.read(1)[0]
+
+    def read_u16(self) -> int:
+        return U16.unpack(self.read(2))[0]
+
+    def read_item(self) -> bytes:
+        return self.read(self.read_u16())
+
+    def read_node_fields(self):
+        """
+        Returns the flags, hash and commitment written by '_Writer.write_node_fields'
+        """
+        flags = self.read_u8()
+        node_hash = self.read(32) if flags & HAS_HASH else None
+        commitment = blst.P1(self.read(48)) if flags & HAS_COMMITMENT else None
+        return flags, node_hash, commitment
+
+
+def _write_nodes(writer: _Writer, root, write_node, get_children):
+    """
+    Writes all nodes below 'root' in preorder
+    """
+    stack = [root]
+    while len(stack) > 0:
+        node = stack.pop()
+        write_node(writer, node)
+        stack.extend(reversed(get_children(node)))
+
+
+def _read_nodes(reader: _Reader, read_node, set_children, nodes: list):
+    """
+    Reads the nodes written by '_write_nodes'. 'read_node' returns a node together with its number of
+    children, 'set_children' attaches the children once all of them are read. All nodes are appended to 'nodes'
+    """
+    root, child_count = read_node(reader)
+    nodes.append(root)
+    stack = [(root, child_count, [])]
+    while len(stack) > 0:
+        node, child_count, children = stack[-1]
+        if len(children) == child_count:
+            stack.pop()
+            set_children(node, children)
+            continue
+        child, grandchild_count = read_node(reader)
+        nodes.append(child)
+        children.append(child)
+        stack.append((child, grandchild_count, []))
+    return root
+
+
+# VBST
+
+def _write_vbst_node(writer: _Writer, node: VBSTNode):
+    flags = (HAS_LEFT if node.left is not None else 0) | (HAS_RIGHT if node.right is not None else 0)
+    writer.write_node_fields(flags, node.hash, node.commitment)
+    writer.write_item(node.key)
+    writer.write_item(node.value)
+
+
+def _get_vbst_children(node: VBSTNode) -> list:
+    return [child for child in [node.left, node.right] if child is not None]
+
+
+def _read_vbst_node(reader: _Reader):
+    flags, node_hash, commitment = reader.read_node_fields()
+    node = VBSTNode(reader.read_item(), reader.read_item())
+    node.hash = node_hash
+    node.commitment = commitment
+    # The children are set in '_set_vbst_children', the flags tell which of them exist
+    node.left = HAS_LEFT if flags & HAS_LEFT else None
+    node.right = HAS_RIGHT if flags & HAS_RIGHT else None
+    return node, len(_get_vbst_children(node))
+
+
+def _set_vbst_children(node: VBSTNode, children: list):
+    children = iter(children)
+    if node.left is not None:
+        node.left = next(children)
+    if node.right is not None:
+        node.right = next(children)
+
+
+# VB-Tree
+
+def _write_vb_tree_node(writer: _Writer, node: VBTreeNode):
+    writer.write_node_fields(0, node.hash, node.commitment)
+    writer.write(U16.pack(node.key_count()) + U16.pack(node.child_count()))
+    for key, value in zip(node.keys, node.values):
+        writer.write_item(key)
+        writer.write_item(value)
+
+
+def _read_vb_tree_node(reader: _Reader):
+    flags, node_hash, commitment = reader.read_node_fields()
+    key_count = reader.read_u16()
+    child_count = reader.read_u16()
+    node = VBTreeNode()
+    for i in range(key_count):
+        node.keys.append(reader.read_item())
+        node.values.append(reader.read_item())
+    node.hash = node_hash
+    node.commitment = commitment
+    return node, child_count
+
+
+def _set_vb_tree_children(node: VBTreeNode, children: list):
+    node.children = children
+
+
+# VB+Tree
+
+def _write_vbplus_tree_node(writer: _Writer, node: VBPlusTreeNode):
+    writer.write_node_fields(0, node.hash, node.commitment)
+    is_leaf = node.node_type == 'leaf'
+    writer.write(U8.pack(is_leaf) + U16.pack(node.key_count()) + U16.pack(0 if is_leaf else node.child_count()))
+    for key in node.keys:
+        writer.write_item(key)
+    if is_leaf:
+        for value in node.values:
+            writer.write_item(value)
+
+
+def _get_vbplus_tree_children(node: VBPlusTreeNode) -> list:
+    return node.children if node.node_type == 'inner' else []
+
+
+def _read_vbplus_tree_node(reader: _Reader):
+    flags, node_hash, commitment = reader.read_node_fields()
+    is_leaf = reader.read_u8()
+    key_count = reader.read_u16()
+    child_count = reader.read_u16()
+    node = VBPlusTreeNode('leaf' if is_leaf else 'inner')
+    node.keys = [reader.read_item() for i in range(key_count)]
+    if is_leaf:
+        node.values = [reader.read_item() for i in range(key_count)]
+    node.hash = node_hash
+    node.commitment = commitment
+    return node, child_count
+
+
+def _set_vbplus_tree_children(node: VBPlusTreeNode, children: list):
+    node.children = children
+
+
+# Verkle trie
+
+def _write_verkle_node(writer: _Writer, node: dict):
+    writer.write_node_fields(0, node.get("hash"), node.get("commitment"))
+    if node["node_type"] == "leaf":
+        writer.write(U8.pack(1))
+        writer.write_item(node["key"])
+        writer.write_item(node["value"])
+    else:
+        indices = _get_verkle_indices(node)
+        writer.write(U8.pack(0) + U16.pack(len(indices)))
+        for index in indices:
+            writer.write(U16.pack(index))
+
+
+def _get_verkle_indices(node: dict) -> list:
+    return sorted(index for index in node if isinstance(index, int))
+
+
+def _get_verkle_children(node: dict) -> list:
+    if node["node_type"] == "leaf":
+        return []
+    return [node[index] for index in _get_verkle_indices(node)]
+
+
+def _read_verkle_node(reader: _Reader):
+    flags, node_hash, commitment = reader.read_node_fields()
+    if reader.read_u8():
+        node = {"node_type": "leaf", "key": reader.read_item(), "value": reader.read_item()}
+        child_count = 0
+    else:
+        node = {"node_type": "inner"}
+        child_count = reader.read_u16()
+        # The indices are replaced by the children in '_set_verkle_children'
+        node["indices"] = [reader.read_u16() for i in range(child_count)]
+    if node_hash is not None:
+        node["hash"] = node_hash
+    if commitment is not None:
+        node["commitment"] = commitment
+    return node, child_count
+
+
+def _set_verkle_children(node: dict, children: list):
+    if node["node_type"] == "inner":
+        for index, child in zip(node.pop("indices"), children):
+            node[index] = child
+
+
+TREE_TYPES = {
+    TREE_TYPE_VBST: (_write_vbst_node, _get_vbst_children, _read_vbst_node, _set_vbst_children),
+    TREE_TYPE_VB_TREE: (_write_vb_tree_node, lambda node: node.children, _read_vb_tree_node, _set_vb_tree_children),
+    TREE_TYPE_VBPLUS_TREE: (_write_vbplus_tree_node, _get_vbplus_tree_children, _read_vbplus_tree_node,
+                            _set_vbplus_tree_children),
+    TREE_TYPE_VERKLE_TRIE: (_write_verkle_node, _get_verkle_children, _read_verkle_node, _set_verkle_children),
+}
+
+
+def _get_tree_type(tree):
+    """
+    Returns the tree type, width and root node of 'tree'
+    """
+    if isinstance(tree, VBST):
+        return TREE_TYPE_VBST, 2, tree.root
+    elif isinstance(tree, VBTree):
+        return TREE_TYPE_VB_TREE, tree.width, tree.root
+    elif isinstance(tree, VBPlusTree):
+        return TREE_TYPE_VBPLUS_TREE, tree.width, tree.root
+    elif isinstance(tree, dict):
+        return TREE_TYPE_VERKLE_TRIE, verkle_trie.WIDTH, tree
+    raise TypeError("Cannot snapshot a {0}".format(type(tree).__name__))
+
+
+def snapshot(tree, path: str, sync: bool = False):
+    """
+    Writes a snapshot of 'tree' (a VBST, VBTree, VBPlusTree or the root of a verkle trie) to 'path'.
+    With 'sync' the file is also fsync'ed to disk
+    """
+    tree_type, width, root = _get_tree_type(tree)
+    write_node, get_children, read_node, set_children = TREE_TYPES[tree_type]
+    with open(path, "wb") as file:
+        writer = _Writer(file)
+        writer.write(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, tree_type, width))
+        _write_nodes(writer, root, write_node, get_children)
+        writer.flush()
+        file.write(writer.digest.digest())
+        if sync:
+            file.flush()
+            os.fsync(file.fileno())
+
+
+def load(path: str, kzg: KzgIntegration = None, check_samples: int = 0, seed: int = None):
+    """
+    Loads a snapshot written by 'snapshot'. VBST, VBTree and VBPlusTree snapshots need the 'kzg' setup,
+    verkle tries use the setup of the verkle_trie module and are returned as their root node.
+
+    Instead of recomputing all commitments, 'check_samples' randomly chosen nodes are checked against
+    their children
+    """
+    with open(path, "rb", buffering=READ_BUFFER_SIZE) as file:
+        size = os.fstat(file.fileno()).st_size - 32
+        if size < HEADER.size:
+            raise SnapshotError("Snapshot is truncated")
+        magic, version, tree_type, width = HEADER.unpack(file.read(HEADER.size))
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or tree_type not in TREE_TYPES:
+            raise SnapshotError("{0} is not a supported snapshot".format(path))
+        if _file_digest(file, size) != file.read(32):
+            raise SnapshotError("Snapshot digest does not match its content")
+
+        file.seek(HEADER.size)
+        write_node, get_children, read_node, set_children = TREE_TYPES[tree_type]
+        reader = _Reader(file, HEADER.size, size)
+        nodes = []
+        root = _read_nodes(reader, read_node, set_children, nodes)
+        if reader.offset != size:
+            raise SnapshotError("Unexpected data after the last node")
+
+    if tree_type == TREE_TYPE_VBST:
+        tree = VBST(kzg, root)
+    elif tree_type == TREE_TYPE_VB_TREE:
+        assert kzg.width == width, "Snapshot was written with a different width"
+        tree = VBTree(kzg, root)
+    elif tree_type == TREE_TYPE_VBPLUS_TREE:
+        assert kzg.width == width, "Snapshot was written with a different width"
+        _link_leaves(nodes)
+        tree = VBPlusTree(kzg, root)
+    else:
+        assert verkle_trie.WIDTH == width, "Snapshot was written with a different width"
+        tree = root
+
+    if check_samples > 0:
+        rng = Random(seed)
+        for node in rng.sample(nodes, min(check_samples, len(nodes))):
+            if not _check_node(tree_type, tree, node):
+                raise SnapshotError("Node does not match its children")
+
+    return tree
+
+
+def _file_digest(file, size: int) -> bytes:
+    """
+    sha256 of the first 'size' bytes of 'file', read in chunks. Leaves the file at position 'size'
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    remaining = size
+    while remaining > 0:
+        chunk = file.read(min(remaining, READ_BUFFER_SIZE))
+        if len(chunk) == 0:
+            raise SnapshotError("Snapshot is truncated")
+        digest.update(chunk)
+        remaining -= len(chunk)
+    return digest.digest()
+
+
+def _link_leaves(nodes: list):
+    """
+    Restores the 'next_leaf' pointers of a VB+Tree. In preorder, the leaves appear in key order
+    """
+    previous_leaf = None
+    for node in nodes:
+        if node.node_type == 'leaf':
+            if previous_leaf is not None:
+                previous_leaf.next_leaf = node
+            previous_leaf = node
+
+
+def _check_node(tree_type: int, tree, node) -> bool:
+    """
+    Checks the hash of a single node, and its commitment if it is an inner node. Nodes without a hash
+    (which have never been committed to) are not checked
+    """
+    if tree_type == TREE_TYPE_VERKLE_TRIE:
+        if "hash" not in node:
+            return True
+        if node["node_type"] == "leaf":
+            return node["hash"] == verkle_trie.hash([node["key"], node["value"]])
+        values = {index: int_from_bytes(child["hash"]) for index, child in zip(_get_verkle_indices(node),
+                                                                                _get_verkle_children(node))}
+        commitment = verkle_trie.kzg_utils.compute_commitment_lagrange(values)
+        return commitment.is_equal(node["commitment"]) and node["hash"] == verkle_trie.hash(commitment.compress())
+
+    if node.hash is None:
+        return True
+    write_node, get_children, read_node, set_children = TREE_TYPES[tree_type]
+    children = [node.left, node.right] if tree_type == TREE_TYPE_VBST else get_children(node)
+    if len([child for child in children if child is not None]) > 0:
+        values = {i: int_from_bytes(child.hash) for i, child in enumerate(children) if child is not None}
+        if not tree.kzg.compute_commitment_lagrange(values).is_equal(node.commitment):
+            return False
+
+    stored_hash = node.hash
+    node.node_hash()
+    node_hash, node.hash = node.hash, stored_hash
+    return node_hash == stored_hash
@@ -0,0 +1,285 @@
+import struct
+import verkle_trie
+from write_ahead_log import apply_operations, check_operations, UPSERT, DELETE
+
+#
+# Diff and sync of two replicas by hash comparison
+#
+# Both replicas are walked from the root, and only children whose hashes differ are visited, so the
+# cost is proportional to the number of changes times the depth instead of the number of keys. The
+# remote replica is accessed through a peer, either in process (LocalPeer) or over a socket
+# (SocketPeer, talking to 'serve').
+#
+# A peer describes the node at a path as (node type, hash, positional, entries):
+#   - an inner node has one entry (label, child hash) per child, and the path to a child is the path
+#     of its parent plus the label. In a verkle trie the label is the child index and children at the
+#     same index are compared ('positional'). In a VB+Tree the label is the smallest key that can be in
+#     the child (b"" for the first child), so a child covers the keys from its label up to the label of
+#     the next child. If the separator keys of two nodes differ, every local child is compared with the
+#     remote children whose key ranges overlap its own, restricted to the overlap
+#   - a leaf has one entry (key, value) per key
+#
+# Supported trees are VBPlusTree and verkle tries (their root node). All hashes need to be computed.
+#
+
+LEAF = 'leaf'
+INNER = 'inner'
+
+NODE_TYPES = [None, LEAF, INNER]
+
+REQUEST_HEADER = struct.Struct("<BH")
+RESPONSE_HEADER = struct.Struct("<BB32sI")
+LENGTH = struct.Struct("<H")
+
+DESCRIBE = 0
+LEAVES = 1
+
+# Number of differences that are applied together in 'sync'
+SYNC_BATCH_SIZE = 256
+
+
+def index_label(index: int) -> bytes:
+    return index.to_bytes(2, "little")
+
+
+class LocalPeer:
+    """
+    Gives access to a VBPlusTree or the root of a verkle trie in the same process
+    """
+    def __init__(self, tree):
+        self.tree = tree
+        self.positional = isinstance(tree, dict)
+
+    def _node(self, path: tuple):
+        node = self.tree if self.positional else self.tree.root
+        for label in path:
+            if self.positional:
+                if node["node_type"] != INNER:
+                    return None
+                node = node.get(int.from_bytes(label, "little"))
+            else:
+                if node.node_type != INNER:
+                    return None
+                if label == b"":
+                    node = node.children[0]
+                elif label in node.keys:
+                    node = node.children[node.keys.index(label) + 1]
+                else:
+                    return None
+            if node is None:
+                return None
+        return node
+
+    def describe(self, path: tuple = ()) -> tuple:
+        """
+        Returns (node type, hash, positional, entries) of the node at 'path', or None if there is no node
+        """
+        node = self._node(path)
+        if node is None:
+            return None
+        if self.positional:
+            if node["node_type"] == LEAF:
+                return LEAF, node["hash"], True, [(node["key"], node["value"])]
+            return INNER, node["hash"], True, [(index_label(index), node[index]["hash"])
+                                               for index in range(verkle_trie.WIDTH) if index in node]
+        if node.node_type == LEAF:
+            return LEAF, node.hash, False, list(zip(node.keys, node.values))
+        return INNER, node.hash, False, list(zip([b""] + node.keys, [child.hash for child in node.children]))
+
+    def leaves(self, path: tuple = ()):
+        """
+        Yields all (key, value) pairs below the node at 'path'
+        """
+        stack = [self._node(path)]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node is None:
+                continue
+            if self.positional:
+                if node["node_type"] == LEAF:
+                    yield node["key"], node["value"]
+                else:
+                    stack.extend(node[index] for index in reversed(range(verkle_trie.WIDTH)) if index in node)
+            elif node.node_type == LEAF:
+                yield from zip(node.keys, node.values)
+            else:
+                stack.extend(reversed(node.children))
+
+
+def _write_item(file, item: bytes):
+    file.write(LENGTH.pack(len(item)) + item)
+
+
+def _read_exact(file, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) < size:
+        raise ConnectionError("Connection closed by peer")
+    return data
+
+
+def _read_item(file) -> bytes:
+    return _read_exact(file, LENGTH.unpack(_read_exact(file, LENGTH.size))[0])
+
+
+def serve(tree, sock):
+    """
+    Answers the requests of a SocketPeer on 'sock' about 'tree' until the connection is closed
+    """
+    peer = LocalPeer(tree)
+    file = sock.makefile("rwb")
+    try:
+        while True:
+            header = file.read(REQUEST_HEADER.size)
+            if len(header) < REQUEST_HEADER.size:
+                break
+            command, path_length = REQUEST_HEADER.unpack(header)
+            path = tuple(_read_item(file) for i in range(path_length))
+            if command == DESCRIBE:
+                description = peer.describe(path)
+                if description is None:
+                    file.write(RESPONSE_HEADER.pack(0, 0, bytes(32), 0))
+                else:
+                    node_type, node_hash, positional, entries = description
+                    file.write(RESPONSE_HEADER.pack(NODE_TYPES.index(node_type), positional, node_hash,
+                                                    len(entries)))
+                    for label, payload in entries:
+                        _write_item(file, label)
+                        _write_item(file, payload)
+            else:
+                # Leaves are streamed, each one prefixed by 1, and the end is marked by 0
+                for key, value in peer.leaves(path):
+                    file.write(b"\x01")
+                    _write_item(file, key)
+                    _write_item(file, value)
+                file.write(b"\x00")
+            file.flush()
+    finally:
+        file.close()
+
+
+class SocketPeer:
+    """
+    Stand-in for a remote replica, served by 'serve' on the other end of 'sock'
+    """
+    def __init__(self, sock):
+        self.file = sock.makefile("rwb")
+
+    def _request(self, command: int, path: tuple):
+        self.file.write(REQUEST_HEADER.pack(command, len(path)))
+        for label in path:
+            _write_item(self.file, label)
+        self.file.flush()
+
+    def describe(self, path: tuple = ()) -> tuple:
+        self._request(DESCRIBE, path)
+        node_type, positional, node_hash, count = RESPONSE_HEADER.unpack(_read_exact(self.file, RESPONSE_HEADER.size))
+        if node_type == 0:
+            return None
+        entries = [(_read_item(self.file), _read_item(self.file)) for i in range(count)]
+        return NODE_TYPES[node_type], node_hash, bool(positional), entries
+
+    def leaves(self, path: tuple = ()):
+        self._request(LEAVES, path)
+        while _read_exact(self.file, 1) == b"\x01":
+            yield _read_item(self.file), _read_item(self.file)
+
+    def close(self):
+        self.file.close()
+
+
+def _in_range(key: bytes, low: bytes, high: bytes) -> bool:
+    """
+    Whether 'key' is in [low, high). A 'high' of None is unbounded
+    """
+    return low <= key and (high is None or key < high)
+
+
+def _min_high(a: bytes, b: bytes) -> bytes:
+    if a is None:
+        return b
+    return a if b is None else min(a, b)
+
+
+def _child_ranges(entries: list, low: bytes, high: bytes) -> list:
+    """
+    (label, child hash, low, high) of the children of a VB+Tree node, restricted to [low, high), for the
+    children that overlap it
+    """
+    ranges = []
+    for i, (label, child_hash) in enumerate(entries):
+        child_low = max(label, low)
+        child_high = _min_high(entries[i + 1][0] if i + 1 < len(entries) else None, high)
+        if child_high is None or child_low < child_high:
+            ranges.append((label, child_hash, child_low, child_high))
+    return ranges
+
+
+def _leaves_in_range(peer, path: tuple, low: bytes, high: bytes) -> dict:
+    return {key: value for key, value in peer.leaves(path) if _in_range(key, low, high)}
+
+
+def _diff_leaves(local_leaves: dict, remote_leaves: dict):
+    for key in sorted(local_leaves.keys() | remote_leaves.keys()):
+        local_value, remote_value = local_leaves.get(key), remote_leaves.get(key)
+        if local_value != remote_value:
+            yield key, local_value, remote_value
+
+
+def _diff(local, remote, local_path: tuple, remote_path: tuple, low: bytes, high: bytes):
+    """
+    Differences between the keys in [low, high) of the node at 'local_path' of 'local' and the node at
+    'remote_path' of 'remote'
+    """
+    local_node, remote_node = local.describe(local_path), remote.describe(remote_path)
+    if local_node is not None and remote_node is not None and local_node[1] == remote_node[1]:
+        return
+
+    if local_node is None or remote_node is None or local_node[0] == LEAF or remote_node[0] == LEAF:
+        yield from _diff_leaves(_leaves_in_range(local, local_path, low, high) if local_node is not None else {},
+                                _leaves_in_range(remote, remote_path, low, high) if remote_node is not None else {})
+        return
+
+    if local_node[2]:
+        local_children, remote_children = dict(local_node[3]), dict(remote_node[3])
+        for label in sorted(local_children.keys() | remote_children.keys()):
+            if local_children.get(label) != remote_children.get(label):
+                yield from _diff(local, remote, local_path + (label,), remote_path + (label,), low, high)
+        return
+
+    # Both lists of ranges cover [low, high) in order, so every overlapping pair is visited once
+    local_ranges, remote_ranges = _child_ranges(local_node[3], low, high), _child_ranges(remote_node[3], low, high)
+    i = j = 0
+    while i < len(local_ranges) and j < len(remote_ranges):
+        local_label, local_hash, local_low, local_high = local_ranges[i]
+        remote_label, remote_hash, remote_low, remote_high = remote_ranges[j]
+        overlap_high = _min_high(local_high, remote_high)
+        if local_hash != remote_hash:
+            yield from _diff(local, remote, local_path + (local_label,), remote_path + (remote_label,),
+                             max(local_low, remote_low), overlap_high)
+        if overlap_high == local_high:
+            i += 1
+        if overlap_high == remote_high:
+            j += 1
+
+
+def diff(local, remote, path: tuple = ()):
+    """
+    Yields (key, local value, remote value) for every key whose value differs between the peers 'local'
+    and 'remote'. A missing key has the value None
+    """
+    yield from _diff(local, remote, path, path, b"", None)
+
+
+def sync(tree, remote, batch_size: int = SYNC_BATCH_SIZE) -> int:
+    """
+    Changes 'tree' to have the same keys and values as the peer 'remote'. The differences are applied in
+    batches with 'apply_operations', so every changed node is committed once per batch. Returns the number
+    of changed keys. The root of a verkle trie is changed in place. If 'tree' cannot apply all changes
+    (deletes from a VBTree or VBPlusTree), nothing is applied
+    """
+    operations = [(UPSERT, key, remote_value) if remote_value is not None else (DELETE, key, b"")
+                  for key, local_value, remote_value in diff(LocalPeer(tree), remote)]
+    check_operations(tree, operations)
+    for start in range(0, len(operations), batch_size):
+        apply_operations(tree, operations[start:start + batch_size])
+    return len(operations)
@@ -1,6 +1,7 @@
 import sys
 import blst
 import hashlib
+import op_counters
 from poly_utils import PrimeField
 from kzg_utils import KzgUtils
 from fft import fft
@@ -20,8 +21,10 @@ def int_from_bytes(x: bytes) -> int:
 
 def hash(x):
     if isinstance(x, bytes):
+        op_counters.count('sha256')
         return hashlib.sha256(x).digest()
     elif isinstance(x, blst.P1):
+        op_counters.count('compress')
         return hash(x.compress())
     b = b""
     for a in x:
@@ -32,6 +35,7 @@ def hash(x):
         elif isinstance(a, int):
             b += a.to_bytes(32, "little")
         elif isinstance(a, blst.P1):
+            op_counters.count('compress')
             b += hash(a.compress())
     return hash(b)
 
@@ -77,9 +81,11 @@ class VBTreeNode:
         self.commitment = blst.G1().mult(0)
 
     def node_hash(self):
+        op_counters.count('node_hash')
         if self.is_leaf():
             self.hash = hash(self.keys + self.values)
         else:
+            op_counters.count('compress')
             self.hash = hash([self.commitment.compress()] +
                              self.keys + self.values)
 
@@ -226,6 +232,7 @@ class VBTree:
             else:
                 node.commitment.add(
                     self.setup["g1_lagrange"][idx].dup().mult(value_change))
+                op_counters.count('mult', 'add')
                 node.node_hash()
             new_hash = node.hash
             value_change = (int_from_bytes(
@@ -309,6 +316,7 @@ class VBTree:
                     for idx, value_change in update_node_changes:
                         node['updated_node'].commitment.add(
                             self.setup["g1_lagrange"][idx].dup().mult(value_change))
+                        op_counters.count('mult', 'add')
                         node['updated_node'].node_hash()
                 return
             if node['node_type'] == 'inner':
@@ -330,6 +338,7 @@ class VBTree:
                 for idx, value_change in split_node_changes:
                     node['split_node'].commitment.add(
                         self.setup["g1_lagrange"][idx].dup().mult(value_change))
+                    op_counters.count('mult', 'add')
                     node['split_node'].node_hash()
                 split_node_changes = []
 
@@ -337,6 +346,7 @@ class VBTree:
                 for idx, value_change in update_node_changes:
                     node['updated_node'].commitment.add(
                         self.setup["g1_lagrange"][idx].dup().mult(value_change))
+                    op_counters.count('mult', 'add')
                     node['updated_node'].node_hash()
                 update_node_changes = []
 
@@ -449,6 +459,7 @@ class VBTree:
                 self.check_valid_tree(nodes[i])
             commitment = self.kzg.compute_commitment_lagrange(values)
             assert node.commitment.is_equal(commitment)
+            op_counters.count('compress')
             assert node.hash == hash(
                 [node.commitment.compress()] + node.keys + node.values)
 
@@ -1,6 +1,7 @@
 import sys
 import blst
 import hashlib
+import op_counters
 from poly_utils import PrimeField
 from kzg_utils import KzgUtils
 from fft import fft
@@ -20,8 +21,10 @@ def int_from_bytes(x: bytes) -> int:
 
 def hash(x):
     if isinstance(x, bytes):
+        op_counters.count('sha256')
         return hashlib.sha256(x).digest()
     elif isinstance(x, blst.P1):
+        op_counters.count('compress')
         return hash(x.compress())
     b = b""
     for a in x:
@@ -30,6 +33,7 @@ def hash(x):
         elif isinstance(a, int):
             b += a.to_bytes(32, "little")
         elif isinstance(a, blst.P1):
+            op_counters.count('compress')
             b += hash(a.compress())
     return hash(b)
 
@@ -84,9 +88,11 @@ class VBPlusTreeNode:
             self.children = []
 
     def node_hash(self):
+        op_counters.count('node_hash')
         if self.node_type == 'leaf':
             self.hash = hash(self.keys + self.values)
         elif self.node_type == 'inner':
+            op_counters.count('compress')
             self.hash = hash([self.commitment.compress()] + self.keys)
 
     def key_count(self):
@@ -235,6 +241,7 @@ class VBPlusTree:
             else:
                 node.commitment.add(
                     self.setup["g1_lagrange"][idx].dup().mult(value_change))
+                op_counters.count('mult', 'add')
                 node.node_hash()
             new_hash = node.hash
             value_change = (int_from_bytes(
@@ -385,6 +392,7 @@ class VBPlusTree:
                     for idx, value_change in update_node_changes:
                         node['updated_node'].commitment.add(
                             self.setup["g1_lagrange"][idx].dup().mult(value_change))
+                        op_counters.count('mult', 'add')
                         node['updated_node'].node_hash()
                 return
             if node['node_type'] == 'inner':
@@ -426,10 +434,12 @@ class VBPlusTree:
                     if node.get('branch_node') is not None:
                         node['branch_node'].commitment.add(
                             self.setup["g1_lagrange"][idx].dup().mult(value_change))
+                        op_counters.count('mult', 'add')
                         node['branch_node'].node_hash()
                     else:
                         node['updated_node'].commitment.add(
                             self.setup["g1_lagrange"][idx].dup().mult(value_change))
+                        op_counters.count('mult', 'add')
                         node['updated_node'].node_hash()
                 branch_node_changes = []
 
@@ -438,6 +448,7 @@ class VBPlusTree:
 
                     node['split_node'].commitment.add(
                         self.setup["g1_lagrange"][idx].dup().mult(value_change))
+                    op_counters.count('mult', 'add')
                     node['split_node'].node_hash()
                 split_node_changes = []
 
@@ -445,6 +456,7 @@ class VBPlusTree:
                 for idx, value_change in update_node_changes:
                     node['updated_node'].commitment.add(
                         self.setup["g1_lagrange"][idx].dup().mult(value_change))
+                    op_counters.count('mult', 'add')
                     node['updated_node'].node_hash()
                 update_node_changes = []
 
@@ -598,6 +610,7 @@ class VBPlusTree:
             commitment = self.kzg.compute_commitment_lagrange(values)
 
             assert node.commitment.is_equal(commitment)
+            op_counters.count('compress')
             assert node.hash == hash([node.commitment.compress()] + node.keys)
 
     def tree_structure(self, node, level: int = 0, prefix: str = "Root", child_idx=None, structure: list = None):
@@ -1,6 +1,7 @@
 import sys
 import blst
 import hashlib
+import op_counters
 from poly_utils import PrimeField
 from kzg_utils import KzgUtils
 from fft import fft
@@ -20,8 +21,10 @@ def int_from_bytes(x: bytes) -> int:
 
 def hash(x):
     if isinstance(x, bytes):
+        op_counters.count('sha256')
         return hashlib.sha256(x).digest()
     elif isinstance(x, blst.P1):
+        op_counters.count('compress')
         return hash(x.compress())
     b = b""
     for a in x:
@@ -30,6 +33,7 @@ def hash(x):
         elif isinstance(a, int):
             b += a.to_bytes(32, "little")
         elif isinstance(a, blst.P1):
+            op_counters.count('compress')
             b += hash(a.compress())
     return hash(b)
 
@@ -76,9 +80,11 @@ class VBSTNode(object):
         self.commitment = None
 
     def node_hash(self):
+        op_counters.count('node_hash')
         if self.is_leaf():
             self.hash = hash([self.key, self.value])
         else:
+            op_counters.count('compress')
             self.hash = hash(
                 [self.commitment.compress(), self.key, self.value])
 
@@ -95,20 +101,29 @@ class VBST:
 
     def _insert(self, node: VBSTNode, key: bytes, value: bytes, update: bool):
         """
-        Recursive insert operator
+        Insert operator, returns the root of the subtree. Iterative, as the tree is not balanced and
+        sorted inserts make it as deep as it has nodes
         """
 
         if node is None:
             return VBSTNode(key, value)
 
-        if key == node.key:
-            if update:
-                node.value = value
-        elif key < node.key:
-            node.left = self._insert(node.left, key, value, update)
-        elif key > node.key:
-            node.right = self._insert(node.right, key, value, update)
-        return node
+        current = node
+        while True:
+            if key == current.key:
+                if update:
+                    current.value = value
+                return node
+            elif key < current.key:
+                if current.left is None:
+                    current.left = VBSTNode(key, value)
+                    return node
+                current = current.left
+            else:
+                if current.right is None:
+                    current.right = VBSTNode(key, value)
+                    return node
+                current = current.right
 
     def insert_node(self, key: bytes, value: bytes, update: bool = False):
         """
@@ -154,6 +169,7 @@ class VBST:
             else:
                 node.commitment.add(
                     self.setup["g1_lagrange"][edge].dup().mult(value_change))
+                op_counters.count('mult', 'add')
                 node.node_hash()
             new_hash = node.hash
             value_change = (int_from_bytes(
@@ -233,6 +249,7 @@ class VBST:
             else:
                 node.commitment.add(
                     self.setup["g1_lagrange"][edge].dup().mult(value_change))
+                op_counters.count('mult', 'add')
                 node.node_hash()
             new_hash = node.hash
             value_change = (int_from_bytes(
@@ -283,32 +300,41 @@ class VBST:
 
     def add_node_hash(self, node: VBSTNode):
         """
-        Adds node hashes and commitments recursively down the tree
+        Adds node hashes and commitments down the tree, children first. Nodes that already have a hash
+        are kept
         """
-        if node.is_leaf():
-            node.node_hash()
-        else:
-            values = {}
-            nodes = [node.left, node.right]
-            for i in range(len(nodes)):
-                if nodes[i] is None:
-                    continue
-
-                if nodes[i].hash is None:
-                    self.add_node_hash(nodes[i])
-                values[i] = int_from_bytes(nodes[i].hash)
-            commitment = self.kzg.compute_commitment_lagrange(values)
-            node.commitment = commitment
-            node.node_hash()
+        stack = [(node, False)]
+        while len(stack) > 0:
+            node, children_done = stack.pop()
+            if node.is_leaf():
+                node.node_hash()
+            elif not children_done:
+                stack.append((node, True))
+                for child in [node.left, node.right]:
+                    if child is not None and child.hash is None:
+                        stack.append((child, False))
+            else:
+                values = {}
+                nodes = [node.left, node.right]
+                for i in range(len(nodes)):
+                    if nodes[i] is not None:
+                        values[i] = int_from_bytes(nodes[i].hash)
+                commitment = self.kzg.compute_commitment_lagrange(values)
+                node.commitment = commitment
+                node.node_hash()
 
     def check_valid_tree(self, node: VBSTNode):
         """
         Check if the hashes and commitments are valid down the tree
         """
 
-        if node.is_leaf():
-            assert node.hash == hash([node.key, node.value])
-        else:
+        stack = [node]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node.is_leaf():
+                assert node.hash == hash([node.key, node.value])
+                continue
+
             values = {}
             nodes = [node.left, node.right]
             for i in range(len(nodes)):
@@ -318,10 +344,11 @@ class VBST:
                 if nodes[i].hash is None:
                     self.add_node_hash(nodes[i])
                 values[i] = int_from_bytes(nodes[i].hash)
-                self.check_valid_tree(nodes[i])
+                stack.append(nodes[i])
             commitment = self.kzg.compute_commitment_lagrange(values)
 
             assert node.commitment.is_equal(commitment)
+            op_counters.count('compress')
             assert node.hash == hash(
                 [node.commitment.compress(), node.key, node.value])
 
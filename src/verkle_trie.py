@@ -1,11 +1,14 @@
-import pippenger
+import msm
 import blst
 import hashlib
+import op_counters
 from random import randint, shuffle
 from poly_utils import PrimeField
 from time import time
 from kzg_utils import KzgUtils
 from fft import fft
+from proof_serialization import get_serialized_proof_size, default_commitment_cache
+import phase_timers
 import sys
 
 #
@@ -76,8 +79,10 @@ def get_verkle_indices(key):
 
 def hash(x):
     if isinstance(x, bytes):
+        op_counters.count('sha256')
         return hashlib.sha256(x).digest()
     elif isinstance(x, blst.P1):
+        op_counters.count('compress')
         return hash(x.compress())
     b = b""
     for a in x:
@@ -86,6 +91,7 @@ def hash(x):
         elif isinstance(a, int):
             b += a.to_bytes(32, "little")
         elif isinstance(a, blst.P1):
+            op_counters.count('compress')
             b += hash(a.compress())
     return hash(b)
 
@@ -118,6 +124,7 @@ def insert_verkle_node(root, key, value):
         insert_verkle_node(root, current_node["key"], current_node["value"])
 
 
+@phase_timers.timed("update_verkle_node")
 def update_verkle_node(root, key, value):
     """
     Update or insert node and update all commitments and hashes
@@ -177,6 +184,7 @@ def update_verkle_node(root, key, value):
     # Update all the parent commitments along 'path'
     for index, node in reversed(path):
         node["commitment"].add(SETUP["g1_lagrange"][index].dup().mult(value_change))
+        op_counters.count('mult', 'add')
         old_hash = node["hash"]
         new_hash = hash(node["commitment"])
         node["hash"] = new_hash
@@ -197,6 +205,7 @@ def get_only_child(node):
     return only_child if child_count == 1 else None
 
 
+@phase_timers.timed("delete_verkle_node")
 def delete_verkle_node(root, key):
     """
     Delete node and update all commitments and hashes
@@ -231,6 +240,7 @@ def delete_verkle_node(root, key):
                             - int.from_bytes(node["hash"], "little")) % MODULUS
         else:            
             node["commitment"].add(SETUP["g1_lagrange"][index].dup().mult(value_change))
+            op_counters.count('mult', 'add')
             old_hash = node["hash"]
             new_hash = hash(node["commitment"])
             node["hash"] = new_hash
@@ -238,6 +248,7 @@ def delete_verkle_node(root, key):
                             - int.from_bytes(old_hash, "little")) % MODULUS
 
 
+@phase_timers.timed("add_node_hash")
 def add_node_hash(node):
     """
     Recursively adds all missing commitments and hashes to a verkle trie structure.
@@ -254,7 +265,7 @@ def add_node_hash(node):
                 values[i] = int.from_bytes(node[i]["hash"], "little")
         commitment = kzg_utils.compute_commitment_lagrange(values)
         node["commitment"] = commitment
-        node["hash"] = hash(commitment.compress())
+        node["hash"] = hash(commitment)
 
 
 def get_total_depth(root):
@@ -293,7 +304,7 @@ def check_valid_tree(root, is_trie_root=True):
                 values[i] = int.from_bytes(root[i]["hash"], "little")
         commitment = kzg_utils.compute_commitment_lagrange(values)
         assert root["commitment"].is_equal(commitment)
-        assert root["hash"] == hash(commitment.compress())
+        assert root["hash"] == hash(commitment)
 
         for i in range(WIDTH):
             if i in root:
@@ -349,27 +360,25 @@ def find_node_with_path(root, key):
     
 
 def get_proof_size(proof):
-    depths, commitments_sorted_by_index_serialized, D_serialized, y, sigma_serialized = proof
-    size = len(depths) # assume 8 bit integer to represent the depth
-    size += 48 * len(commitments_sorted_by_index_serialized)
-    size += 48 + 32 + 48
-    return size
+    """
+    Size of the proof in the binary wire format, see proof_serialization.py
+    """
+    return get_serialized_proof_size(proof)
 
-lasttime = [0]
 
+# Cache of decompressed commitments shared by all proof checks. Verifiers see the same upper level
+# commitments in nearly every proof
+commitment_cache = default_commitment_cache
 
-def start_logging_time_if_eligible(string, eligible):
-    if eligible:
-        print(string, file=sys.stderr)
-        lasttime[0] = time()
-
-        
-def log_time_if_eligible(string, width, eligible):
-    if eligible:
-        print(string + ' ' * max(1, width - len(string)) + "{0:7.3f} s".format(time() - lasttime[0]), file=sys.stderr)
-        lasttime[0] = time()
 
+def decompress_point(x):
+    """
+    Returns x as a blst.P1, decompressing it if it is given in serialized form (bytes or memoryview).
+    Used for D and sigma, which are different in every proof and therefore not cached
+    """
+    return commitment_cache.decompress(x, cache=False)
 
+@phase_timers.timed("make_kzg_multiproof")
 def make_kzg_multiproof(Cs, fs, indices, ys, display_times=True):
     """
     Computes a KZG multiproof according to the schema described here:
@@ -378,41 +387,67 @@ def make_kzg_multiproof(Cs, fs, indices, ys, display_times=True):
     zs[i] = DOMAIN[indexes[i]]
     """
 
+    phase_timers.mark(display_times)
+
     # Step 1: Construct g(X) polynomial in evaluation form
-    r = hash_to_int([hash(C) for C in Cs] + ys + [kzg_utils.DOMAIN[i] for i in indices]) % MODULUS
+    commitment_hashes = [hash(C) for C in Cs]
+    r = hash_to_int(commitment_hashes + ys + [kzg_utils.DOMAIN[i] for i in indices]) % MODULUS
 
-    log_time_if_eligible("   Hashed to r", 30, display_times)
+    phase_timers.checkpoint("Hashed to r", display_times)
 
-    g = [0 for i in range(WIDTH)]
+    # Group the openings by polynomial and sum up the powers of r that belong to the same (polynomial, index) pair.
+    # The same node polynomial is opened once per child on the proof paths, so there are usually far fewer
+    # polynomials than openings. A polynomial is identified by (the hash of) its commitment, as the commitment
+    # is binding: openings with the same commitment are of the same polynomial, whatever list holds its values
+    polynomials = {}
     power_of_r = 1
-    for f, index in zip(fs, indices):
-        quotient = kzg_utils.compute_inner_quotient_in_evaluation_form(f, index)
-        for i in range(WIDTH):
-            g[i] += power_of_r * quotient[i]
+    for commitment_hash, f, index in zip(commitment_hashes, fs, indices):
+        if commitment_hash not in polynomials:
+            polynomials[commitment_hash] = ([(i, v) for i, v in enumerate(f) if v != 0], {})
+        factors_by_index = polynomials[commitment_hash][1]
+        factors_by_index[index] = (factors_by_index.get(index, 0) + power_of_r) % MODULUS
 
         power_of_r = power_of_r * r % MODULUS
 
-    log_time_if_eligible("   Computed g polynomial", 30, display_times)
+    # The quotient is linear in f, so all polynomials opened at the same index can be combined first
+    # and only one quotient per evaluation point has to be computed
+    fs_by_index = {}
+    for nonzero_values, factors_by_index in polynomials.values():
+        for index, factor in factors_by_index.items():
+            if index not in fs_by_index:
+                fs_by_index[index] = [0] * WIDTH
+            combined_f = fs_by_index[index]
+            for i, v in nonzero_values:
+                combined_f[i] += factor * v
+
+    g = [0] * WIDTH
+    for index, combined_f in fs_by_index.items():
+        quotient = kzg_utils.compute_inner_quotient_in_evaluation_form([v % MODULUS for v in combined_f], index)
+        for i in range(WIDTH):
+            g[i] += quotient[i]
+    g = [v % MODULUS for v in g]
+
+    phase_timers.checkpoint("Computed g polynomial", display_times)
 
     D = kzg_utils.compute_commitment_lagrange({i: v for i, v in enumerate(g)})
 
-    log_time_if_eligible("   Computed commitment D", 30, display_times)
+    phase_timers.checkpoint("Computed commitment D", display_times)
 
     # Step 2: Compute h in evaluation form
     
     t = hash_to_int([r, D]) % MODULUS
-    
-    h = [0 for i in range(WIDTH)]
-    power_of_r = 1
-    
-    for f, index in zip(fs, indices):
-        denominator_inv = primefield.inv(t - DOMAIN[index])
-        for i in range(WIDTH):
-            h[i] += power_of_r * f[i] * denominator_inv % MODULUS
-            
-        power_of_r = power_of_r * r % MODULUS
-   
-    log_time_if_eligible("   Computed h polynomial", 30, display_times)
+
+    # One batch inversion for all the evaluation points, which is reused for the evaluations and quotients at t
+    denominators_inv = kzg_utils.domain_inverses(t)
+
+    h = [0] * WIDTH
+    for nonzero_values, factors_by_index in polynomials.values():
+        coefficient = sum(factor * denominators_inv[index] for index, factor in factors_by_index.items()) % MODULUS
+        for i, v in nonzero_values:
+            h[i] += coefficient * v
+    h = [v % MODULUS for v in h]
+
+    phase_timers.checkpoint("Computed h polynomial", display_times)
 
     # Step 3: Evaluate and compute KZG proofs
 
@@ -425,119 +460,156 @@ def make_kzg_multiproof(Cs, fs, indices, ys, display_times=True):
     E = kzg_utils.compute_commitment_lagrange({i: v for i, v in enumerate(h)})
     q = hash_to_int([E, D, y, w])
     sigma = pi.dup().add(rho.dup().mult(q))
+    op_counters.count('mult', 'add')
 
-    log_time_if_eligible("   Computed KZG proofs", 30, display_times)
+    phase_timers.checkpoint("Computed KZG proofs", display_times)
 
+    op_counters.count('compress', amount=2)
     return D.compress(), y, sigma.compress()
 
 
+@phase_timers.timed("check_kzg_multiproof")
 def check_kzg_multiproof(Cs, indices, ys, proof, display_times=True):
     """
     Verifies a KZG multiproof according to the schema described here:
     https://dankradfeist.de/ethereum/2021/06/18/pcs-multiproofs.html
     """
 
+    phase_timers.mark(display_times)
+
     D_serialized, y, sigma_serialized = proof
-    D = blst.P1(D_serialized)
-    sigma = blst.P1(sigma_serialized)
+    D = decompress_point(D_serialized)
+    sigma = decompress_point(sigma_serialized)
+    phase_timers.checkpoint("Decompressed D and sigma", display_times)
 
     # Step 1
     r = hash_to_int([hash(C) for C in Cs] + ys + [kzg_utils.DOMAIN[i] for i in indices]) % MODULUS
 
-    log_time_if_eligible("   Computed r hash", 30, display_times)
+    phase_timers.checkpoint("Computed r hash", display_times)
     
     # Step 2
     t = hash_to_int([r, D])
     E_coefficients = []
     g_2_of_t = 0
     power_of_r = 1
+    denominators_inv = kzg_utils.domain_inverses(t)
 
-    for index, y in zip(indices, ys):
-        E_coefficient = primefield.div(power_of_r, t - DOMAIN[index])
+    for index, y_i in zip(indices, ys):
+        E_coefficient = power_of_r * denominators_inv[index] % MODULUS
         E_coefficients.append(E_coefficient)
-        g_2_of_t += E_coefficient * y % MODULUS
+        g_2_of_t += E_coefficient * y_i % MODULUS
             
         power_of_r = power_of_r * r % MODULUS
 
-    log_time_if_eligible("   Computed g2 and e coeffs", 30, display_times)
+    phase_timers.checkpoint("Computed g2 and e coeffs", display_times)
     
-    E = pippenger.pippenger_simple(Cs, E_coefficients)
+    E = msm.multiexp(Cs, E_coefficients)
 
-    log_time_if_eligible("   Computed E commitment", 30, display_times)
+    phase_timers.checkpoint("Computed E commitment", display_times)
 
     # Step 3 (Check KZG proofs)
     w = (y - g_2_of_t) % MODULUS
 
     q = hash_to_int([E, D, y, w])
 
+    op_counters.count('mult', 'add')
     if not kzg_utils.check_kzg_proof(E.dup().add(D.dup().mult(q)), t, y + q * w, sigma):
         return False
 
-    log_time_if_eligible("   Checked KZG proofs", 30, display_times)
+    phase_timers.checkpoint("Checked KZG proofs", display_times)
 
     return True
 
 
-def make_verkle_proof(trie, keys, display_times=True):
+@phase_timers.timed("make_verkle_proof")
+def make_verkle_proof(trie, keys, display_times=True, multiproof=make_kzg_multiproof):
     """
-    Creates a proof for the 'keys' in the verkle trie given by 'trie'
+    Creates a proof for the 'keys' in the verkle trie given by 'trie'. The KZG multiproof of the openings is
+    made by 'multiproof', which takes the arguments of 'make_kzg_multiproof' (e.g. to make it in another process)
     """
 
-    start_logging_time_if_eligible("   Starting proof computation", display_times)
+    phase_timers.start("Starting proof computation", display_times)
 
-    # Step 0: Find all keys in the trie
-    nodes_by_index = {}
-    nodes_by_index_and_subindex = {}
-    values = []
-    depths = []
-    for key in keys:
-        path, node = find_node_with_path(trie, key)
-        depths.append(len(path))
-        values.append(node["value"])
-        for index, subindex, node in path:
-            nodes_by_index[index] = node
-            nodes_by_index_and_subindex[(index, subindex)] = node
-
-    log_time_if_eligible("   Computed key paths", 30, display_times)
-    
-    # All commitments, but without any duplications. These are for sending over the wire as part of the proof
-    nodes_sorted_by_index = list(map(lambda x: x[1], sorted(nodes_by_index.items())))
-    
-    # Nodes sorted 
-    nodes_sorted_by_index_and_subindex = list(map(lambda x: x[1], sorted(nodes_by_index_and_subindex.items())))
-    
-    indices = list(map(lambda x: x[0][1], sorted(nodes_by_index_and_subindex.items())))
-    
-    ys = list(map(lambda x: int.from_bytes(x[1][x[0][1]]["hash"], "little"), sorted(nodes_by_index_and_subindex.items())))
-    
-    log_time_if_eligible("   Sorted all commitments", 30, display_times)
+    # Step 0: Sort the keys by their verkle indices and find all of them in one descent of the trie.
+    # Nodes are visited in order of their index path and each node's openings are emitted in order of
+    # their subindex, which is exactly the order in which the verifier reconstructs them
+    sorted_keys = sorted((get_verkle_indices(key), key) for key in set(keys))
 
+    depths_by_key = {}
+    nodes_sorted_by_index = []
+    Cs = []
     fs = []
-    Cs = [x["commitment"] for x in nodes_sorted_by_index_and_subindex]
-
-    for node in nodes_sorted_by_index_and_subindex:
-        fs.append([int.from_bytes(node[i]["hash"], "little") if i in node else 0 for i in range(WIDTH)])
-
-    D, y, sigma = make_kzg_multiproof(Cs, fs, indices, ys, display_times)
+    indices = []
+    ys = []
+
+    def collect_openings(node, start, end, depth):
+        nodes_sorted_by_index.append(node)
+        f = [0] * WIDTH
+        for i in node:
+            if isinstance(i, int):
+                f[i] = int.from_bytes(node[i]["hash"], "little")
+
+        inner_children = []
+        while start < end:
+            index = sorted_keys[start][0][depth]
+            child_end = start + 1
+            while child_end < end and sorted_keys[child_end][0][depth] == index:
+                child_end += 1
+
+            assert index in node, "Tried to make proof for non-existent key"
+            Cs.append(node["commitment"])
+            fs.append(f)
+            indices.append(index)
+            ys.append(f[index])
+
+            child = node[index]
+            if child["node_type"] == "inner":
+                inner_children.append((child, start, child_end))
+            else:
+                for _, key in sorted_keys[start:child_end]:
+                    assert child["key"] == key, "Tried to make proof for non-existent key"
+                    depths_by_key[key] = depth + 1
+            start = child_end
+
+        for child, child_start, child_end in inner_children:
+            collect_openings(child, child_start, child_end, depth + 1)
+
+    collect_openings(trie, 0, len(sorted_keys), 0)
+    depths = [depths_by_key[key] for key in keys]
+
+    phase_timers.checkpoint("Computed key paths", display_times)
+
+    D, y, sigma = multiproof(Cs, fs, indices, ys, display_times)
 
     commitments_sorted_by_index_serialized = [x["commitment"].compress() for x in nodes_sorted_by_index[1:]]
+    op_counters.count('compress', amount=len(commitments_sorted_by_index_serialized))
     
-    log_time_if_eligible("   Serialized commitments", 30, display_times)
+    phase_timers.checkpoint("Serialized commitments", display_times)
 
     return depths, commitments_sorted_by_index_serialized, D, y, sigma
 
 
-def check_verkle_proof(trie, keys, values, proof, display_times=True):
+@phase_timers.timed("check_verkle_proof")
+def check_verkle_proof(trie, keys, values, proof, display_times=True, return_update_hint=False):
     """
     Checks Verkle tree proof according to
     https://notes.ethereum.org/nrQqhVpQRi6acQckwm1Ryg?both
+
+    If 'return_update_hint' is set, returns a tuple of the result and the update hint which is needed by
+    'compute_updated_verkle_root', or None instead of the hint if the proof is invalid
     """
 
-    start_logging_time_if_eligible("   Starting proof check", display_times)
+    phase_timers.start("Starting proof check", display_times)
+
+    # A key that is given more than once has to have the same value every time
+    values_by_key = {}
+    for key, value in zip(keys, values):
+        if values_by_key.setdefault(key, value) != value:
+            return (False, None) if return_update_hint else False
 
     # Unpack the proof
     depths, commitments_sorted_by_index_serialized, D_serialized, y, sigma_serialized = proof
-    commitments_sorted_by_index = [blst.P1(trie)] + [blst.P1(x) for x in commitments_sorted_by_index_serialized]
+    commitments_sorted_by_index = commitment_cache.decompress_batch([trie] + list(commitments_sorted_by_index_serialized))
 
     all_indices = set()
     all_indices_and_subindices = set()
@@ -555,7 +627,7 @@ def check_verkle_proof(trie, keys, values, proof, display_times=True):
     all_indices = sorted(all_indices)
     all_indices_and_subindices = sorted(all_indices_and_subindices)
 
-    log_time_if_eligible("   Computed indices", 30, display_times)
+    phase_timers.checkpoint("Computed indices", display_times)
 
     # Step 0: recreate the commitment list sorted by indices
     commitments_by_index = {index: commitment for index, commitment in zip(all_indices, commitments_sorted_by_index)}
@@ -576,9 +648,81 @@ def check_verkle_proof(trie, keys, values, proof, display_times=True):
     
     ys = list(map(lambda x: int.from_bytes(x[1], "little"), sorted(subhashes_by_index_and_subindex.items())))
 
-    log_time_if_eligible("   Recreated commitment lists", 30, display_times)
+    phase_timers.checkpoint("Recreated commitment lists", display_times)
+
+    result = check_kzg_multiproof(Cs, indices, ys, [D_serialized, y, sigma_serialized], display_times)
+
+    if return_update_hint:
+        if not result:
+            return result, None
+        depths_by_key = {key: depth for key, depth in zip(keys, depths)}
+        return result, (values_by_key, depths_by_key, commitments_by_index)
+
+    return result
+
+
+@phase_timers.timed("compute_updated_verkle_root")
+def compute_updated_verkle_root(trie, keys, values, updated_values, update_hint, display_times=True):
+    """
+    Computes the updated verkle root from a checked proof, without access to the trie.
+
+    'updated_values' contains the new values in the same order as 'keys'/'values' and can be 'None' for any
+    value that does not need updating. All keys have to be present in the trie, as the proof only covers
+    existing keys. 'update_hint' is returned by 'check_verkle_proof'. Returns the updated root commitment.
+
+    A key can be given more than once, but is only updated once. Raises ValueError if the proof was invalid
+    (there is no update hint), if a key is not given with the value the proof was checked with, or if a key
+    is given with different updated values
+    """
+
+    phase_timers.start("Starting root update", display_times)
+
+    if update_hint is None:
+        raise ValueError("Cannot compute the updated root from an invalid proof")
+    checked_values, depths_by_key, commitments_by_index = update_hint
+
+    updated_values_by_key = {}
+    for key, old_value, updated_value in zip(keys, values, updated_values):
+        if key not in checked_values or checked_values[key] != old_value:
+            raise ValueError("Key {0} was not checked with the given value".format(key.hex()))
+        if updated_value is not None and updated_values_by_key.setdefault(key, updated_value) != updated_value:
+            raise ValueError("Conflicting updates of key {0}".format(key.hex()))
+
+    # Collect the changes of the child hashes for every node on the updated paths
+    value_changes_by_index = {}
+    for key, updated_value in updated_values_by_key.items():
+        old_value = checked_values[key]
+        verkle_indices = get_verkle_indices(key)
+        depth = depths_by_key[key]
+        for i in range(depth):
+            if verkle_indices[:i] not in value_changes_by_index:
+                value_changes_by_index[verkle_indices[:i]] = {}
+        value_change = (MODULUS + int.from_bytes(hash([key, updated_value]), "little")
+                        - int.from_bytes(hash([key, old_value]), "little")) % MODULUS
+        value_changes = value_changes_by_index[verkle_indices[:depth - 1]]
+        value_changes[verkle_indices[depth - 1]] = (value_changes.get(verkle_indices[depth - 1], 0) + value_change) % MODULUS
+
+    if () not in value_changes_by_index:
+        return decompress_point(trie)
+
+    phase_timers.checkpoint("Computed leaf updates", display_times)
+
+    # Update the nodes bottom up, so all changes of a node's children are known when it is updated.
+    # Each touched node needs a single multiexponentiation over all of its changed children
+    for index in sorted(value_changes_by_index, key=len, reverse=True):
+        old_commitment = commitments_by_index[index]
+        new_commitment = old_commitment.dup().add(kzg_utils.compute_commitment_lagrange(value_changes_by_index[index]))
+        op_counters.count('add')
+        if index == ():
+            break
+        value_change = (MODULUS + int.from_bytes(hash(new_commitment), "little")
+                        - int.from_bytes(hash(old_commitment), "little")) % MODULUS
+        value_changes = value_changes_by_index[index[:-1]]
+        value_changes[index[-1]] = (value_changes.get(index[-1], 0) + value_change) % MODULUS
+
+    phase_timers.checkpoint("Computed updated verkle root", display_times)
 
-    return check_kzg_multiproof(Cs, indices, ys, [D_serialized, y, sigma_serialized], display_times)
+    return new_commitment
 
 
 if __name__ == "__main__":
@@ -0,0 +1,167 @@
+from collections import OrderedDict
+import verkle_trie
+import op_counters
+from verkle_trie import MODULUS, hash, get_verkle_indices
+
+#
+# Versioned verkle trie with structural sharing
+#
+# 'update_verkle_node' changes the nodes of a trie in place, so the previous root is lost. Here every
+# batch of writes copies only the nodes on the paths it changes (path copying); all other subtrees,
+# including their commitments, are shared with the previous version. Old versions therefore stay valid
+# tries, and proofs can be made against any version that is still retained.
+#
+# The commitment of a copied node is the commitment of the node it was copied from plus one
+# multiexponentiation over the children that changed in the batch, so every changed node is committed
+# once per batch. Versions beyond the retention limit are dropped; nodes that are not shared with a
+# retained version are then freed by Python's reference counting.
+#
+
+
+def int_from_hash(node: dict) -> int:
+    return int.from_bytes(node["hash"], "little") if node is not None else 0
+
+
+class VersionedVerkleTrie:
+    """
+    Keeps the last 'retain' versions of a verkle trie, plus all pinned versions. 'root' becomes version 0
+    and must have all its hashes; it must not be changed in place afterwards
+    """
+    def __init__(self, root: dict, retain: int = 8):
+        assert "hash" in root, "The initial root needs its commitments, use 'add_node_hash'"
+        assert retain >= 1
+        self.versions = OrderedDict([(0, root)])
+        self.latest = 0
+        self.retain = retain
+        self.pinned = set()
+
+    def root(self, version: int = None) -> dict:
+        if version is None:
+            version = self.latest
+        assert version in self.versions, "Version {0} is not retained".format(version)
+        return self.versions[version]
+
+    def root_commitment(self, version: int = None) -> bytes:
+        return self.root(version)["commitment"].compress()
+
+    def get(self, key: bytes, version: int = None) -> bytes:
+        node = verkle_trie.find_node(self.root(version), key)
+        return node["value"] if node is not None else None
+
+    def make_proof(self, keys: list, version: int = None, display_times: bool = False):
+        return verkle_trie.make_verkle_proof(self.root(version), keys, display_times)
+
+    def pin(self, version: int):
+        """
+        Keeps 'version' regardless of the retention limit until it is unpinned
+        """
+        assert version in self.versions, "Version {0} is not retained".format(version)
+        self.pinned.add(version)
+
+    def unpin(self, version: int):
+        self.pinned.discard(version)
+        self.collect_garbage()
+
+    def collect_garbage(self):
+        """
+        Drops the versions that are neither among the last 'retain' versions nor pinned
+        """
+        recent = list(self.versions.keys())[-self.retain:]
+        for version in list(self.versions.keys()):
+            if version not in recent and version not in self.pinned:
+                del self.versions[version]
+
+    def commit(self, updates: dict, deletes: list = ()) -> int:
+        """
+        Creates a new version from the latest one by inserting or updating all 'updates' (key -> value)
+        and then deleting all 'deletes'. Returns the new version number
+        """
+        return self.add_version(self.build_version(updates, deletes))
+
+    def build_version(self, updates: dict, deletes: list = ()) -> dict:
+        """
+        Returns the root of a new version built from the latest one, without adding it to the versions.
+        No node reachable from a retained version is changed
+        """
+        root = self.versions[self.latest]
+        # id -> node for every node that belongs only to the new version, and the node each copy came from
+        owned = {}
+        originals = {}
+
+        new_root = self._copy(root, owned, originals)
+        for key, value in updates.items():
+            self._copy_path(new_root, key, owned, originals)
+            verkle_trie.insert_verkle_node(new_root, key, value)
+        self._commit(new_root, originals)
+
+        for key in deletes:
+            if verkle_trie.find_node(new_root, key) is None:
+                continue
+            # Copies keep their hashes here, 'delete_verkle_node' updates them incrementally
+            self._copy_path(new_root, key, owned, originals, keep_hash=True)
+            verkle_trie.delete_verkle_node(new_root, key)
+        return new_root
+
+    def add_version(self, root: dict) -> int:
+        """
+        Adds a root built by 'build_version' as the latest version and returns its number
+        """
+        self.latest += 1
+        self.versions[self.latest] = root
+        self.collect_garbage()
+        return self.latest
+
+    @staticmethod
+    def _copy(node: dict, owned: dict, originals: dict, keep_hash: bool = False) -> dict:
+        node_copy = dict(node)
+        if "commitment" in node_copy:
+            node_copy["commitment"] = node_copy["commitment"].dup()
+        if not keep_hash:
+            del node_copy["hash"]
+        owned[id(node_copy)] = node_copy
+        originals[id(node_copy)] = node
+        return node_copy
+
+    def _copy_path(self, root: dict, key: bytes, owned: dict, originals: dict, keep_hash: bool = False):
+        """
+        Replaces every node on the path to 'key' that is shared with older versions by a copy. Nodes
+        without a hash were created in this batch and are not shared
+        """
+        node = root
+        for index in get_verkle_indices(key):
+            child = node.get(index)
+            if child is None:
+                return
+            if id(child) not in owned and "hash" in child:
+                child = self._copy(child, owned, originals, keep_hash)
+                node[index] = child
+            if child["node_type"] == "leaf":
+                return
+            node = child
+
+    def _commit(self, node: dict, originals: dict):
+        """
+        Computes the hashes and commitments of all nodes without a hash below 'node'
+        """
+        if node["node_type"] == "leaf":
+            node["hash"] = hash([node["key"], node["value"]])
+            return
+
+        for index in range(verkle_trie.WIDTH):
+            if index in node and "hash" not in node[index]:
+                self._commit(node[index], originals)
+
+        original = originals.get(id(node))
+        if original is None or original["node_type"] != "inner":
+            values = {index: int_from_hash(node[index]) for index in range(verkle_trie.WIDTH) if index in node}
+            node["commitment"] = verkle_trie.kzg_utils.compute_commitment_lagrange(values)
+        else:
+            changes = {}
+            for index in range(verkle_trie.WIDTH):
+                child, original_child = node.get(index), original.get(index)
+                if child is not original_child:
+                    changes[index] = (int_from_hash(child) - int_from_hash(original_child)) % MODULUS
+            node["commitment"] = original["commitment"].dup().add(
+                verkle_trie.kzg_utils.compute_commitment_lagrange(changes))
+            op_counters.count('add')
+        node["hash"] = hash(node["commitment"])
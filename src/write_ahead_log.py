@@ -0,0 +1,304 @@
+import os
+import struct
+import threading
+import zlib
+from time import time
+import verkle_trie
+import tree_snapshot
+from vbst import VBST
+from vb_tree import VBTree
+
+#
+# Write-ahead log of tree mutations
+#
+# Every upsert and delete is appended to the log before it is applied to the tree. The log is fsync'ed
+# in groups: after 'group_size' operations, or at the latest 'group_interval' seconds after the first
+# operation that is not synced yet. A timer thread does that sync if no append comes in the meantime, so
+# with a 'group_interval' a crash loses at most the operations of the last 'group_interval' seconds.
+# Without it, operations are only synced with their group or by calling 'sync'. A checkpoint writes a
+# snapshot of the tree and empties the log; recovery loads the snapshot and replays the log with
+# 'apply_operations'.
+#
+# Log layout (little endian):
+#   magic              4 bytes
+#   version            1 byte
+#   records, each
+#     length           4 bytes, length of the payload
+#     checksum         4 bytes, crc32 of the payload
+#     payload          operation (1 byte), 2 byte length + key, 2 byte length + value
+#
+# A record that is cut off or does not match its checksum (a write interrupted by a crash) ends the log.
+#
+
+WAL_MAGIC = b"VCTW"
+WAL_VERSION = 1
+
+HEADER = struct.Struct("<4sB")
+RECORD_HEADER = struct.Struct("<II")
+LENGTH = struct.Struct("<H")
+
+UPSERT = 0
+DELETE = 1
+
+
+def encode_operation(operation: int, key: bytes, value: bytes = b"") -> bytes:
+    payload = bytes([operation]) + LENGTH.pack(len(key)) + key + LENGTH.pack(len(value)) + value
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_operation(payload: bytes) -> tuple:
+    operation = payload[0]
+    key_length = LENGTH.unpack_from(payload, 1)[0]
+    key = payload[3:3 + key_length]
+    value_length = LENGTH.unpack_from(payload, 3 + key_length)[0]
+    value = payload[5 + key_length:5 + key_length + value_length]
+    return operation, key, value
+
+
+class WriteAheadLog:
+    """
+    Append-only log of upserts and deletes with group commit
+    """
+    def __init__(self, path: str, group_size: int = 64, group_interval: float = None):
+        self.path = path
+        self.group_size = group_size
+        self.group_interval = group_interval
+        self.pending = 0
+        self.last_sync = time()
+        self.syncs = 0
+        # Syncs the pending group after 'group_interval', armed by the first append after a sync
+        self.timer = None
+        # Serializes the appends and syncs of the callers and the timer
+        self.lock = threading.Lock()
+
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            valid_size = self._check(path)
+            self.file = open(path, "r+b")
+            # Drop a torn record at the end, so new records are not appended behind it
+            self.file.truncate(valid_size)
+            self.file.seek(valid_size)
+        else:
+            self.file = open(path, "w+b")
+            self.file.write(HEADER.pack(WAL_MAGIC, WAL_VERSION))
+            self.sync()
+
+    @staticmethod
+    def _check(path: str) -> int:
+        """
+        Returns the size of the valid part of the log at 'path'
+        """
+        size = HEADER.size
+        for operation, key, value, end in WriteAheadLog._read(path):
+            size = end
+        return size
+
+    @staticmethod
+    def _read(path: str):
+        with open(path, "rb") as file:
+            data = file.read()
+        if len(data) < HEADER.size or HEADER.unpack_from(data) != (WAL_MAGIC, WAL_VERSION):
+            raise ValueError("{0} is not a write-ahead log".format(path))
+
+        offset = HEADER.size
+        while offset + RECORD_HEADER.size <= len(data):
+            length, checksum = RECORD_HEADER.unpack_from(data, offset)
+            payload = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            offset += RECORD_HEADER.size + length
+            yield decode_operation(payload) + (offset,)
+
+    @staticmethod
+    def read(path: str):
+        """
+        Yields the logged operations as (operation, key, value) tuples
+        """
+        for operation, key, value, end in WriteAheadLog._read(path):
+            yield operation, key, value
+
+    def append(self, operation: int, key: bytes, value: bytes = b""):
+        """
+        Appends an operation to the log. It is durable once its group has been synced
+        """
+        with self.lock:
+            self.file.write(encode_operation(operation, key, value))
+            self.pending += 1
+            if self.pending >= self.group_size:
+                self._sync()
+            elif self.group_interval is not None and self.timer is None:
+                self.timer = threading.Timer(self.group_interval, self._sync_pending)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _sync_pending(self):
+        with self.lock:
+            self.timer = None
+            if self.pending > 0 and not self.file.closed:
+                self._sync()
+
+    def _sync(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time()
+        self.syncs += 1
+
+    def sync(self):
+        """
+        Makes all appended operations durable
+        """
+        with self.lock:
+            self._sync()
+
+    def truncate(self):
+        """
+        Removes all operations, after they have been made durable by a snapshot
+        """
+        with self.lock:
+            self.file.seek(HEADER.size)
+            self.file.truncate()
+            self._sync()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self._sync()
+                self.file.close()
+
+
+def _invalidate_path(tree, key: bytes):
+    """
+    Removes the hashes of all nodes on the path to 'key', which are the nodes an insert or update of 'key'
+    changes. Nodes created by the insert have no hash either, so 'add_node_hash' recomputes exactly these
+    """
+    if isinstance(tree, dict):
+        node = tree
+        indices = iter(verkle_trie.get_verkle_indices(key))
+        while node is not None:
+            node.pop("hash", None)
+            if node["node_type"] == "leaf":
+                break
+            node = node.get(next(indices))
+        return
+
+    if isinstance(tree, VBST):
+        path = tree.find_path_to_node(tree.root, key)
+    elif isinstance(tree, VBTree):
+        path = tree.find_path_to_node(tree.root, key)
+    else:
+        path = tree.find_path_to_leaf(tree.root, key)
+    for node, idx in path:
+        if node is not None:
+            node.hash = None
+
+
+def add_missing_hashes(tree):
+    """
+    Computes the hashes and commitments of all nodes whose hash was removed by 'apply_operations'
+    """
+    if isinstance(tree, dict):
+        if "hash" not in tree:
+            verkle_trie.add_node_hash(tree)
+    elif tree.root.hash is None:
+        tree.add_node_hash(tree.root)
+
+
+def supports_deletes(tree) -> bool:
+    """
+    VBTree and VBPlusTree do not support deletes
+    """
+    return isinstance(tree, (dict, VBST))
+
+
+def check_operations(tree, operations: list):
+    """
+    Raises if 'tree' cannot apply one of 'operations', so a batch is rejected before any of it is applied
+    """
+    for operation, key, value in operations:
+        if operation == DELETE and not supports_deletes(tree):
+            raise ValueError("{0} does not support deletes".format(type(tree).__name__))
+        elif operation not in (UPSERT, DELETE):
+            raise ValueError("Unknown operation {0}".format(operation))
+
+
+def apply_operations(tree, operations, commit: bool = True):
+    """
+    Applies a batch of operations to 'tree' (a VBST, VBTree, VBPlusTree or the root of a verkle trie).
+    Upserts only change the tree structure and invalidate the hashes on their path; the commitments of all
+    invalidated nodes are recomputed once at the end of the batch, instead of once per operation.
+
+    Deletes are applied with the incremental delete of the tree, after the pending upserts are committed.
+    VBTree and VBPlusTree do not support deletes: a batch with deletes is rejected before anything is applied.
+
+    Without 'commit', the invalidated nodes are left without hash for a later 'add_missing_hashes'
+    """
+    operations = list(operations)
+    check_operations(tree, operations)
+    for operation, key, value in operations:
+        if operation == UPSERT:
+            _invalidate_path(tree, key)
+            if isinstance(tree, dict):
+                verkle_trie.insert_verkle_node(tree, key, value)
+            else:
+                tree.insert_node(key, value, update=True)
+        elif operation == DELETE:
+            add_missing_hashes(tree)
+            if isinstance(tree, dict):
+                if verkle_trie.find_node(tree, key) is not None:
+                    verkle_trie.delete_verkle_node(tree, key)
+            else:
+                tree.delete_vc_node(key)
+    if commit:
+        add_missing_hashes(tree)
+
+
+def recover(snapshot_path: str, log_path: str, kzg=None):
+    """
+    Loads the last snapshot and replays the write-ahead log on top of it
+    """
+    tree = tree_snapshot.load(snapshot_path, kzg)
+    if os.path.exists(log_path):
+        apply_operations(tree, WriteAheadLog.read(log_path))
+    return tree
+
+
+class LoggedTree:
+    """
+    Logs every mutation of 'tree' to 'log' before applying it. 'checkpoint' writes a snapshot and
+    empties the log
+    """
+    def __init__(self, tree, log: WriteAheadLog, snapshot_path: str):
+        self.tree = tree
+        self.log = log
+        self.snapshot_path = snapshot_path
+
+    def upsert(self, key: bytes, value: bytes):
+        self.log.append(UPSERT, key, value)
+        if isinstance(self.tree, dict):
+            verkle_trie.update_verkle_node(self.tree, key, value)
+        else:
+            self.tree.upsert_vc_node(key, value)
+
+    def delete(self, key: bytes):
+        # Checked before logging, as a logged delete that cannot be applied would fail every recovery
+        check_operations(self.tree, [(DELETE, key, b"")])
+        self.log.append(DELETE, key)
+        apply_operations(self.tree, [(DELETE, key, b"")])
+
+    def checkpoint(self):
+        """
+        Writes a snapshot of the tree and empties the log. The snapshot is written to a temporary file
+        first, so a crash during the checkpoint leaves the old snapshot and the full log
+        """
+        self.log.sync()
+        temporary_path = self.snapshot_path + ".tmp"
+        tree_snapshot.snapshot(self.tree, temporary_path, sync=True)
+        os.replace(temporary_path, self.snapshot_path)
+        self.log.truncate()
+
+    def close(self):
+        self.log.close()